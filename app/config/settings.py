@@ -1,6 +1,6 @@
 from pydantic_settings import BaseSettings
 from pydantic import Field
-from typing import Optional
+from typing import Dict, List, Optional
 
 class Settings(BaseSettings):
     # --- API Security ---
@@ -13,9 +13,60 @@ class Settings(BaseSettings):
     GEMINI_EMBEDDING_MODEL: str = "models/text-embedding-004"
     GEMINI_TIMEOUT_SECONDS: int = 60           # Gemini generation timeout
 
+    # --- Gemini Key Pool (limits are PER KEY; keys: GEMINI_API_KEY, GEMINI_API_KEY_2..n) ---
+    GEMINI_KEY_RPM: int = 15                   # Requests per minute per key
+    GEMINI_KEY_TPM: int = 1000000              # Tokens per minute per key
+    GEMINI_KEY_COOLDOWN_SECONDS: float = 20.0  # Base cooldown after a 429 (doubles on repeats)
+    GEMINI_SHARED_QUOTA: bool = True           # Coordinate key windows/cooldowns across workers via Redis
+
+    # --- Model Tiers (cheap routes go to a faster model with its own per-key limits) ---
+    MODEL_TIERING_ENABLED: bool = True
+    GEMINI_FAST_MODEL: str = "gemini-2.5-flash-lite"
+    GEMINI_FAST_KEY_RPM: int = 30              # Per key, counted separately from GEMINI_KEY_RPM
+    GEMINI_FAST_KEY_TPM: int = 1000000
+    GEMINI_FAST_PRICE_INPUT_PER_M: float = 0.10
+    GEMINI_FAST_PRICE_OUTPUT_PER_M: float = 0.40
+    # "endpoint" or "endpoint:QUESTION_TYPE" -> tier; unlisted routes use "standard"
+    MODEL_ROUTES: Dict[str, str] = {
+        "quiz": "fast",
+        "flashcards": "fast",
+        "board_exam:MCQ": "fast",
+        "board_exam:AR": "fast",
+        "board_exam:VSA": "fast",
+        "exam:MCQ": "fast",
+    }
+
+    # --- Hedged Requests (duplicate a slow call on another key; first result wins) ---
+    HEDGE_ENABLED: bool = True
+    HEDGE_ENDPOINTS: List[str] = ["board_exam", "exam"]
+    HEDGE_PERCENTILE: float = 0.95             # Hedge once a call is slower than this percentile
+    HEDGE_BUDGET_FRACTION: float = 0.1         # Max share of recent calls that may be hedged
+    HEDGE_MIN_SAMPLES: int = 20                # Observations needed before hedging a call class
+    HEDGE_MIN_DELAY_SECONDS: float = 2.0
+
+    # --- Token Accounting (USD per 1M tokens) ---
+    GEMINI_PRICE_INPUT_PER_M: float = 0.30
+    GEMINI_PRICE_OUTPUT_PER_M: float = 2.50
+    GEMINI_PRICE_CACHED_PER_M: float = 0.075   # Prompt tokens served from Gemini's prefix cache
+    GEMINI_PRICE_EMBED_PER_M: float = 0.0      # text-embedding-004
+
+    # --- Embedding Throughput ---
+    EMBED_BATCH_SIZE: int = 100                # Texts per batchEmbedContents request (API max: 100)
+    EMBED_MAX_CONCURRENCY: int = 4             # Batch requests in flight across all keys
+    EMBED_TIMEOUT_SECONDS: float = 8.0         # Deadline for one query embedding (incl. retries)
+    GEMINI_EMBED_KEY_RPM: int = 1500           # Per key, for the embedding model (own window, not GEMINI_KEY_RPM)
+    GEMINI_EMBED_KEY_TPM: int = 1000000
+
+    # --- Embedding Cache (memory LRU + Redis) ---
+    EMBED_CACHE_ENABLED: bool = True
+    EMBED_CACHE_MEMORY_SIZE: int = 5000        # Vectors kept in the in-process LRU
+    EMBED_CACHE_TTL: int = 2592000             # Redis TTL (30 days)
+    EMBED_CACHE_DTYPE: str = "float16"         # "float16" (half size) or "float32" (lossless)
+
     # --- Redis ---
     REDIS_URL: str = Field(..., env="REDIS_URL")
     REDIS_CACHE_TTL: int = 604800  # 7 days in seconds
+    REDIS_RETRY_AFTER_SECONDS: int = 30       # Request-path Redis is skipped this long after an error
 
     # --- Qdrant ---
     QDRANT_URL: str = Field(..., env="QDRANT_URL")
@@ -33,6 +84,9 @@ class Settings(BaseSettings):
     # --- RAG Configuration ---
     SEMANTIC_TOP_K: int = 50
     BM25_TOP_K: int = 50
+    QUERY_DENSE_TIMEOUT_SECONDS: float = 8.0   # Gemini query embedding; on timeout search sparse-only
+    QUERY_SPARSE_TIMEOUT_SECONDS: float = 2.0  # BM25 query encoding; on timeout search dense-only
+    GROUP_SEARCH_MAX_GROUPS: int = 10          # Grouped search without explicit group values
     RERANK_TOP_K: int = 8
     CACHE_TTL: int = 604800  # 7 days
 
@@ -40,6 +94,39 @@ class Settings(BaseSettings):
     LLM_TEMPERATURE: float = 0.3
     LLM_MAX_TOKENS: int = 8192
 
+    # --- Adaptive Output Budgets (max_output_tokens learned from real usage) ---
+    TOKEN_BUDGET_ENABLED: bool = True
+    TOKEN_BUDGET_PERCENTILE: float = 0.95
+    TOKEN_BUDGET_HEADROOM: float = 0.2         # Added on top of the percentile
+    TOKEN_BUDGET_MIN_SAMPLES: int = 10         # Observations before leaving the static default
+    TOKEN_BUDGET_MIN_TOKENS: int = 512         # Floor (ceiling is LLM_MAX_TOKENS)
+
+    # --- Retrieval Cache (hybrid_search results; an upsert invalidates the collection) ---
+    RETRIEVAL_CACHE_ENABLED: bool = True
+    RETRIEVAL_CACHE_TTL_SECONDS: int = 3600    # 1 hour
+    RETRIEVAL_CACHE_MAX_ENTRIES: int = 2000    # In-process LRU bound
+    RETRIEVAL_CACHE_VERSION_TTL_SECONDS: float = 5.0  # How long a worker trusts its copy of a collection version
+
+    # --- LLM Response Cache (opt-in per endpoint) ---
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_ENDPOINTS: List[str] = ["tutor", "flashcards", "quiz"]  # JSON list in .env
+    LLM_CACHE_TTL_SECONDS: int = 86400         # 1 day
+    LLM_CACHE_MAX_ENTRIES: int = 2000          # In-process LRU bound
+
+    # --- Board Exam Checkpoints (retry with the same generation_id resumes) ---
+    CHECKPOINT_ENABLED: bool = True
+    CHECKPOINT_TTL_SECONDS: int = 86400        # Kept 1 day after the last completed unit
+
+    # --- Background Jobs (POST returns a job id; poll or stream progress) ---
+    JOB_MAX_CONCURRENT: int = 2                # Heavy jobs running at once per worker
+    JOB_MAX_QUEUED: int = 20                   # Queued + running per worker; more get 429
+    JOB_TIMEOUT_SECONDS: int = 900             # Each job's own deadline (not the HTTP one)
+    JOB_RETRY_BUDGET: int = 60                 # Upstream retries per job
+    JOB_RESULT_TTL_SECONDS: int = 3600         # Status/result kept this long
+
+    # --- Request Coalescing ---
+    SINGLE_FLIGHT_ENABLED: bool = True         # Identical in-flight embeddings/searches/prompts share one call
+
     # --- ✅ NEW: v5.0 PRD Configurations ---
     ALLOW_LLM_RUNTIME: bool = False      # Security: Prevent LLM usage for student/board modes
     ENABLE_CACHING: bool = True          # Enable Redis for Custom modes
@@ -51,9 +138,18 @@ class Settings(BaseSettings):
     # Generation Settings
     OVER_FETCH_RATIO: float = 1.5        # Fetch 50% extra for deduplication
     QDRANT_FALLBACK_THRESHOLD: float = 0.5 # Use LLM if < 50% questions found
+    BOARD_SELECTION_MODE: str = "random"  # Board/practice question bank: "random" | "least_used" (filters only) | "vector"
+    BOARD_EXAM_BATCH_TYPES: bool = True  # One LLM call per chapter for all types; follow-ups fill gaps
+    BOARD_EXAM_CALLS_PER_KEY: int = 2    # Parallel board-exam LLM calls per Gemini key...
+    BOARD_EXAM_MAX_CONCURRENCY: int = 8  # ...capped at this many per exam
+    EXAM_CALLS_PER_KEY: int = 2          # Parallel chapters per Gemini key in /v1/exam/generate...
+    EXAM_MAX_CONCURRENCY: int = 8        # ...capped at this many per exam
     
     # Monitoring
     TOTAL_REQUEST_TIMEOUT_SECONDS: int = 120   # FastAPI request timeout (2 min)
+    REQUEST_RETRY_BUDGET: int = 20             # Upstream retries per request, across all layers
+    CIRCUIT_FAILURE_THRESHOLD: int = 5         # Consecutive upstream failures that open a breaker
+    CIRCUIT_RESET_SECONDS: float = 30.0        # Open-circuit time before a trial call
     SENTRY_DSN: Optional[str] = None
 
     class Config:
@@ -7,15 +7,27 @@ import redis
 import os
 from app.config.settings import settings
 from app.middleware.logging import PerformanceLogger
+from app.middleware.deadline import RequestDeadline
 
 # Import Routers
 from app.routers import exam
 from app.routers import exam_v2  # ✅ V2 Router
 from app.routers import quiz 
 from app.routers import flashcards, tutor
+from app.routers import jobs
 
 # Import Services
 from app.services.qdrant_service import qdrant_service
+from app.services.embedding_cache import embedding_cache
+from app.services.gemini_key_pool import all_key_pools
+from app.services.geminiservice import hedge_policy
+from app.services.model_router import model_router
+from app.services.retrieval_cache import retrieval_cache
+from app.services.job_manager import job_manager
+from app.services.token_budget import token_budget
+from app.utils.metrics import metrics
+from app.utils.resilience import gemini_breaker, qdrant_breaker
+from app.utils.usage import usage_report
 
 app = FastAPI(
     title="ExamReady AI Service",
@@ -24,6 +36,7 @@ app = FastAPI(
 )
 
 # --- MIDDLEWARE ---
+app.add_middleware(RequestDeadline)
 app.add_middleware(PerformanceLogger)
 app.add_middleware(
     CORSMiddleware,
@@ -86,6 +99,7 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup async connections"""
+    await job_manager.shutdown()
     await qdrant_service.close()
     print("🔌 Async connections closed")
 
@@ -95,6 +109,7 @@ app.include_router(exam_v2.router)
 app.include_router(quiz.router)
 app.include_router(flashcards.router)
 app.include_router(tutor.router)
+app.include_router(jobs.router)
 
 # --- HEALTH CHECK ---
 @app.get("/health")
@@ -143,6 +158,24 @@ async def health_check():
 
     return health
 
+# --- METRICS (Internal) ---
+@app.get("/metrics")
+async def get_metrics():
+    """Process-local counters (cache hit rates, upstream usage, etc.)"""
+    return {
+        "pid": os.getpid(),
+        "embedding_cache": embedding_cache.stats(),
+        "retrieval_cache": retrieval_cache.stats(),
+        "gemini_keys": {tier: pool.status() for tier, pool in all_key_pools().items()},
+        "llm_usage": usage_report(),
+        "hedging": hedge_policy.stats(),
+        "circuits": {"gemini": gemini_breaker.status(), "qdrant": qdrant_breaker.status()},
+        "token_budgets": token_budget.stats(),
+        "model_routes": model_router.report(),
+        "jobs": job_manager.stats(),
+        **metrics.snapshot()
+    }
+
 @app.get("/")
 def read_root():
     return {
@@ -0,0 +1,31 @@
+from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from app.config.settings import settings
+from app.utils.resilience import request_budget
+import asyncio
+import logging
+
+logger = logging.getLogger("examready")
+
+# Extra time after the deadline for handlers to assemble a partial result
+DEADLINE_GRACE_SECONDS = 5
+
+class RequestDeadline(BaseHTTPMiddleware):
+    """
+    Gives every request one deadline (TOTAL_REQUEST_TIMEOUT_SECONDS) and one
+    retry budget (REQUEST_RETRY_BUDGET), read by GeminiService, QdrantService
+    and the generators. Handlers normally return a partial result in time;
+    if one still overruns, the request is cut off with a 504.
+    """
+    async def dispatch(self, request: Request, call_next):
+        timeout = settings.TOTAL_REQUEST_TIMEOUT_SECONDS
+        with request_budget(timeout=timeout, retries=settings.REQUEST_RETRY_BUDGET):
+            try:
+                return await asyncio.wait_for(call_next(request), timeout=timeout + DEADLINE_GRACE_SECONDS)
+            except asyncio.TimeoutError:
+                logger.error(f"⏱️ {request.method} {request.url.path} exceeded {timeout}s deadline")
+                return JSONResponse(
+                    status_code=504,
+                    content={"detail": f"Request exceeded the {timeout}s deadline"}
+                )
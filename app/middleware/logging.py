@@ -1,5 +1,6 @@
 from starlette.middleware.base import BaseHTTPMiddleware
 from fastapi import Request
+from app.utils.usage import track_usage
 import time
 import logging
 
@@ -11,17 +12,25 @@ class PerformanceLogger(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
         start_time = time.time()
         
-        # Process Request
-        response = await call_next(request)
+        # Process Request (Gemini token usage is collected for the whole request)
+        with track_usage() as usage:
+            response = await call_next(request)
         
         # Calculate Duration
         process_time = (time.time() - start_time) * 1000 # ms
         
         # Log details
+        token_info = ""
+        if usage.calls:
+            token_info = f" - Tokens: {usage.total_tokens} (${usage.cost_usd:.4f})"
+            response.headers["X-Tokens-Used"] = str(usage.total_tokens)
+            response.headers["X-Cost-USD"] = f"{usage.cost_usd:.6f}"
+        
         logger.info(
             f"⚡ {request.method} {request.url.path} "
             f"- Status: {response.status_code} "
             f"- Time: {process_time:.2f}ms"
+            f"{token_info}"
         )
         
-        return response
\ No newline at end of file
+        return response
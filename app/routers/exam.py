@@ -1,14 +1,18 @@
 from fastapi import APIRouter, HTTPException, Header
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
 from app.models.exammodels import ExamRequest, ExamResponse, QuestionModel
 from app.services.qdrant_service import qdrant_service
 from app.services.geminiservice import GeminiService
 from app.services.pdfgenerator import PDFGenerator
+from app.services.token_budget import token_budget
+from app.services.model_router import model_router
+from app.services.gemini_key_pool import get_key_pool
 from app.config.prompts import get_exam_prompt
 from app.config.settings import settings
-from json_repair import repair_json
+from app.utils.json_stream import aiter_json_objects
+from app.utils.usage import track_usage
 import json
 import time
 import asyncio
@@ -72,13 +76,68 @@ def _ensure_correct_answer(q_data: dict, options: list) -> bool:
     
     return False
 
-@router.post("/v1/exam/generate", response_model=ExamResponse)
-async def generate_exam(request: ExamRequest):
-    start_time = time.time()
-    all_questions = []
-    seen_texts = set()
+def _is_duplicate(q_text: str, seen_texts: set) -> bool:
+    """Substring match against questions already kept; records new ones"""
+    for existing in seen_texts:
+        if q_text in existing or existing in q_text:
+            print(f"    ⚠️ Skipping Duplicate: {q_text[:30]}...")
+            return True
+    seen_texts.add(q_text)
+    return False
+
+def _drop_duplicates(questions: List[QuestionModel], seen_texts: set) -> List[QuestionModel]:
+    """Cross-chapter dedup, run once chapters have been generated in parallel"""
+    return [q for q in questions if not _is_duplicate(q.text.strip(), seen_texts)]
+
+def _prepare_question(
+    q_data: dict,
+    chapter: str,
+    seen_texts: set,
+    chunk_ids: List[str],
+    avg_confidence: float
+) -> Optional[QuestionModel]:
+    """Validate, deduplicate and enrich one generated question (None = skip)"""
+    try:
+        # Deduplication
+        q_text = q_data.get('text', '').strip()
+        if not q_text or len(q_text) < 10: return None
+        if _is_duplicate(q_text, seen_texts): return None
+
+        # Normalize Options
+        q_data['options'] = _normalize_options(q_data.get('options', []))
+        if not _ensure_correct_answer(q_data, q_data.get('options', [])): return None
 
-    # 1. Calculate Per-Chapter Quota to ensure balance
+        # Enrich
+        b_level = q_data.get('bloomsLevel', 'Remember')
+        # Validation: Ensure it's a valid level string
+        if b_level not in ["Remember", "Understand", "Apply", "Analyze", "Evaluate", "Create"]:
+             b_level = "Apply" # Default fallback
+        q_data['bloomsLevel'] = b_level
+        
+        # Difficulty Mapping
+        if b_level in ["Remember", "Understand"]: q_data['difficulty'] = "Easy"
+        elif b_level == "Apply": q_data['difficulty'] = "Medium"
+        else: q_data['difficulty'] = "Hard"
+        
+        q_data['chapter'] = chapter
+        q_data['marks'] = 1
+        q_data['ragChunkIds'] = chunk_ids
+        q_data['ragConfidence'] = round(avg_confidence, 4)
+        q_data['qualityScore'] = min(1.0, avg_confidence * 1.1)
+        
+        options = q_data['options']
+        while len(options) < 4:
+            options.append(f"Option {chr(65+len(options))}")
+        q_data['options'] = options[:4]
+            
+        return QuestionModel(**q_data)
+            
+    except Exception as e:
+        print(f"    ⚠️ Parse Error: {e}")
+        return None
+
+def _chapter_targets(request: ExamRequest) -> List[tuple]:
+    """Per-chapter question quota (chapter, count) to keep the exam balanced"""
     chapter_count = len(request.chapters)
     if chapter_count == 0:
         raise HTTPException(400, "No chapters provided")
@@ -88,149 +147,252 @@ async def generate_exam(request: ExamRequest):
     
     print(f"🎯 Target: {request.totalQuestions} Questions across {chapter_count} Chapters (~{base_per_chapter}/ch)")
 
-    # 2. Iterate Chapters (Fixes Mono-Topic Issue)
-    # 2. Iterate Chapters (Single Batch per Chapter)
+    targets = []
     for ch_idx, chapter in enumerate(request.chapters):
         # Distribute remainder
         target_count = base_per_chapter + (1 if ch_idx < remainder else 0)
-        if target_count == 0: continue
+        if target_count > 0:
+            targets.append((chapter, target_count))
+    return targets
 
-        # Calculate local distribution string for prompt
-        local_dist = _calculate_distribution(target_count, request.bloomsDistribution)
-        dist_desc = ", ".join([f"{v} {k}" for k,v in local_dist.items() if v > 0])
-        
-        print(f"\n📘 Processing Chapter: {chapter} (Target: {target_count}, Mix: {dist_desc})")
-        
-        # 1. Retrieval (Specific to Chapter)
-        # Query asks for "Mixed Level" implicitly by not specifying one
-        query = f"{request.subject} objective questions about {chapter} concepts"
-        filters = {
-            "board": request.board, 
-            "subject": request.subject,
-        }
-        
-        # Using top_k=6 for sufficient context
-        rag_result = await qdrant_service.hybrid_search(query, filters, top_k=6)
-        top_chunks = rag_result['chunks'][:4]
-        input_context = rag_result['context']
-        
-        chunk_ids = [c['id'] for c in top_chunks]
-        avg_confidence = sum(c.get('rerank_score', 0) for c in top_chunks) / len(top_chunks) if top_chunks else 0.0
-
-        # 2. Prompting
-        # We ask for "Varied" levels and instruct model to label correctly
-        sys_prompt = f"""
-        You are an expert CBSE Question Setter.
-        Topic: {chapter}
-        Total Questions: {target_count}
+async def _generate_chapter_questions(
+    request: ExamRequest,
+    chapter: str,
+    target_count: int,
+    llm_slots: asyncio.Semaphore,
+    rag_result: Optional[dict] = None
+) -> List[QuestionModel]:
+    """
+    One chapter: retrieval (unless `rag_result` was fetched up front) + a
+    single streamed generation batch. Questions are deduplicated within the
+    chapter here; across chapters by the caller.
+    """
+    seen_texts = set()
+    # Calculate local distribution string for prompt
+    local_dist = _calculate_distribution(target_count, request.bloomsDistribution)
+    dist_desc = ", ".join([f"{v} {k}" for k,v in local_dist.items() if v > 0])
+    
+    print(f"\n📘 Processing Chapter: {chapter} (Target: {target_count}, Mix: {dist_desc})")
+    
+    # 1. Retrieval (Specific to Chapter)
+    if not (rag_result and rag_result['chunks']):
+        query, filters, top_k = _chapter_search(request, chapter)
+        rag_result = await qdrant_service.hybrid_search(query, filters, top_k=top_k, endpoint="exam")
+    top_chunks = rag_result['chunks'][:4]
+    input_context = rag_result['context']
+    
+    chunk_ids = [c['id'] for c in top_chunks]
+    avg_confidence = sum(c.get('rerank_score', 0) for c in top_chunks) / len(top_chunks) if top_chunks else 0.0
+
+    # 2. Prompting
+    # We ask for "Varied" levels and instruct model to label correctly
+    sys_prompt = f"""
+    You are an expert CBSE Question Setter.
+    Topic: {chapter}
+    Total Questions: {target_count}
+    
+    REQUIRED DISTRIBUTION: {dist_desc}
+    
+    Context:
+    {input_context}
+    
+    Task:
+    1. Generate {target_count} unique Multiple Choice Questions (MCQs) solely based on '{chapter}'.
+    2. Strictly follow the requested distribution (e.g. if I asked for 1 Analyze, ensure one question is analytical).
+    3. In the JSON output, set "bloomsLevel" to the SPECIFIC level of that question (e.g. "Remember", "Apply"), do NOT put "Mixed".
+    """
+    
+    # We pass "Varied" to get_exam_prompt, but our sys_prompt overrides the instructions
+    user_prompt = get_exam_prompt(rag_result['context'], "Varied", target_count, request.difficulty)
+    full_prompt = sys_prompt + "\n" + user_prompt
+
+    chapter_questions = []
+    chapter_usage = None
+    try:
+        # Token Budget: learned from past output lengths; until then the
+        # generous static estimate for a mixed batch
+        final_max_tokens = token_budget.max_tokens(
+            "exam", "MCQ", target_count, default=min((target_count * 800) + 1000, 8192)
+        )
+
+        # 3. Generation (streamed) + 4. Parsing: each question is validated
+        # and deduplicated as soon as its JSON object closes
+        stream = gemini_service.generate_stream(
+            full_prompt, 
+            temperature=0.4, 
+            max_tokens=final_max_tokens,
+            endpoint="exam",
+            question_type="MCQ"
+        )
         
-        REQUIRED DISTRIBUTION: {dist_desc}
+        # Retrieval runs freely; only the Gemini call waits for a slot
+        async with llm_slots:
+            with track_usage() as chapter_usage:
+                async for q_data in aiter_json_objects(stream):
+                    question = _prepare_question(q_data, chapter, seen_texts, chunk_ids, avg_confidence)
+                    if question:
+                        chapter_questions.append(question)
         
-        Context:
-        {input_context}
+        token_budget.observe(
+            "exam", "MCQ", target_count,
+            output_tokens=chapter_usage.output_tokens,
+            produced=len(chapter_questions),
+            limit=final_max_tokens,
+            truncated=chapter_usage.truncated > 0
+        )
         
-        Task:
-        1. Generate {target_count} unique Multiple Choice Questions (MCQs) solely based on '{chapter}'.
-        2. Strictly follow the requested distribution (e.g. if I asked for 1 Analyze, ensure one question is analytical).
-        3. In the JSON output, set "bloomsLevel" to the SPECIFIC level of that question (e.g. "Remember", "Apply"), do NOT put "Mixed".
-        """
+        print(f"    ✅ Parsed {len(chapter_questions)}/{target_count} questions for {chapter}")
         
-        # We pass "Varied" to get_exam_prompt, but our sys_prompt overrides the instructions
-        user_prompt = get_exam_prompt(rag_result['context'], "Varied", target_count, request.difficulty)
-        full_prompt = sys_prompt + "\n" + user_prompt
+    except Exception as e:
+        print(f"❌ Batch Error ({chapter}): {e}")
+    
+    # Keep complete questions even if the stream broke mid-way, and
+    # attribute this call's tokens evenly to the questions it produced
+    for question in chapter_questions:
+        question.tokensInput = chapter_usage.prompt_tokens // len(chapter_questions)
+        question.tokensOutput = chapter_usage.output_tokens // len(chapter_questions)
+    model_router.record_quality("exam", "MCQ", target_count, len(chapter_questions))
+    return chapter_questions
+
+def _chapter_concurrency() -> int:
+    """Parallel Gemini calls for one exam: a few per key of the routed tier, capped"""
+    keys = len(get_key_pool(model_router.route("exam", "MCQ").name))
+    return max(1, min(settings.EXAM_MAX_CONCURRENCY, keys * settings.EXAM_CALLS_PER_KEY))
+
+def _chapter_search(request: ExamRequest, chapter: str) -> tuple:
+    """(query, filters, top_k) of one chapter's retrieval"""
+    # Query asks for "Mixed Level" implicitly by not specifying one
+    query = f"{request.subject} objective questions about {chapter} concepts"
+    filters = {
+        "board": request.board,
+        "subject": request.subject,
+    }
+    # Using top_k=6 for sufficient context
+    return query, filters, 6
+
+async def _chapter_contexts(request: ExamRequest, targets: List[tuple]) -> dict:
+    """
+    RAG context for every chapter of a multi-chapter exam, fetched in one
+    batched Qdrant request with the same per-chapter query and filters as
+    the single-chapter path. Chapters missing from the result are searched
+    individually by _generate_chapter_questions.
+    """
+    if len(targets) < 2:
+        return {}
+    chapters = [chapter for chapter, _count in targets]
+    try:
+        results = await qdrant_service.hybrid_search_batch(
+            [_chapter_search(request, chapter) for chapter in chapters], endpoint="exam"
+        )
+    except Exception as e:
+        print(f"⚠️ Batched retrieval failed, searching per chapter: {e}")
+        return {}
+    return dict(zip(chapters, results))
+
+async def _iter_exam_chapters(request: ExamRequest, targets: List[tuple]):
+    """
+    Generate all chapters concurrently; yield (index, chapter, questions) in
+    completion order. Questions are not yet deduplicated across chapters.
+    """
+    parallel = _chapter_concurrency()
+    llm_slots = asyncio.Semaphore(parallel)
+    contexts = await _chapter_contexts(request, targets)
+    print(f"📚 Generating {len(targets)} chapters ({parallel} LLM calls in parallel)")
 
+    async def run(index: int, chapter: str, target_count: int):
         try:
-            # Token Budget
-            # Mixed batch needs generous tokens
-            final_max_tokens = min((target_count * 800) + 1000, 8192)
-
-            # 3. Generation
-            response_text = await gemini_service.generate(
-                full_prompt, 
-                temperature=0.4, 
-                max_tokens=final_max_tokens 
+            questions = await _generate_chapter_questions(
+                request, chapter, target_count, llm_slots, rag_result=contexts.get(chapter)
             )
-            
-            # 4. Parsing
-            clean_text = response_text.replace("```json", "").replace("```", "")
-            clean_json = repair_json(clean_text)
-            questions_data = json.loads(clean_json)
-            
-            if isinstance(questions_data, dict): questions_data = [questions_data]
-            
-            valid_count_batch = 0
-            for q_data in questions_data:
-                try:
-                    # Deduplication
-                    q_text = q_data.get('text', '').strip()
-                    if not q_text or len(q_text) < 10: continue
-                    
-                    is_dup = False
-                    for existing in seen_texts:
-                        if q_text in existing or existing in q_text:
-                            is_dup = True
-                            break
-                    if is_dup:
-                        print(f"    ⚠️ Skipping Duplicate: {q_text[:30]}...")
-                        # Try to salvage if partially duplicative? No, skip safety.
-                        continue
-                        
-                    seen_texts.add(q_text)
-
-                    # Normalize Options
-                    q_data['options'] = _normalize_options(q_data.get('options', []))
-                    if not _ensure_correct_answer(q_data, q_data.get('options', [])): continue
-
-                    # Enrich
-                    b_level = q_data.get('bloomsLevel', 'Remember')
-                    # Validation: Ensure it's a valid level string
-                    if b_level not in ["Remember", "Understand", "Apply", "Analyze", "Evaluate", "Create"]:
-                         b_level = "Apply" # Default fallback
-                    q_data['bloomsLevel'] = b_level
-                    
-                    # Difficulty Mapping
-                    if b_level in ["Remember", "Understand"]: q_data['difficulty'] = "Easy"
-                    elif b_level == "Apply": q_data['difficulty'] = "Medium"
-                    else: q_data['difficulty'] = "Hard"
-                    
-                    q_data['chapter'] = chapter
-                    q_data['marks'] = 1
-                    q_data['ragChunkIds'] = chunk_ids
-                    q_data['ragConfidence'] = round(avg_confidence, 4)
-                    q_data['qualityScore'] = min(1.0, avg_confidence * 1.1)
-                    
-                    options = q_data['options']
-                    while len(options) < 4:
-                        options.append(f"Option {chr(65+len(options))}")
-                    q_data['options'] = options[:4]
-                        
-                    all_questions.append(QuestionModel(**q_data))
-                    valid_count_batch += 1
-                        
-                except Exception as e:
-                    print(f"    ⚠️ Parse Error: {e}")
-                    continue
-            
-            print(f"    ✅ Parsed {valid_count_batch}/{target_count} questions for {chapter}")
-            
         except Exception as e:
-            print(f"❌ Batch Error ({chapter}): {e}")
-        
-        # Small delay between chapters
-        await asyncio.sleep(1)
+            print(f"❌ Chapter Error ({chapter}): {e}")
+            questions = []
+        return index, chapter, questions
+
+    tasks = [asyncio.create_task(run(i, chapter, count)) for i, (chapter, count) in enumerate(targets)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Client went away (streaming) or the caller failed: stop the rest
+        for task in tasks:
+            task.cancel()
+
+def _exam_summary(questions: List[QuestionModel], start_time: float) -> dict:
     # Final Verification
     actual_breakdown = {}
     total_marks = 0
-    for q in all_questions:
+    for q in questions:
         actual_breakdown[q.bloomsLevel] = actual_breakdown.get(q.bloomsLevel, 0) + 1
         total_marks += q.marks
 
-    return ExamResponse(
-        questions=all_questions,
-        bloomsBreakdown=actual_breakdown,
-        totalQuestions=len(all_questions),
-        totalMarks=total_marks,
-        generationTime=int((time.time() - start_time) * 1000)
+    return {
+        "bloomsBreakdown": actual_breakdown,
+        "totalQuestions": len(questions),
+        "totalMarks": total_marks,
+        "generationTime": int((time.time() - start_time) * 1000)
+    }
+
+@router.post("/v1/exam/generate", response_model=ExamResponse)
+async def generate_exam(request: ExamRequest):
+    start_time = time.time()
+    targets = _chapter_targets(request)
+
+    by_chapter = [[] for _ in targets]
+    async for index, _chapter, questions in _iter_exam_chapters(request, targets):
+        by_chapter[index] = questions
+
+    # Deterministic: chapter order, earlier chapters win duplicates
+    seen_texts = set()
+    all_questions = []
+    for questions in by_chapter:
+        all_questions.extend(_drop_duplicates(questions, seen_texts))
+
+    return ExamResponse(questions=all_questions, **_exam_summary(all_questions, start_time))
+
+@router.post("/v1/exam/generate/stream")
+async def generate_exam_stream(request: ExamRequest, format: str = "sse"):
+    """
+    Streaming variant of /v1/exam/generate: each validated question is sent
+    as soon as its chapter finishes (chapters run in parallel, so they arrive
+    in completion order), then a summary (bloomsBreakdown,
+    totalQuestions, totalMarks, generationTime).
+
+    format=sse (default): `event: question` / `event: chapter` / `event: summary`
+    format=ndjson: one JSON object per line with a "type" field
+    """
+    if format not in ("sse", "ndjson"):
+        raise HTTPException(400, "format must be 'sse' or 'ndjson'")
+    start_time = time.time()
+    # Validate before the 200 status line goes out
+    targets = _chapter_targets(request)
+
+    def encode(event: str, data: dict) -> str:
+        if format == "ndjson":
+            return json.dumps({"type": event, **data}, default=str) + "\n"
+        return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+    async def events():
+        all_questions = []
+        seen_texts = set()
+        try:
+            async for _index, chapter, questions in _iter_exam_chapters(request, targets):
+                # Chapters arrive as they finish; the first to arrive wins duplicates
+                questions = _drop_duplicates(questions, seen_texts)
+                for question in questions:
+                    yield encode("question", question.dict())
+                all_questions.extend(questions)
+                yield encode("chapter", {"chapter": chapter, "questions": len(questions)})
+        except Exception as e:
+            print(f"❌ Exam Stream Error: {e}")
+            yield encode("error", {"detail": str(e)})
+        yield encode("summary", _exam_summary(all_questions, start_time))
+
+    return StreamingResponse(
+        events(),
+        media_type="application/x-ndjson" if format == "ndjson" else "text/event-stream",
+        # Identity encoding keeps GZipMiddleware from buffering the events
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "Content-Encoding": "identity"}
     )
 
 @router.post("/v1/exam/generate-pdf")
@@ -265,6 +427,8 @@ class BoardExamRequest(BaseModel):
     class_num: int = 10
     subject: str = "Mathematics"
     chapters: Optional[List[str]] = None
+    # Reuse the id from a timed-out/failed attempt to resume it (any string the client picks)
+    generation_id: Optional[str] = None
 
 @router.post("/v1/exam/generate-board", tags=["V1 Board"])
 async def generate_board_exam(
@@ -274,32 +438,41 @@ async def generate_board_exam(
     """
     Generate FULL CBSE Board Exam (Sections A-E) using RAG + LLM.
     Strictly follows 2025-26 Pattern.
+    Send the same generation_id again to resume an interrupted run.
     """
     if x_internal_key != "dev_secret_key_12345":
         raise HTTPException(status_code=401, detail="Invalid API key")
     
     try:
-        generator = LLMExamGenerator()
-        exam = await generator.generate_cbse_board_exam(
-            board=request.board,
-            class_num=request.class_num,
-            subject=request.subject,
-            chapters=request.chapters
-        )
-        
-        # Save backup to avoid data loss on timeout
-        try:
-            with open("latest_generated_board_exam.json", "w", encoding="utf-8") as f:
-                json.dump(exam, f, indent=2)
-            print("✅ Backup saved to latest_generated_board_exam.json")
-        except Exception as e:
-            print(f"⚠️ Failed to save backup: {e}")
-
-        return {
-            "success": True,
-            "type": "board_exam_v1",
-            "exam": exam
-        }
+        return await run_board_generation(request)
     except Exception as e:
         print(f"❌ Board Gen Error: {e}")
-        raise HTTPException(500, f"Error generating board exam: {str(e)}")
\ No newline at end of file
+        raise HTTPException(500, f"Error generating board exam: {str(e)}")
+
+async def run_board_generation(request: BoardExamRequest) -> dict:
+    """Board exam generation shared by the endpoint above and the job API"""
+    generator = LLMExamGenerator()
+    exam = await generator.generate_cbse_board_exam(
+        board=request.board,
+        class_num=request.class_num,
+        subject=request.subject,
+        chapters=request.chapters,
+        generation_id=request.generation_id
+    )
+    
+    # Save backup to avoid data loss on timeout
+    try:
+        with open("latest_generated_board_exam.json", "w", encoding="utf-8") as f:
+            json.dump(exam, f, indent=2)
+        print("✅ Backup saved to latest_generated_board_exam.json")
+    except Exception as e:
+        print(f"⚠️ Failed to save backup: {e}")
+
+    return {
+        "success": True,
+        "type": "board_exam_v1",
+        # True when the request deadline / an upstream outage cut generation short
+        "partial": exam.get('metadata', {}).get('partial', False),
+        "generationId": exam.get('metadata', {}).get('generationId'),
+        "exam": exam
+    }
\ No newline at end of file
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException, Header, Depends
 from typing import Optional
+import asyncio
 import time
 import os
 import uuid
@@ -18,6 +19,8 @@ from app.services.board_exam_generator import board_exam_generator
 from app.services.custom_exam_generator import custom_exam_generator
 from app.services.pdfgenerator import pdf_generator
 from app.config.settings import settings
+from app.utils.progress import progress_stage
+from app.utils.usage import track_usage
 
 router = APIRouter(prefix="/v2/exam", tags=["Exam Generation V2"])
 
@@ -43,7 +46,8 @@ async def generate_teacher_board_exam(
         print(f"[API] Template: {request.template_id}")
 
         # 1. Generate (Qdrant Only)
-        exam_data = await board_exam_generator.generate(request.template_id)
+        with track_usage() as usage:
+            exam_data = await board_exam_generator.generate(request.template_id)
         
         # 2. Generate PDFs
         # pdfgenerator returns a tuple: (student_filename, teacher_filename)
@@ -89,6 +93,8 @@ async def generate_teacher_board_exam(
             exam_pdf_url=exam_url,
             answer_key_pdf_url=key_url,
             generation_method=GenerationMethod.PRE_GENERATED,
+            tokens_used=usage.total_tokens,
+            cost_usd=round(usage.cost_usd, 6),
             latency_ms=exam_data['latency_ms'],
             quality_score=0.0 # Placeholder or calculate if available
         )
@@ -112,55 +118,63 @@ async def generate_teacher_custom_exam(
     Uses Redis Cache -> Qdrant -> LLM Fallback.
     """
     try:
-        # 1. Generate (Hybrid)
+        return await build_custom_exam(request)
+
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def build_custom_exam(request: CustomExamRequest) -> DualPDFResponse:
+    """Custom exam + PDFs, shared by the endpoint above and the job API"""
+    # 1. Generate (Hybrid) - cache hits cost nothing for this request
+    with track_usage() as usage, progress_stage("generate"):
         exam_data = await custom_exam_generator.generate(request.dict())
+    
+    # 2. Generate PDFs (If not cached logic handles it, or regen here)
+    if "exam_pdf_url" not in exam_data:
+        # PDF rendering is CPU-bound: keep it off the event loop
+        with progress_stage("pdf"):
+            student_fname, teacher_fname = await asyncio.to_thread(pdf_generator.generate_dual_pdfs, exam_data)
+        exam_data["exam_pdf_url"] = f"/static/pdfs/{student_fname}"
+        exam_data["answer_key_pdf_url"] = f"/static/pdfs/{teacher_fname}"
         
-        # 2. Generate PDFs (If not cached logic handles it, or regen here)
-        if "exam_pdf_url" not in exam_data:
-            student_fname, teacher_fname = pdf_generator.generate_dual_pdfs(exam_data)
-            exam_data["exam_pdf_url"] = f"/static/pdfs/{student_fname}"
-            exam_data["answer_key_pdf_url"] = f"/static/pdfs/{teacher_fname}"
-            
-        # 3. Flatten questions for response model (Custom gen returns sections dict)
-        # FIXED: Handle both sections dict and questions list structures
-        all_qs_v2 = []
-
-        if isinstance(exam_data.get('sections'), dict):
-            for sec_qs in exam_data['sections'].values():
-                for q in sec_qs:
-                    try:
-                        all_qs_v2.append(QuestionV2(**q))
-                    except Exception as qe:
-                        print(f"⚠️ Skipping invalid question: {qe}")
-        elif isinstance(exam_data.get('questions'), list):
-            for q in exam_data['questions']:
+    # 3. Flatten questions for response model (Custom gen returns sections dict)
+    # FIXED: Handle both sections dict and questions list structures
+    all_qs_v2 = []
+
+    if isinstance(exam_data.get('sections'), dict):
+        for sec_qs in exam_data['sections'].values():
+            for q in sec_qs:
                 try:
                     all_qs_v2.append(QuestionV2(**q))
                 except Exception as qe:
                     print(f"⚠️ Skipping invalid question: {qe}")
-        else:
-            print("⚠️ No valid question structure found in exam_data")
-
-        return DualPDFResponse(
-            exam_id=exam_data['exam_id'],
-            mode=GenerationMode.CUSTOM,
-            total_marks=exam_data['total_marks'],
-            total_questions=exam_data['total_questions'],
-            chapters_covered=exam_data['chapters_covered'],
-            exam_pdf_url=exam_data['exam_pdf_url'],
-            answer_key_pdf_url=exam_data['answer_key_pdf_url'],
-            generation_method=exam_data['generation_method'],
-            cost_usd=exam_data.get('cost_usd', 0.0),
-            latency_ms=exam_data['latency_ms'],
-            quality_score=exam_data.get('quality_score', 0.0),
-            cache_key=exam_data.get('cache_key')
-        )
+    elif isinstance(exam_data.get('questions'), list):
+        for q in exam_data['questions']:
+            try:
+                all_qs_v2.append(QuestionV2(**q))
+            except Exception as qe:
+                print(f"⚠️ Skipping invalid question: {qe}")
+    else:
+        print("⚠️ No valid question structure found in exam_data")
 
-    except Exception as e:
-        print(f"❌ Error: {e}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=str(e))
+    return DualPDFResponse(
+        exam_id=exam_data['exam_id'],
+        mode=GenerationMode.CUSTOM,
+        total_marks=exam_data['total_marks'],
+        total_questions=exam_data['total_questions'],
+        chapters_covered=exam_data['chapters_covered'],
+        exam_pdf_url=exam_data['exam_pdf_url'],
+        answer_key_pdf_url=exam_data['answer_key_pdf_url'],
+        generation_method=exam_data['generation_method'],
+        tokens_used=usage.total_tokens,
+        cost_usd=round(usage.cost_usd, 6),
+        latency_ms=exam_data['latency_ms'],
+        quality_score=exam_data.get('quality_score', 0.0),
+        cache_key=exam_data.get('cache_key')
+    )
 
 # --- ENDPOINT 3: STUDENT PRACTICE ---
 @router.post("/student/practice", response_model=PracticeExamResponse)
@@ -3,6 +3,7 @@ from app.models.flashcardmodels import FlashcardRequest, FlashcardResponse, Flas
 # ✅ USE QDRANT SERVICE
 from app.services.qdrant_service import qdrant_service
 from app.services.geminiservice import GeminiService
+from app.services.model_router import model_router
 from app.config.prompts import get_flashcard_prompt
 from json_repair import repair_json
 import json
@@ -16,12 +17,12 @@ async def generate_flashcards(request: FlashcardRequest):
     filters = {"board": request.board, "class": request.class_num, "subject": request.subject}
     
     # ✅ QDRANT SEARCH (FIXED: Added await)
-    rag_result = await qdrant_service.hybrid_search(query, filters, top_k=8)
+    rag_result = await qdrant_service.hybrid_search(query, filters, top_k=8, endpoint="flashcards")
     
     prompt = get_flashcard_prompt(rag_result['context'], request.cardCount)
     
     # Increased tokens
-    response_text = await gemini_service.generate(prompt, temperature=0.3, max_tokens=2000)
+    response_text = await gemini_service.generate(prompt, temperature=0.3, max_tokens=2000, endpoint="flashcards")
     
     flashcards = []
     try:
@@ -60,6 +61,8 @@ async def generate_flashcards(request: FlashcardRequest):
         print(f"❌ Error parsing flashcards: {e}")
         raise HTTPException(500, "Failed to generate flashcards.")
 
+    model_router.record_quality("flashcards", None, request.cardCount, len(flashcards))
+
     type_counts = {}
     for c in flashcards:
         type_counts[c.type] = type_counts.get(c.type, 0) + 1
@@ -0,0 +1,90 @@
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import FileResponse, StreamingResponse
+import asyncio
+import os
+import time
+
+from app.models.exam_models_v2 import CustomExamRequest
+from app.routers.exam import BoardExamRequest, run_board_generation
+from app.routers.exam_v2 import build_custom_exam, verify_internal_key
+from app.services.job_manager import JobQueueFull, job_manager
+from app.services.pdfgenerator import pdf_generator
+from app.utils.progress import progress_stage
+
+router = APIRouter(prefix="/v1/jobs", tags=["Jobs"])
+
+# Long generations run as background jobs: POST returns 202 + a job id at
+# once; poll GET /v1/jobs/{id} or stream GET /v1/jobs/{id}/events (SSE).
+
+def _accepted(kind: str, run) -> dict:
+    try:
+        record = job_manager.submit(kind, run)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=f"Too many jobs in progress: {e}")
+    return {
+        "jobId": record["id"],
+        "kind": kind,
+        "status": record["status"],
+        "statusUrl": f"/v1/jobs/{record['id']}",
+        "eventsUrl": f"/v1/jobs/{record['id']}/events"
+    }
+
+@router.post("/board-exam", status_code=202)
+async def submit_board_exam(request: BoardExamRequest, _auth: str = Depends(verify_internal_key)):
+    """Async variant of POST /v1/exam/generate-board"""
+    return _accepted("board_exam", lambda: run_board_generation(request))
+
+@router.post("/teacher-custom", status_code=202)
+async def submit_teacher_custom(request: CustomExamRequest, _auth: str = Depends(verify_internal_key)):
+    """Async variant of POST /v2/exam/teacher/custom"""
+    async def run():
+        response = await build_custom_exam(request)
+        return response.dict()
+    return _accepted("teacher_custom", run)
+
+@router.post("/exam-pdf", status_code=202)
+async def submit_exam_pdf(exam_data: dict, _auth: str = Depends(verify_internal_key)):
+    """Async variant of POST /v1/exam/generate-pdf (download via /v1/jobs/{id}/file)"""
+    exam_id = exam_data.get('examId', f"exam_{int(time.time())}")
+    return _accepted("exam_pdf", lambda: _render_pdf(pdf_generator.generate_exam_pdf, exam_id, exam_data))
+
+@router.post("/answer-key-pdf", status_code=202)
+async def submit_answer_key_pdf(exam_data: dict, _auth: str = Depends(verify_internal_key)):
+    """Async variant of POST /v1/exam/generate-answer-key"""
+    exam_id = exam_data.get('examId', f"exam_{int(time.time())}")
+    return _accepted("answer_key_pdf", lambda: _render_pdf(pdf_generator.generate_teacher_pdf, exam_id, exam_data))
+
+async def _render_pdf(render, exam_id: str, exam_data: dict) -> dict:
+    # PDF rendering is CPU-bound: keep it off the event loop
+    with progress_stage("pdf"):
+        pdf_path = await asyncio.to_thread(render, exam_id, exam_data)
+    return {"examId": exam_id, "pdfPath": pdf_path}
+
+@router.get("/{job_id}")
+async def get_job(job_id: str, _auth: str = Depends(verify_internal_key)):
+    record = await job_manager.get(job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return record
+
+@router.get("/{job_id}/events")
+async def stream_job_events(job_id: str, _auth: str = Depends(verify_internal_key)):
+    """Server-Sent Events: `progress` on every change, then `done` with the result"""
+    return StreamingResponse(
+        job_manager.events(job_id),
+        media_type="text/event-stream",
+        # Identity encoding keeps GZipMiddleware from buffering the events
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "Content-Encoding": "identity"}
+    )
+
+@router.get("/{job_id}/file")
+async def get_job_file(job_id: str, _auth: str = Depends(verify_internal_key)):
+    record = await job_manager.get(job_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    if record["status"] != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job is {record['status']}")
+    pdf_path = (record.get("result") or {}).get("pdfPath")
+    if not pdf_path or not os.path.exists(pdf_path):
+        raise HTTPException(status_code=404, detail="Job has no file")
+    return FileResponse(pdf_path, media_type='application/pdf', filename=os.path.basename(pdf_path))
@@ -3,9 +3,9 @@ from app.models.quizmodels import QuizRequest, QuizResponse, QuizQuestionModel
 # ✅ USE QDRANT SERVICE
 from app.services.qdrant_service import qdrant_service
 from app.services.geminiservice import GeminiService
+from app.services.model_router import model_router
 from app.config.prompts import get_quiz_prompt
-from json_repair import repair_json
-import json
+from app.utils.json_stream import aiter_json_objects
 import time
 
 router = APIRouter()
@@ -22,8 +22,20 @@ async def generate_quiz(request: QuizRequest):
         "subject": request.subject
     }
     
-    # ✅ QDRANT SEARCH (FIXED: Added await)
-    rag_result = await qdrant_service.hybrid_search(query, filters, top_k=8)
+    # ✅ QDRANT SEARCH: several chapters are grouped server-side so each one
+    # gets its share of the top-8 instead of one chapter taking over
+    rag_result = None
+    if len(request.chapters) > 1:
+        rag_result = await qdrant_service.hybrid_search_groups(
+            query, filters,
+            group_by="chapter",
+            group_values=request.chapters,
+            group_size=max(2, -(-8 // len(request.chapters))),
+            endpoint="quiz"
+        )
+    if not (rag_result and rag_result['chunks']):
+        # Single chapter, or chapter names not matching the indexed payload
+        rag_result = await qdrant_service.hybrid_search(query, filters, top_k=8, endpoint="quiz")
     
     prompt = get_quiz_prompt(
         context=rag_result['context'],
@@ -31,36 +43,42 @@ async def generate_quiz(request: QuizRequest):
         difficulty=request.difficulty
     )
     
-    try:
-        response_text = await gemini_service.generate(prompt, temperature=0.5, max_tokens=2500)
-    except Exception as e:
-        print(f"❌ Gemini Error: {e}")
-        raise HTTPException(500, "AI Service Unavailable")
-    
     questions = []
+    received = 0
     try:
-        clean_json = repair_json(response_text)
-        questions_data = json.loads(clean_json)
-        
-        for q in questions_data:
-            if 'answer' in q and 'correctAnswer' not in q:
-                q['correctAnswer'] = q['answer']
-            if 'bloomsLevel' not in q: q['bloomsLevel'] = 'Apply'
-            if 'marks' not in q: q['marks'] = 1
-            if 'difficulty' not in q: q['difficulty'] = request.difficulty
-            
-            if 'text' not in q or 'options' not in q or 'correctAnswer' not in q:
-                continue 
-            if 'explanation' not in q:
-                q['explanation'] = f"The correct answer is {q['correctAnswer']}."
+        # Streamed: questions are checked as soon as each JSON object closes
+        stream = gemini_service.generate_stream(prompt, temperature=0.5, max_tokens=2500, endpoint="quiz")
+        async for q in aiter_json_objects(stream):
+            received += 1
+            try:
+                if 'answer' in q and 'correctAnswer' not in q:
+                    q['correctAnswer'] = q['answer']
+                if 'bloomsLevel' not in q: q['bloomsLevel'] = 'Apply'
+                if 'marks' not in q: q['marks'] = 1
+                if 'difficulty' not in q: q['difficulty'] = request.difficulty
+                
+                if 'text' not in q or 'options' not in q or 'correctAnswer' not in q:
+                    continue 
+                if 'explanation' not in q:
+                    q['explanation'] = f"The correct answer is {q['correctAnswer']}."
 
-            q['sourcePage'] = q.get('sourcePage', 0)
-            
-            if len(q.get('options', [])) == 4:
-                questions.append(QuizQuestionModel(**q))
+                q['sourcePage'] = q.get('sourcePage', 0)
+                
+                if len(q.get('options', [])) == 4:
+                    questions.append(QuizQuestionModel(**q))
+            except Exception as e:
+                print(f"⚠️ Skipping invalid quiz question: {e}")
             
     except Exception as e:
-        print(f"❌ Error parsing quiz: {e}")
+        print(f"❌ Gemini Error: {e}")
+        # A stream cut short still keeps the complete questions received so far
+        if not questions:
+            raise HTTPException(500, "AI Service Unavailable")
+
+    model_router.record_quality("quiz", None, request.numQuestions, len(questions))
+
+    if not received:
+        print("❌ Error parsing quiz: no JSON questions in response")
         raise HTTPException(500, "Failed to generate valid quiz questions.")
 
     blooms_dist = {}
@@ -20,7 +20,7 @@ async def tutor_answer(request: TutorRequest):
         full_query = f"{last_text} {request.query}"
         
     # ✅ QDRANT SEARCH (FIXED: Added await)
-    rag_result = await qdrant_service.hybrid_search(full_query, request.filters, top_k=5)
+    rag_result = await qdrant_service.hybrid_search(full_query, request.filters, top_k=5, endpoint="tutor")
     
     prompt = get_tutor_prompt(
         query=request.query,
@@ -31,7 +31,7 @@ async def tutor_answer(request: TutorRequest):
     
     # Increased tokens
     max_tokens = 1500 
-    response_text = await gemini_service.generate(prompt, max_tokens=max_tokens)
+    response_text = await gemini_service.generate(prompt, max_tokens=max_tokens, endpoint="tutor")
     
     sources = []
     if rag_result.get('chunks'):
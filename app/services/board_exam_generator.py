@@ -4,6 +4,7 @@ import time
 import asyncio
 from fastapi import HTTPException
 from app.config.cbse_templates import get_template
+from app.config.settings import settings
 from app.services.qdrant_service import qdrant_service
 from app.services.deduplication import deduplicate_questions
 from app.services.quality_scorer import calculate_quality_score, BOARD_QUALITY_THRESHOLD
@@ -46,9 +47,9 @@ class BoardExamGenerator:
         print(f"[BOARD] Target: {total_questions} questions across {len(template.sections)} sections")
         
         # ========================================
-        # 2. BUILD PARALLEL QUERIES
+        # 2. BUILD QUERY SPECS (one per section)
         # ========================================
-        tasks = []
+        specs = []
         task_metadata = [] 
         
         # ✅ FIX: Use direct subject matching
@@ -77,18 +78,20 @@ class BoardExamGenerator:
                 # Removed: qualityScore filter (relax for MVP)
             }
             
-            # Semantic query text (helps with vector search)
+            # Semantic query text (only used by BOARD_SELECTION_MODE="vector")
             query_text = f"{template.board} Class {template.class_num} {target_subject} {section_type} questions"
-            
-            # Create async task
-            tasks.append(qdrant_service.search_questions(query_text, filters, fetch_limit))
+            specs.append((query_text, filters, fetch_limit))
             task_metadata.append(f"{section_type} ({section['code']})")
 
         # ========================================
-        # 3. EXECUTE QUERIES IN PARALLEL
+        # 3. EXECUTE ALL SECTIONS AS ONE BATCH
         # ========================================
-        print(f"[BOARD] 🚀 Launching {len(tasks)} parallel Qdrant queries...")
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        print(f"[BOARD] 🚀 Launching {len(specs)} section queries in one batch...")
+        try:
+            results = await self._fetch_candidates(specs)
+        except Exception as e:
+            # One round trip: it succeeds or fails for every section
+            results = [e] * len(specs)
         
         # ========================================
         # 4. ERROR TRACKING & FAIL-FAST
@@ -109,15 +112,15 @@ class BoardExamGenerator:
                 logger.warning(f"⚠️ No results for {task_metadata[i]}")
 
         # ✅ CRITICAL: Fail fast if database is unstable
-        if len(tasks) > 0:
-            failure_rate = failed_count / len(tasks)
+        if len(specs) > 0:
+            failure_rate = failed_count / len(specs)
             if failure_rate > 0.30:  # 30% threshold
                 raise HTTPException(
                     status_code=503,
                     detail=f"Database instability: {int(failure_rate*100)}% of queries failed. Please try again later."
                 )
 
-        print(f"[BOARD] 📦 Total candidates fetched: {len(all_candidates)} (Failures: {failed_count}/{len(tasks)})")
+        print(f"[BOARD] 📦 Total candidates fetched: {len(all_candidates)} (Failures: {failed_count}/{len(specs)})")
         
         # ========================================
         # 5. GLOBAL DEDUPLICATION
@@ -250,6 +253,20 @@ class BoardExamGenerator:
             "latency_ms": latency_ms
         }
 
+    async def _fetch_candidates(self, specs: List[tuple]) -> List[Dict]:
+        """
+        Candidate questions for every section, in one batched Qdrant request.
+        The filters alone define each pool, so the default is a filter-only
+        selection (no embedding, unbiased); BOARD_SELECTION_MODE="vector"
+        restores the similarity search on the section's query text.
+        """
+        mode = settings.BOARD_SELECTION_MODE
+        if mode in ("random", "least_used"):
+            return await qdrant_service.select_by_filter_batch(
+                [(filters, limit) for _query, filters, limit in specs], order=mode
+            )
+        return await qdrant_service.search_questions_batch(specs, endpoint="board_exam_bank")
+
     def _calculate_section_blooms(self, section: Dict, overall_blooms: Dict, count: int) -> Dict[str, int]:
         """
         Section-specific Bloom's taxonomy distribution.
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from app.config.settings import settings
+from app.utils.async_clients import AsyncRedis
+from app.utils.memory_cache import LRUCache
+from app.utils.metrics import metrics
+
+Unit = Tuple[str, str]  # (chapter, question type)
+
+
+class BoardCheckpoint:
+    """
+    Completed (chapter, type) units of one board exam generation.
+
+    Handed down to the generator: units() on start, save() as each unit
+    finishes. A retry with the same generation id sees the saved questions
+    and only generates what is still missing.
+    """
+
+    def __init__(self, store: "CheckpointStore", generation_id: str, units: Dict[Unit, List[Dict]]):
+        self.store = store
+        self.generation_id = generation_id
+        self._units = units
+        self.resumed_units = len(units)
+        self._lock = threading.Lock()
+
+    def units(self, chapter: str) -> Dict[str, List[Dict]]:
+        """Saved questions for a chapter, by type"""
+        with self._lock:
+            return {qtype: list(qs) for (ch, qtype), qs in self._units.items() if ch == chapter}
+
+    async def save(self, chapter: str, question_type: str, questions: List[Dict]):
+        if not questions:
+            return
+        with self._lock:
+            self._units[(chapter, question_type)] = list(questions)
+        await self.store.write_unit(self.generation_id, chapter, question_type, questions)
+
+
+class CheckpointStore:
+    """
+    Redis-backed checkpoints for long generations, keyed by generation id.
+
+    Layout: one hash per generation, `boardgen:v1:{id}`, holding a
+    fingerprint of the request plus one field per (chapter, type) unit with
+    its questions as JSON. The whole hash expires CHECKPOINT_TTL_SECONDS after
+    the last write. A generation id reused with different inputs starts over.
+
+    Redis is shared by every worker, so a retry may land anywhere; without
+    Redis (or for REDIS_RETRY_AFTER_SECONDS after an error) an in-process LRU
+    keeps same-worker retries resumable.
+    """
+
+    KEY_PREFIX = "boardgen:v1:"
+    FINGERPRINT_FIELD = "__fingerprint"
+
+    def __init__(self):
+        self.enabled = settings.CHECKPOINT_ENABLED
+        self.ttl = settings.CHECKPOINT_TTL_SECONDS
+        self.memory = LRUCache(maxsize=200, ttl=self.ttl)
+        self.redis: Optional[AsyncRedis] = AsyncRedis("checkpoints")
+
+    @staticmethod
+    def fingerprint(**params) -> str:
+        raw = json.dumps(params, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    def _field(chapter: str, question_type: str) -> str:
+        return f"{chapter}|{question_type}"
+
+    def _redis_up(self) -> bool:
+        return bool(self.redis and self.redis.available)
+
+    async def _read(self, key: str) -> Dict[str, str]:
+        if self._redis_up():
+            try:
+                return await self.redis.client().hgetall(key)
+            except Exception as e:
+                self.redis.failed(e)
+        return dict(self.memory.get(key) or {})
+
+    async def open(self, generation_id: str, fingerprint: str) -> BoardCheckpoint:
+        """Load (or start) the checkpoint for a generation"""
+        key = self.KEY_PREFIX + generation_id
+        units: Dict[Unit, List[Dict]] = {}
+
+        stored = await self._read(key) if self.enabled else {}
+        if stored and stored.get(self.FINGERPRINT_FIELD) == fingerprint:
+            for field, raw in stored.items():
+                if field == self.FINGERPRINT_FIELD:
+                    continue
+                chapter, _, qtype = field.rpartition("|")
+                try:
+                    units[(chapter, qtype)] = json.loads(raw)
+                except ValueError:
+                    continue
+            metrics.incr("checkpoint.resumed" if units else "checkpoint.started")
+        else:
+            if stored:
+                metrics.incr("checkpoint.fingerprint_mismatch")
+            await self._reset(key, fingerprint)
+            metrics.incr("checkpoint.started")
+
+        return BoardCheckpoint(self, generation_id, units)
+
+    async def _reset(self, key: str, fingerprint: str):
+        if not self.enabled:
+            return
+        self.memory.set(key, {self.FINGERPRINT_FIELD: fingerprint})
+        if self._redis_up():
+            try:
+                pipe = self.redis.client().pipeline()
+                pipe.delete(key)
+                pipe.hset(key, self.FINGERPRINT_FIELD, fingerprint)
+                pipe.expire(key, self.ttl)
+                await pipe.execute()
+            except Exception as e:
+                self.redis.failed(e)
+
+    async def write_unit(self, generation_id: str, chapter: str, question_type: str, questions: List[Dict]):
+        if not self.enabled:
+            return
+        key = self.KEY_PREFIX + generation_id
+        field = self._field(chapter, question_type)
+        raw = json.dumps(questions, default=str)
+
+        local = dict(self.memory.get(key) or {})
+        local[field] = raw
+        self.memory.set(key, local)
+        if self._redis_up():
+            try:
+                pipe = self.redis.client().pipeline()
+                pipe.hset(key, field, raw)
+                pipe.expire(key, self.ttl)
+                await pipe.execute()
+            except Exception as e:
+                self.redis.failed(e)
+        metrics.incr("checkpoint.units_saved")
+
+
+checkpoint_store = CheckpointStore()
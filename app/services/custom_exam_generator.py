@@ -48,13 +48,17 @@ class CustomExamGenerator:
         llm_used = False
         
         # 3. Fetch/Generate per Chapter
+        # A. Try Qdrant: every chapter's bank search in one batched request
+        bank = await self._fetch_from_qdrant(
+            template,
+            {ch: n for ch, n in chapter_dist.items() if n > 0},
+            request.get("difficulty", "Mixed")
+        )
+        
         for chapter, count in chapter_dist.items():
             if count == 0: continue
             
-            # A. Try Qdrant
-            qdrant_qs = await self._fetch_from_qdrant(
-                template, chapter, count, request.get("difficulty", "Mixed")
-            )
+            qdrant_qs = bank.get(chapter, [])
             
             print(f"[CUSTOM]   Chapter '{chapter}': Found {len(qdrant_qs)}/{count} in Qdrant")
             
@@ -73,7 +77,8 @@ class CustomExamGenerator:
                     
                     context_chunks = await qdrant_service.search_ncert_context(
                         query=f"CBSE {template.class_num} {template.subject} {chapter}",
-                        limit=5
+                        limit=5,
+                        endpoint="custom_exam"
                     )
                     
                     generated = await self._generate_with_gemini(
@@ -116,24 +121,31 @@ class CustomExamGenerator:
             dist[chapters[0]] += (total - assigned)
         return dist
 
-    async def _fetch_from_qdrant(self, template, chapter, count, difficulty):
-       
-        filters = {
-            "board": template.board,
-            "class": template.class_num,
-            "subject": template.subject,
-            "chapter": chapter,
-            # "qualityScore": {"$gte": self.quality_threshold} # Relaxed for now
-        }
-        if difficulty != "Mixed":
-            filters["difficulty"] = difficulty
-            
-        res = await qdrant_service.search_questions(
-            query=f"{chapter} questions",
-            filters=filters,
-            limit=int(count * 1.5)
-        )
+    async def _fetch_from_qdrant(self, template, chapter_counts: Dict[str, int], difficulty) -> Dict[str, List[Dict]]:
+        """Question-bank hits per chapter, all chapters in one batch search"""
+        if not chapter_counts:
+            return {}
         
+        specs = []
+        for chapter, count in chapter_counts.items():
+            filters = {
+                "board": template.board,
+                "class": template.class_num,
+                "subject": template.subject,
+                "chapter": chapter,
+                # "qualityScore": {"$gte": self.quality_threshold} # Relaxed for now
+            }
+            if difficulty != "Mixed":
+                filters["difficulty"] = difficulty
+            specs.append((f"{chapter} questions", filters, int(count * 1.5)))
+            
+        results = await qdrant_service.search_questions_batch(specs, endpoint="custom_exam")
+        return {
+            chapter: self._to_questions(res, chapter, difficulty)
+            for chapter, res in zip(chapter_counts, results)
+        }
+    
+    def _to_questions(self, res: Dict, chapter: str, difficulty) -> List[Dict]:
         questions = []
         for chunk in res.get("chunks", []):
             meta = chunk.get("metadata", {})
@@ -178,7 +190,7 @@ class CustomExamGenerator:
         """
         
         try:
-            txt = await gemini.generate(prompt, temperature=0.5, max_tokens=3000)
+            txt = await gemini.generate(prompt, temperature=0.5, max_tokens=3000, endpoint="custom_exam")
             from json_repair import repair_json
             data = json.loads(repair_json(txt))
             if isinstance(data, dict): data = [data]
@@ -0,0 +1,146 @@
+import hashlib
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.config.settings import settings
+from app.utils.async_clients import AsyncRedis
+from app.utils.memory_cache import LRUCache
+from app.utils.metrics import metrics
+
+# 1-byte header identifying the stored dtype, so entries written with one
+# EMBED_CACHE_DTYPE setting stay readable after it changes
+_DTYPE_HEADERS = {"float16": b"\x02", "float32": b"\x04"}
+_HEADER_DTYPES = {v: k for k, v in _DTYPE_HEADERS.items()}
+
+
+class EmbeddingCache:
+    """
+    Content-addressed, two-tier cache for dense vectors:
+    - Tier 1: in-process LRU (no I/O)
+    - Tier 2: Redis, shared by all workers and scripts, vectors stored as raw bytes
+
+    Key = sha256(model | task_type | normalized text), so identical strings
+    (fixed retrieval queries, unchanged chunks on re-index) are embedded once.
+    """
+
+    KEY_PREFIX = "emb:v1:"
+
+    def __init__(self):
+        self.enabled = settings.EMBED_CACHE_ENABLED
+        self.ttl = settings.EMBED_CACHE_TTL
+        self.dtype = settings.EMBED_CACHE_DTYPE if settings.EMBED_CACHE_DTYPE in _DTYPE_HEADERS else "float32"
+        self.memory = LRUCache(maxsize=settings.EMBED_CACHE_MEMORY_SIZE)
+
+        # Binary-safe client (the JSON caches use decode_responses=True)
+        self.redis = AsyncRedis("embedding_cache", decode_responses=False)
+
+    # ---------- Keys & Encoding ----------
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Collapse whitespace so formatting-only differences share an entry"""
+        return " ".join((text or "").split())
+
+    def make_key(self, text: str, model: str, task_type: str) -> str:
+        raw = f"{model}|{task_type}|{self.normalize(text)}"
+        return self.KEY_PREFIX + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _encode(self, vector: List[float]) -> bytes:
+        return _DTYPE_HEADERS[self.dtype] + np.asarray(vector, dtype=self.dtype).tobytes()
+
+    @staticmethod
+    def _decode(blob: bytes) -> Optional[List[float]]:
+        dtype = _HEADER_DTYPES.get(blob[:1])
+        if dtype is None:
+            return None
+        return np.frombuffer(blob[1:], dtype=dtype).astype(np.float32).tolist()
+
+    # ---------- Lookups ----------
+
+    async def aget_many(self, texts: List[str], model: str, task_type: str) -> List[Optional[List[float]]]:
+        """Return cached vectors aligned with `texts` (None for misses)"""
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        if not self.enabled or not texts:
+            return results
+
+        keys = [self.make_key(t, model, task_type) for t in texts]
+        redis_lookup: Dict[str, List[int]] = {}
+
+        for i, key in enumerate(keys):
+            vec = self.memory.get(key)
+            if vec is not None:
+                results[i] = list(vec)
+                metrics.incr("embedding_cache.hit", tier="memory")
+            else:
+                redis_lookup.setdefault(key, []).append(i)
+
+        if redis_lookup and self.redis.available:
+            lookup_keys = list(redis_lookup)
+            try:
+                blobs = await self.redis.client().mget(lookup_keys)
+            except Exception as e:
+                self.redis.failed(e)
+                blobs = [None] * len(lookup_keys)
+
+            for key, blob in zip(lookup_keys, blobs):
+                vec = self._decode(blob) if blob else None
+                if vec is None:
+                    continue
+                self.memory.set(key, vec)
+                for i in redis_lookup.pop(key):
+                    results[i] = list(vec)
+                    metrics.incr("embedding_cache.hit", tier="redis")
+
+        misses = sum(len(idx) for idx in redis_lookup.values())
+        if misses:
+            metrics.incr("embedding_cache.miss", misses)
+        return results
+
+    async def aget(self, text: str, model: str, task_type: str) -> Optional[List[float]]:
+        return (await self.aget_many([text], model, task_type))[0]
+
+    # ---------- Writes ----------
+
+    async def aset_many(self, texts: List[str], vectors: List[Optional[List[float]]], model: str, task_type: str):
+        """Store vectors for texts; None vectors (failed embeddings) are skipped"""
+        if not self.enabled:
+            return
+
+        to_store = {}
+        for text, vec in zip(texts, vectors):
+            if not vec:
+                continue
+            key = self.make_key(text, model, task_type)
+            self.memory.set(key, list(vec))
+            to_store[key] = self._encode(vec)
+
+        if to_store and self.redis.available:
+            try:
+                pipe = self.redis.client().pipeline(transaction=False)
+                for key, blob in to_store.items():
+                    pipe.set(key, blob, ex=self.ttl)
+                await pipe.execute()
+            except Exception as e:
+                self.redis.failed(e)
+
+    async def aset(self, text: str, vector: List[float], model: str, task_type: str):
+        await self.aset_many([text], [vector], model, task_type)
+
+    def stats(self) -> Dict:
+        return {
+            "memory_entries": len(self.memory),
+            "hits_memory": metrics.get("embedding_cache.hit", tier="memory"),
+            "hits_redis": metrics.get("embedding_cache.hit", tier="redis"),
+            "misses": metrics.get("embedding_cache.miss"),
+            "hit_rate": self._hit_rate()
+        }
+
+    def _hit_rate(self) -> float:
+        hits = metrics.get("embedding_cache.hit", tier="memory") + metrics.get("embedding_cache.hit", tier="redis")
+        total = hits + metrics.get("embedding_cache.miss")
+        return round(hits / total, 4) if total else 0.0
+
+
+# Shared by every GeminiService instance in the process
+embedding_cache = EmbeddingCache()
@@ -0,0 +1,230 @@
+import asyncio
+import os
+import re
+import threading
+import time
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import google.generativeai as genai
+import google.ai.generativelanguage as glm
+
+from app.config.settings import settings
+from app.services.model_router import model_router
+from app.services.quota_ledger import quota_ledger
+from app.utils.async_clients import LoopBound
+from app.utils.metrics import metrics
+from app.utils.rate_limit import TokenBucket
+
+logger = logging.getLogger("examready")
+
+
+def load_api_keys() -> List[str]:
+    """GEMINI_API_KEY plus every GEMINI_API_KEY_<n> in the environment (numeric order)"""
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    numbered = []
+    for name, value in os.environ.items():
+        match = re.fullmatch(r"GEMINI_API_KEY_(\d+)", name)
+        if match:
+            numbered.append((int(match.group(1)), value))
+
+    keys = [settings.GEMINI_API_KEY] + [v for _, v in sorted(numbered)]
+
+    # Filter out invalid keys (None / empty / placeholder) and duplicates
+    unique = []
+    for k in keys:
+        if k and len(k) > 10 and k not in unique:
+            unique.append(k)
+    return unique
+
+
+class KeySlot:
+    """One API key with its own clients, rate-limit buckets and health state"""
+
+    def __init__(self, index: int, api_key: str, rpm: int, tpm: int, tier: str = "standard"):
+        self.index = index
+        self.api_key = api_key
+        self.label = f"key{index + 1}" if tier == "standard" else f"{tier}:key{index + 1}"
+        # Gemini limits are per key AND model, so each tier has its own ledger window
+        self.ledger_id = quota_ledger.key_id(api_key) + ("" if tier == "standard" else f":{tier}")
+
+        self.rpm = TokenBucket(rpm, period=60)
+        self.tpm = TokenBucket(tpm, period=60)
+
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self.consecutive_429 = 0
+
+        self._sync_client = None
+        # gRPC aio channels bind to the event loop that created them
+        self._async_client = LoopBound(
+            lambda: glm.GenerativeServiceAsyncClient(client_options={"api_key": api_key})
+        )
+        self._models: Dict[str, genai.GenerativeModel] = {}
+
+    @property
+    def sync_client(self) -> glm.GenerativeServiceClient:
+        if self._sync_client is None:
+            self._sync_client = glm.GenerativeServiceClient(client_options={"api_key": self.api_key})
+        return self._sync_client
+
+    @property
+    def async_client(self) -> glm.GenerativeServiceAsyncClient:
+        # Created lazily in the running event loop, and again if it changes
+        # (scripts that call asyncio.run() more than once)
+        return self._async_client.get()
+
+    def get_model(self, model_name: str) -> genai.GenerativeModel:
+        """GenerativeModel permanently bound to THIS key (no global genai.configure)"""
+        model = self._models.get(model_name)
+        if model is None:
+            model = genai.GenerativeModel(model_name)
+            # The SDK lazily fills these from the process-global default client;
+            # pre-binding them keeps every request on this slot's key.
+            model._client = self.sync_client
+            self._models[model_name] = model
+        model._async_client = self.async_client  # current loop's client
+        return model
+
+    def is_cooling(self, now: float) -> bool:
+        return now < self.cooldown_until
+
+
+class GeminiKeyPool:
+    """
+    Pool of Gemini API keys used in parallel.
+
+    - Each key has a separate client and RPM/TPM token buckets
+    - acquire() hands out the least-loaded healthy key with budget left,
+      waiting (async) when every key is saturated
+    - A key that returns 429 cools down (exponential) and is skipped meanwhile
+    - Every reservation is also checked against the Redis quota ledger, so all
+      workers/pods share one view of each key's window and cooldown
+    - One pool per model tier: the same keys, but separate limits and windows
+    """
+
+    def __init__(self, api_keys: List[str], tier: str = "standard", rpm: int = None, tpm: int = None):
+        if not api_keys:
+            raise ValueError("❌ No valid GEMINI_API_KEY found in environment variables")
+        self.tier = tier
+        self.rpm_limit = rpm or settings.GEMINI_KEY_RPM
+        self.tpm_limit = tpm or settings.GEMINI_KEY_TPM
+        self.slots = [KeySlot(i, k, self.rpm_limit, self.tpm_limit, tier) for i, k in enumerate(api_keys)]
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    @property
+    def keys(self) -> List[str]:
+        return [s.api_key for s in self.slots]
+
+    # ---------- Selection ----------
+
+    def _try_acquire(self, tokens: int, exclude: Iterable[int]) -> Tuple[Optional[KeySlot], float]:
+        """Reserve a slot if one has budget; otherwise return seconds to wait"""
+        now = time.monotonic()
+        exclude = set(exclude or ())
+
+        with self._lock:
+            candidates = [s for s in self.slots if s.index not in exclude] or self.slots
+            healthy = [s for s in candidates if not s.is_cooling(now)]
+
+            # Least loaded first, then the one with most request budget left
+            for slot in sorted(healthy, key=lambda s: (s.in_flight, -s.rpm.available())):
+                if slot.rpm.can_consume(1) and slot.tpm.can_consume(tokens):
+                    slot.rpm.try_consume(1)
+                    slot.tpm.try_consume(tokens)
+                    slot.in_flight += 1
+                    return slot, 0.0
+
+            waits = []
+            for slot in candidates:
+                waits.append(max(
+                    slot.cooldown_until - now,
+                    slot.rpm.time_until(1),
+                    slot.tpm.time_until(tokens)
+                ))
+            return None, max(0.05, min(waits))
+
+    def _reject(self, slot: KeySlot, tokens: int, wait: float):
+        """Undo a local reservation the shared ledger refused and back off locally"""
+        with self._lock:
+            slot.in_flight = max(0, slot.in_flight - 1)
+            slot.rpm.refund(1)
+            slot.tpm.refund(tokens)
+            slot.cooldown_until = max(slot.cooldown_until, time.monotonic() + wait)
+        metrics.incr("gemini.quota_ledger.rejected", key=slot.label)
+
+    async def acquire(self, tokens: int = 0, exclude: Iterable[int] = None) -> KeySlot:
+        """Wait for and reserve the best available key (local buckets + shared ledger)"""
+        while True:
+            slot, wait = self._try_acquire(tokens, exclude)
+            if slot:
+                try:
+                    ok, ledger_wait = await quota_ledger.reserve(
+                        slot.ledger_id, tokens, self.rpm_limit, self.tpm_limit
+                    )
+                except asyncio.CancelledError:
+                    # Caller gave up (deadline / client disconnect): don't leak the slot
+                    self._reject(slot, tokens, 0.0)
+                    raise
+                if ok:
+                    metrics.incr("gemini.requests", key=slot.label)
+                    return slot
+                # Another worker used this key's window - try the next key right away
+                self._reject(slot, tokens, ledger_wait)
+                continue
+            metrics.incr("gemini.key_pool.waits")
+            await asyncio.sleep(min(wait, 2.0))
+
+    # ---------- Feedback ----------
+
+    def release(self, slot: KeySlot, rate_limited: bool = False):
+        """Return a slot after a call; rate_limited=True puts the key on cooldown"""
+        with self._lock:
+            slot.in_flight = max(0, slot.in_flight - 1)
+
+            if rate_limited:
+                slot.consecutive_429 += 1
+                cooldown = settings.GEMINI_KEY_COOLDOWN_SECONDS * (2 ** min(slot.consecutive_429 - 1, 4))
+                slot.cooldown_until = time.monotonic() + cooldown
+                print(f"   ♻️  Rate Limit Hit on {slot.label} -> cooling down {cooldown:.0f}s")
+                metrics.incr("gemini.rate_limited", key=slot.label)
+            else:
+                slot.consecutive_429 = 0
+
+        if rate_limited:
+            quota_ledger.publish_cooldown(slot.ledger_id, cooldown)
+
+    def status(self) -> List[Dict]:
+        now = time.monotonic()
+        return [
+            {
+                "key": s.label,
+                "in_flight": s.in_flight,
+                "cooling_down_s": round(max(0.0, s.cooldown_until - now), 1),
+                "rpm_available": round(s.rpm.available(), 1),
+                "tpm_available": int(s.tpm.available())
+            }
+            for s in self.slots
+        ]
+
+
+_shared_pools: Dict[str, GeminiKeyPool] = {}
+
+
+def get_key_pool(tier: str = "standard") -> GeminiKeyPool:
+    """Process-wide pool for a model tier, shared by every GeminiService instance"""
+    pool = _shared_pools.get(tier)
+    if pool is None:
+        limits = model_router.tier(tier)
+        pool = GeminiKeyPool(load_api_keys(), tier=tier, rpm=limits.rpm, tpm=limits.tpm)
+        _shared_pools[tier] = pool
+    return pool
+
+
+def all_key_pools() -> Dict[str, GeminiKeyPool]:
+    return dict(_shared_pools)
@@ -1,190 +1,839 @@
 import google.generativeai as genai
+import google.ai.generativelanguage as glm
+from google.generativeai.embedding import to_task_type
 from app.config.settings import settings
-from typing import List
+from app.services.embedding_cache import embedding_cache
+from app.services.gemini_key_pool import get_key_pool
+from app.services.llm_cache import llm_cache
+from app.services.model_router import ModelRouter, ModelTier, model_router
+from app.utils.hedging import HedgePolicy
+from app.utils.metrics import metrics
+from app.utils.resilience import (
+    CircuitOpenError, DeadlineExceeded, allow_retry, backoff, check_deadline,
+    gemini_breaker, remaining_time
+)
+from app.utils.singleflight import SingleFlight
+from app.utils.usage import record_embedding, record_generation
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
 import time
 import asyncio
 import random
-import os
 import logging
+from contextlib import aclosing
 
 logger = logging.getLogger("examready")
 
+# Identical concurrent calls share one upstream request (process-wide)
+_llm_flight = SingleFlight("llm")
+_embed_flight = SingleFlight("embedding")
+
+# Adaptive hedge thresholds and budget, shared by every instance in the process
+hedge_policy = HedgePolicy(
+    percentile=settings.HEDGE_PERCENTILE,
+    min_samples=settings.HEDGE_MIN_SAMPLES,
+    budget_fraction=settings.HEDGE_BUDGET_FRACTION,
+    min_delay=settings.HEDGE_MIN_DELAY_SECONDS
+)
+
 class GeminiService:
     """
     Gemini API Integration with:
-    - Automatic Key Rotation (Round-Robin)
-    - Rate Limit Handling (429 / Quota)
+    - Per-key client pool used in parallel (no global key switching)
+    - Per-key RPM/TPM token buckets, least-loaded key selection
+    - Model tiers: each endpoint/question type is routed to a model (and that
+      model's key pool) by model_router; embeddings use their own pool
+    - Rate Limit Handling (429 -> key cooldown)
     - Server Error Handling (500)
     """
     
     def __init__(self):
-        # Ensure .env is loaded for additional keys
-        from dotenv import load_dotenv
-        load_dotenv()
-        
-        # 1. Load all available keys from Environment
-        self.api_keys = [
-            settings.GEMINI_API_KEY,
-            os.getenv("GEMINI_API_KEY_2"),
-            os.getenv("GEMINI_API_KEY_3"),
-            os.getenv("GEMINI_API_KEY_4")
-        ]
-        # Filter out invalid keys (None or empty strings)
-        self.api_keys = [k for k in self.api_keys if k and len(k) > 10]
-        
-        if not self.api_keys:
-            raise ValueError("❌ No valid GEMINI_API_KEY found in environment variables")
+        # Keys, clients and rate-limit state are shared by every instance in the process
+        self.key_pool = get_key_pool()
+        self.api_keys = self.key_pool.keys
+        # Gemini limits are per model: embeddings never spend generation quota
+        self.embed_pool = get_key_pool(ModelRouter.EMBEDDING)
 
-        print(f"   🔑 Loaded {len(self.api_keys)} Gemini API keys for rotation")
+        print(f"   🔑 Loaded {len(self.api_keys)} Gemini API keys (parallel pool)")
         
-        self.current_key_index = 0
         self.embedding_model = settings.GEMINI_EMBEDDING_MODEL
+    
+    @staticmethod
+    def _estimate_tokens(text: str) -> int:
+        """Rough token count for TPM budgeting (~4 chars per token)"""
+        return len(text) // 4 + 1
+    
+    @staticmethod
+    def _is_rate_limit(error_str: str) -> bool:
+        return "429" in error_str or "quota" in error_str or "rate limit" in error_str
+    
+    @staticmethod
+    def _is_server_error(error_str: str) -> bool:
+        return any(s in error_str for s in ("500", "internal", "503", "unavailable", "deadline"))
+    
+    async def _acquire_slot(self, pool, tokens: int, used_keys: set = None, started: asyncio.Event = None):
+        """
+        Check the request deadline and the Gemini breaker, then reserve a key
+        from `pool` (waiting for quota no longer than the request has left).
+        """
+        check_deadline("Gemini call")
+        gemini_breaker.before_call()
+        try:
+            slot = await asyncio.wait_for(
+                pool.acquire(tokens, exclude=used_keys), timeout=remaining_time()
+            )
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("Deadline exceeded waiting for Gemini quota")
+        if used_keys is not None:
+            used_keys.add(slot.index)
+        if started is not None:
+            started.set()
+        return slot
+    
+    @staticmethod
+    def _record_outcome(error_str: Optional[str]):
+        """Feed the breaker: server errors count as failures, 429s are per-key"""
+        if error_str is None:
+            gemini_breaker.record_success()
+        elif GeminiService._is_server_error(error_str):
+            gemini_breaker.record_failure()
+        elif not GeminiService._is_rate_limit(error_str):
+            gemini_breaker.record_success()  # e.g. 400: upstream is healthy
+    
+    async def generate(
+        self,
+        prompt: str,
+        temperature: float = 0.3,
+        max_tokens: int = 500,
+        max_retries: int = 3,
+        endpoint: str = None,
+        question_type: str = None
+    ) -> str:
+        """
+        Generate text (Async) on the least-loaded healthy key, with retry logic.
+        A 429 cools the key down and the retry goes to another key.
+        
+        `endpoint` names the caller (e.g. "tutor"); endpoints listed in
+        LLM_CACHE_ENDPOINTS are served from the prompt-response cache, and
+        identical in-flight prompts for them share a single Gemini call.
+        Calls for HEDGE_ENDPOINTS are hedged (see _hedge_race).
+        `endpoint` + `question_type` pick the model tier (MODEL_ROUTES).
+        """
+        tier = model_router.route(endpoint, question_type)
+        if not llm_cache.is_enabled_for(endpoint):
+            return await self._generate_routed(prompt, temperature, max_tokens, max_retries, endpoint, question_type)
         
-        # Configure with the first key
-        self._configure_current_key()
+        cache_key = llm_cache.make_key(tier.model, prompt, temperature, max_tokens)
+        cached = await llm_cache.get(cache_key, endpoint)
+        if cached is not None:
+            return cached
+        
+        async def fill() -> str:
+            text = await self._generate_routed(prompt, temperature, max_tokens, max_retries, endpoint, question_type)
+            await llm_cache.set(cache_key, text)
+            return text
+        
+        if not settings.SINGLE_FLIGHT_ENABLED:
+            return await fill()
+        return await _llm_flight.do(cache_key, fill)
+    
+    def _usage_counts(self, response, prompt: str, text: str) -> Tuple[int, int, int]:
+        """
+        (prompt, output, cached) tokens from response.usage_metadata when the SDK
+        exposes it; otherwise estimated from the text lengths.
+        """
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+            output_tokens = getattr(usage, "candidates_token_count", 0) or 0
+            cached_tokens = getattr(usage, "cached_content_token_count", 0) or 0
+            if prompt_tokens or output_tokens:
+                return prompt_tokens, output_tokens, cached_tokens
+        return self._estimate_tokens(prompt), self._estimate_tokens(text), 0
+    
+    @staticmethod
+    def _is_truncated(response, output_tokens: int, max_tokens: int) -> bool:
+        """finish_reason == MAX_TOKENS (estimated from the token count if unavailable)"""
+        try:
+            reason = response.candidates[0].finish_reason
+            return getattr(reason, "name", str(reason)) == "MAX_TOKENS"
+        except Exception:
+            return output_tokens >= max_tokens
+    
+    def _record_usage(
+        self,
+        response,
+        prompt: str,
+        text: str,
+        endpoint: str,
+        key: str,
+        started: float,
+        max_tokens: int,
+        tier: ModelTier,
+        route: str
+    ):
+        prompt_tokens, output_tokens, cached_tokens = self._usage_counts(response, prompt, text)
+        latency_ms = (time.monotonic() - started) * 1000
+        truncated = self._is_truncated(response, output_tokens, max_tokens)
+        record_generation(
+            prompt_tokens, output_tokens, cached_tokens,
+            endpoint=endpoint, key=key,
+            latency_ms=latency_ms,
+            truncated=truncated,
+            prices=tier.prices
+        )
+        model_router.observe_call(route, tier.name, latency_ms, truncated)
     
-    def _configure_current_key(self):
-        """Switch the active GenAI client to the current key"""
-        current_key = self.api_keys[self.current_key_index]
-        genai.configure(api_key=current_key)
-        self.model = genai.GenerativeModel(settings.GEMINI_MODEL)
+    @staticmethod
+    def _generation_config(temperature: float, max_tokens: int) -> genai.types.GenerationConfig:
+        return genai.types.GenerationConfig(
+            temperature=temperature,
+            max_output_tokens=max_tokens,
+            top_p=0.95,
+            top_k=40
+        )
     
-    def _rotate_key(self) -> bool:
+    async def _open_generation(
+        self,
+        slot,
+        model_name: str,
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        prompt_prefix: Optional[str] = None,
+        stream: bool = False
+    ):
         """
-        Switch to next available key.
-        Returns: True if rotated, False if only 1 key exists.
+        Start generate_content_async on `slot`. A `prompt_prefix` goes first, so
+        Gemini's implicit prefix caching can reuse it across calls.
         """
-        if len(self.api_keys) <= 1:
-            return False  # Can't rotate if we only have one key
+        config = self._generation_config(temperature, max_tokens)
+        if prompt_prefix:
+            prompt = prompt_prefix + "\n" + prompt
         
-        # Move to next index (Round Robin)
-        self.current_key_index = (self.current_key_index + 1) % len(self.api_keys)
-        self._configure_current_key()
-        print(f"   ♻️  Rate Limit Hit -> Rotating to Key #{self.current_key_index + 1}")
-        return True
+        model = slot.get_model(model_name)
+        return await model.generate_content_async(prompt, generation_config=config, stream=stream)
+    
+    # ---------- Hedging ----------
+    
+    def _should_hedge(self, endpoint: Optional[str], pool) -> bool:
+        return (
+            settings.HEDGE_ENABLED
+            and endpoint in settings.HEDGE_ENDPOINTS
+            and len(pool) > 1  # a hedge must go to a different key
+        )
     
-    async def generate(self, prompt: str, temperature: float = 0.3, max_tokens: int = 500, max_retries: int = 3) -> str:
+    async def _hedge_race(
+        self,
+        primary: asyncio.Future,
+        started: asyncio.Event,
+        make_backup: Callable[[], Awaitable],
+        hedge_class: str,
+        endpoint: str
+    ) -> Tuple[asyncio.Future, Any]:
         """
-        Generate text (Async) with automatic key rotation and retry logic.
+        Await `primary`; if it is still running after the adaptive threshold for
+        `hedge_class` (measured from when it got a key, not while it queued for
+        quota), start `make_backup()` - which runs on another key - and take
+        whichever succeeds first. The loser is cancelled. Hedges are limited to
+        HEDGE_BUDGET_FRACTION of recent calls.
+        
+        Returns (winning task, its result).
         """
-        keys_tried = 0
-        total_keys = len(self.api_keys)
+        tasks = [primary]
+        try:
+            started_wait = asyncio.ensure_future(started.wait())
+            try:
+                await asyncio.wait({primary, started_wait}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                started_wait.cancel()
+            clock = time.monotonic()
+            
+            hedged = False
+            delay = hedge_policy.delay(hedge_class)
+            if delay is not None and not primary.done():
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+                if not done:
+                    if hedge_policy.try_hedge():
+                        hedged = True
+                        tasks.append(asyncio.ensure_future(make_backup()))
+                        metrics.incr("gemini.hedge.issued", endpoint=endpoint)
+                    else:
+                        metrics.incr("gemini.hedge.over_budget", endpoint=endpoint)
+            if not hedged:
+                hedge_policy.record_call()
+            
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                succeeded = [t for t in done if not t.cancelled() and t.exception() is None]
+                if succeeded:
+                    winner = succeeded[0]
+                    hedge_policy.observe(hedge_class, time.monotonic() - clock)
+                    if winner is not primary:
+                        metrics.incr("gemini.hedge.won", endpoint=endpoint)
+                    return winner, winner.result()
+            
+            # Every attempt failed: surface the primary's error
+            return primary, primary.result()
         
-        # Allow retrying across keys
-        while keys_tried <= total_keys:
-            for attempt in range(max_retries):
-                try:
-                    response = await self.model.generate_content_async(
-                        prompt,
-                        generation_config=genai.types.GenerationConfig(
-                            temperature=temperature,
-                            max_output_tokens=max_tokens,
-                            top_p=0.95,
-                            top_k=40
-                        )
-                    )
-                    return response.text.strip()
+        finally:
+            losers = [t for t in tasks if not t.done()]
+            for task in losers:
+                task.cancel()
+            if losers:
+                # Let cancelled attempts release their keys before returning
+                await asyncio.gather(*losers, return_exceptions=True)
+    
+    async def _generate_routed(
+        self,
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        max_retries: int,
+        endpoint: str = None,
+        question_type: str = None
+    ) -> str:
+        """_generate_uncached, hedged for HEDGE_ENDPOINTS"""
+        tier = model_router.route(endpoint, question_type)
+        if not self._should_hedge(endpoint, get_key_pool(tier.name)):
+            return await self._generate_uncached(prompt, temperature, max_tokens, max_retries, endpoint, question_type)
+        
+        used_keys = set()
+        started = asyncio.Event()
+        primary = asyncio.ensure_future(self._generate_uncached(
+            prompt, temperature, max_tokens, max_retries, endpoint, question_type,
+            used_keys=used_keys, started=started
+        ))
+        _, text = await self._hedge_race(
+            primary,
+            started,
+            lambda: self._generate_uncached(
+                prompt, temperature, max_tokens, max_retries, endpoint, question_type, used_keys=used_keys
+            ),
+            # Latency scales with the model and output budget, so track each separately
+            hedge_class=f"{model_router.route_name(endpoint, question_type)}:{max_tokens}",
+            endpoint=endpoint
+        )
+        return text
+    
+    # ---------- Generation ----------
+    
+    async def _generate_uncached(
+        self,
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        max_retries: int,
+        endpoint: str = None,
+        question_type: str = None,
+        used_keys: set = None,
+        started: asyncio.Event = None
+    ) -> str:
+        """
+        One generation with key-pool routing and retries, on the route's model tier.
+        `used_keys` is shared between a call and its hedge so they pick different
+        keys; `started` is set once a key is held.
+        """
+        tier = model_router.route(endpoint, question_type)
+        route = model_router.route_name(endpoint, question_type)
+        pool = get_key_pool(tier.name)
+        reserved_tokens = self._estimate_tokens(prompt) + max_tokens
+        total_attempts = max_retries * len(pool)
+        server_errors = 0
+        
+        for attempt in range(total_attempts):
+            # Every retry draws on the request's shared budget and deadline
+            if attempt and not allow_retry("gemini"):
+                raise Exception("Gemini retry budget exhausted for this request")
+            slot = await self._acquire_slot(pool, reserved_tokens, used_keys, started)
+            
+            rate_limited = False
+            wait_time = 0
+            try:
+                started_at = time.monotonic()
+                response = await asyncio.wait_for(
+                    self._open_generation(slot, tier.model, prompt, temperature, max_tokens),
+                    timeout=remaining_time()
+                )
+                text = response.text.strip()
+                self._record_outcome(None)
+                self._record_usage(
+                    response, prompt, text, endpoint, slot.label, started_at, max_tokens, tier, route
+                )
+                return text
+            
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded("Deadline exceeded during Gemini generation")
+            
+            except Exception as e:
+                error_str = str(e).lower()
+                self._record_outcome(error_str)
                 
-                except Exception as e:
-                    error_str = str(e).lower()
-                    
-                    # Handle Rate Limit / Quota
-                    if "429" in error_str or "quota" in error_str or "rate limit" in error_str:
-                        if self._rotate_key():
-                            keys_tried += 1
-                            break # Break retry loop to try new key immediately
-                        else:
-                            # No backup keys, must wait
-                            wait_time = (2 ** attempt) * 2 + random.uniform(1, 3)
-                            print(f"   ⏳ Rate Limited. Waiting {wait_time:.1f}s...")
-                            await asyncio.sleep(wait_time)
-                    
-                    # Handle Server Errors (500)
-                    elif "500" in error_str or "internal" in error_str:
-                         wait_time = (2 ** attempt) * 2
-                         print(f"   ⚠️ Gemini Internal Error. Retrying in {wait_time}s...")
-                         await asyncio.sleep(wait_time)
-                    
-                    else:
-                        print(f"   ❌ Gemini Generation Error: {e}")
-                        raise e
+                # Handle Rate Limit / Quota -> cool this key down, retry elsewhere
+                if self._is_rate_limit(error_str):
+                    rate_limited = True
+                    continue
+                
+                # Handle Server Errors (500)
+                if self._is_server_error(error_str):
+                    server_errors += 1
+                    if server_errors >= max_retries:
+                        break
+                    wait_time = (2 ** (server_errors - 1)) * 2
+                    print(f"   ⚠️ Gemini Internal Error. Retrying in {wait_time}s...")
+                else:
+                    print(f"   ❌ Gemini Generation Error: {e}")
+                    raise e
             
-            # If retries exhausted for this key, try rotating
-            if not self._rotate_key():
-                 break
-            keys_tried += 1
+            finally:
+                # Also runs when a hedge race cancels this call
+                pool.release(slot, rate_limited=rate_limited)
+            
+            if wait_time:
+                await backoff(wait_time, "retry Gemini")
 
         raise Exception("Max retries exceeded on all available Gemini API keys")
 
-    def embed(self, text: str) -> List[float]:
+    async def generate_stream(
+        self,
+        prompt: str,
+        temperature: float = 0.3,
+        max_tokens: int = 500,
+        max_retries: int = 3,
+        endpoint: str = None,
+        question_type: str = None,
+        prompt_prefix: str = None
+    ) -> AsyncIterator[str]:
         """
-        Generate embedding vector (Sync) with robust error handling for 500s.
+        Streaming variant of generate(): yields text chunks as Gemini produces them.
+        
+        Retries (429 -> next key, 500 -> back-off) only happen before the first
+        chunk; once text has been yielded an error is raised to the caller, which
+        keeps whatever it already consumed. Cache hits are yielded as one chunk.
+        For HEDGE_ENDPOINTS a slow first chunk triggers a hedge on another key.
+        Consumers that stop early should wrap the stream in contextlib.aclosing().
+        
+        `prompt_prefix` is a large stable prompt head (e.g. system prompt + chapter
+        context) shared by many calls; it is sent ahead of `prompt` so Gemini's
+        implicit prefix caching can reuse it.
         """
-        max_retries = 4  # Increased retries for stability
+        cache_key = None
+        if llm_cache.is_enabled_for(endpoint):
+            model_name = model_router.route(endpoint, question_type).model
+            full_prompt = prompt_prefix + "\n" + prompt if prompt_prefix else prompt
+            cache_key = llm_cache.make_key(model_name, full_prompt, temperature, max_tokens)
+            cached = await llm_cache.get(cache_key, endpoint)
+            if cached is not None:
+                yield cached
+                return
         
-        for attempt in range(max_retries):
+        parts = []
+        routed = self._stream_routed(
+            prompt, temperature, max_tokens, max_retries, endpoint, question_type, prompt_prefix
+        )
+        async with aclosing(routed) as stream:
+            async for text in stream:
+                parts.append(text)
+                yield text
+        
+        if cache_key:
+            await llm_cache.set(cache_key, "".join(parts).strip())
+    
+    async def _stream_routed(
+        self,
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        max_retries: int,
+        endpoint: str = None,
+        question_type: str = None,
+        prompt_prefix: str = None
+    ) -> AsyncIterator[str]:
+        """_stream_uncached, hedged on time-to-first-chunk for HEDGE_ENDPOINTS"""
+        tier = model_router.route(endpoint, question_type)
+        if not self._should_hedge(endpoint, get_key_pool(tier.name)):
+            single = self._stream_uncached(
+                prompt, temperature, max_tokens, max_retries, endpoint, question_type, prompt_prefix
+            )
+            async with aclosing(single) as stream:
+                async for text in stream:
+                    yield text
+            return
+        
+        used_keys = set()
+        started = asyncio.Event()
+        streams = [self._stream_uncached(
+            prompt, temperature, max_tokens, max_retries, endpoint, question_type, prompt_prefix,
+            used_keys=used_keys, started=started
+        )]
+        
+        def make_backup():
+            streams.append(self._stream_uncached(
+                prompt, temperature, max_tokens, max_retries, endpoint, question_type, prompt_prefix,
+                used_keys=used_keys
+            ))
+            return streams[-1].__anext__()
+        
+        try:
+            primary = asyncio.ensure_future(streams[0].__anext__())
             try:
-                # Clean text to avoid whitespace issues
-                text = text.replace("\n", " ").strip()
-                if not text:
-                    return []
-
-                result = genai.embed_content(
-                    model=self.embedding_model,
-                    content=text,
-                    task_type="retrieval_document"
+                winner, first = await self._hedge_race(
+                    primary, started, make_backup,
+                    hedge_class=f"{model_router.route_name(endpoint, question_type)}:first_chunk",
+                    endpoint=endpoint
+                )
+            except StopAsyncIteration:
+                return  # empty response
+            
+            stream = streams[0] if winner is primary else streams[1]
+            yield first
+            async for text in stream:
+                yield text
+        finally:
+            for stream in streams:
+                await stream.aclose()
+    
+    async def _stream_uncached(
+        self,
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        max_retries: int,
+        endpoint: str = None,
+        question_type: str = None,
+        prompt_prefix: str = None,
+        used_keys: set = None,
+        started: asyncio.Event = None
+    ) -> AsyncIterator[str]:
+        """One streamed generation with key-pool routing and pre-first-chunk retries"""
+        tier = model_router.route(endpoint, question_type)
+        route = model_router.route_name(endpoint, question_type)
+        pool = get_key_pool(tier.name)
+        # Prefix tokens count towards the key's TPM, cached or not
+        full_prompt = prompt_prefix + "\n" + prompt if prompt_prefix else prompt
+        reserved_tokens = self._estimate_tokens(full_prompt) + max_tokens
+        total_attempts = max_retries * len(pool)
+        server_errors = 0
+        
+        for attempt in range(total_attempts):
+            if attempt and not allow_retry("gemini"):
+                raise Exception("Gemini retry budget exhausted for this request")
+            slot = await self._acquire_slot(pool, reserved_tokens, used_keys, started)
+            
+            parts = []
+            rate_limited = False
+            wait_time = 0
+            response = None
+            try:
+                started_at = time.monotonic()
+                response = await asyncio.wait_for(
+                    self._open_generation(
+                        slot, tier.model, prompt, temperature, max_tokens, prompt_prefix, stream=True
+                    ),
+                    timeout=remaining_time()
+                )
+                chunks = response.__aiter__()
+                while True:
+                    # Bound each chunk wait by the request deadline (never across a yield)
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout=remaining_time())
+                    except StopAsyncIteration:
+                        break
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        continue  # chunk without text parts (e.g. final finish_reason)
+                    if text:
+                        parts.append(text)
+                        yield text
+                self._record_outcome(None)
+                return
+            
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded(
+                    f"Deadline exceeded during Gemini stream ({len(parts)} chunks received)"
                 )
-                return result['embedding']
             
             except Exception as e:
                 error_str = str(e).lower()
+                self._record_outcome(error_str)
+                if parts:
+                    print(f"   ❌ Gemini stream interrupted after {len(parts)} chunks: {e}")
+                    raise
                 
-                # 1. Handle 500 Internal Server Error (Common with Embeddings)
-                if "500" in error_str or "internal error" in error_str:
-                    wait_time = (2 ** attempt) + random.uniform(0.5, 1.5)
-                    # Only log if it keeps failing
-                    if attempt > 0:
-                        print(f"   ⚠️ Gemini 500 Error (Attempt {attempt+1}). Retrying in {wait_time:.1f}s...")
-                    time.sleep(wait_time)
+                if self._is_rate_limit(error_str):
+                    rate_limited = True
                     continue
                 
-                # 2. Handle Rate Limits
-                if "429" in error_str or "quota" in error_str:
-                    if self._rotate_key():
-                        continue # Try new key immediately
-                    else:
-                        time.sleep(2)
-                        continue
+                if self._is_server_error(error_str):
+                    server_errors += 1
+                    if server_errors >= max_retries:
+                        break
+                    wait_time = (2 ** (server_errors - 1)) * 2
+                    print(f"   ⚠️ Gemini Internal Error. Retrying in {wait_time}s...")
+                else:
+                    print(f"   ❌ Gemini Generation Error: {e}")
+                    raise
+            
+            finally:
+                pool.release(slot, rate_limited=rate_limited)
+                # Also counts streams the consumer closed early or that broke mid-way
+                if parts:
+                    self._record_usage(
+                        response, full_prompt, "".join(parts), endpoint, slot.label, started_at,
+                        max_tokens, tier, route
+                    )
+            
+            if wait_time:
+                await backoff(wait_time, "retry Gemini")
+        
+        raise Exception("Max retries exceeded on all available Gemini API keys")
+
+    def _embed_content_request(self, text: str, task_type: str) -> glm.EmbedContentRequest:
+        return glm.EmbedContentRequest(
+            model=self.embedding_model,
+            content=glm.Content(parts=[glm.Part(text=text)]),
+            task_type=to_task_type(task_type)
+        )
+
+    async def embed_async(
+        self,
+        text: str,
+        task_type: str = "retrieval_document",
+        timeout: float = None,
+        max_retries: int = 4
+    ) -> List[float]:
+        """
+        Generate embedding vector (native Async) for the request path.
+        
+        - Uses the key's async gRPC client: no executor thread is held while waiting
+        - Back-off uses asyncio.sleep, bounded by a per-call deadline (`timeout`)
+        - Cancellation (client disconnect / outer deadline) propagates immediately
+          and releases the key slot
+        
+        Concurrent calls for the same text share one request.
+        Returns [] on failure.
+        """
+        text = text.replace("\n", " ").strip()
+        if not text:
+            return []
+        
+        cached = await embedding_cache.aget(text, self.embedding_model, task_type)
+        if cached:
+            return cached
+        
+        if not settings.SINGLE_FLIGHT_ENABLED:
+            return await self._embed_uncached(text, task_type, timeout, max_retries)
+        
+        vector = await _embed_flight.do(
+            embedding_cache.make_key(text, self.embedding_model, task_type),
+            lambda: self._embed_uncached(text, task_type, timeout, max_retries)
+        )
+        return list(vector)
+    
+    async def _embed_uncached(self, text: str, task_type: str, timeout: Optional[float], max_retries: int) -> List[float]:
+        """One embedding request with key-pool routing, retries and a deadline"""
+        # Never outlive the enclosing request's deadline
+        deadline = time.monotonic() + remaining_time(timeout or settings.EMBED_TIMEOUT_SECONDS)
+        request = self._embed_content_request(text, task_type)
+        
+        for attempt in range(max_retries):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            
+            try:
+                gemini_breaker.before_call()
+            except CircuitOpenError as e:
+                print(f"   ❌ Embedding skipped: {e}")
+                return []
+            
+            try:
+                slot = await asyncio.wait_for(
+                    self.embed_pool.acquire(self._estimate_tokens(text)), timeout=remaining
+                )
+            except asyncio.TimeoutError:
+                break
+            
+            rate_limited = False
+            try:
+                # retry=None: the client's default Retry would outlive our deadline
+                call_timeout = max(0.1, deadline - time.monotonic())
+                response = await asyncio.wait_for(
+                    slot.async_client.embed_content(request, retry=None, timeout=call_timeout),
+                    timeout=call_timeout
+                )
+                vector = list(response.embedding.values)
+                self._record_outcome(None)
+                record_embedding(self._estimate_tokens(text), key=slot.label)
+                await embedding_cache.aset(text, vector, self.embedding_model, task_type)
+                return vector
+            
+            except asyncio.TimeoutError:
+                self._record_outcome("deadline exceeded")
+                break
+            
+            except Exception as e:
+                error_str = str(e).lower()
+                rate_limited = self._is_rate_limit(error_str)
+                self._record_outcome(error_str)
+                
+                if rate_limited:
+                    continue  # pool routes the retry to another key
+                if "500" in error_str or "internal" in error_str or "503" in error_str:
+                    wait_time = (2 ** attempt) * 0.5 + random.uniform(0.1, 0.5)
+                    await asyncio.sleep(min(wait_time, max(0.0, deadline - time.monotonic())))
+                    continue
+                if "deadline" in error_str or "timeout" in error_str:
+                    break
                 
                 print(f"   ❌ Critical Embedding Error: {str(e)}")
                 return []
+            
+            finally:
+                self.embed_pool.release(slot, rate_limited=rate_limited)
         
-        print("   ❌ Failed to generate embedding after max retries")
+        print(f"   ❌ Embedding failed within {timeout or settings.EMBED_TIMEOUT_SECONDS}s deadline")
         return []
 
-    def embed_batch(self, texts: List[str], batch_size: int = 20) -> List[List[float]]:
+    async def _embed_request(
+        self,
+        texts: List[str],
+        task_type: str,
+        max_retries: int = 3
+    ) -> List[List[float]]:
         """
-        Generate embeddings for multiple texts.
-        Batch size reduced to 20 to prevent 500 errors.
+        Embed a list of texts with ONE batchEmbedContents call on a pooled key.
+        Retries 500s with back-off; 429s cool the key down and retry on another.
         """
-        embeddings = []
-        total = len(texts)
-        print(f"   Generating embeddings for {total} chunks...")
-        
-        for i in range(0, total, batch_size):
-            batch = texts[i:i+batch_size]
-            for text in batch:
-                emb = self.embed(text)
-                if emb:
-                    embeddings.append(emb)
-                else:
-                    # Fallback for failed embedding to keep list alignment
-                    embeddings.append([0.0] * 768) 
+        last_error = None
+        reserved_tokens = sum(self._estimate_tokens(t) for t in texts)
+        request = glm.BatchEmbedContentsRequest(
+            model=self.embedding_model,
+            requests=[self._embed_content_request(t, task_type) for t in texts]
+        )
+        
+        for attempt in range(max_retries):
+            slot = await self.embed_pool.acquire(reserved_tokens)
+            rate_limited = False
+            try:
+                response = await asyncio.wait_for(
+                    slot.async_client.batch_embed_contents(
+                        request, retry=None, timeout=settings.GEMINI_TIMEOUT_SECONDS
+                    ),
+                    timeout=settings.GEMINI_TIMEOUT_SECONDS
+                )
+                record_embedding(reserved_tokens, key=slot.label)
+                return [list(e.values) for e in response.embeddings]
+            
+            except Exception as e:
+                last_error = e
+                error_str = str(e).lower()
+                rate_limited = self._is_rate_limit(error_str)
                 
-                # Tiny delay to prevent flooding the API
-                time.sleep(0.1) 
+                if rate_limited:
+                    continue
+                elif "500" in error_str or "internal" in error_str or "503" in error_str:
+                    await asyncio.sleep((2 ** attempt) + random.uniform(0.5, 1.5))
+                else:
+                    # Non-retryable (e.g. 400 invalid content)
+                    break
             
-            # Progress update
-            print(f"   Processed {min(i+batch_size, total)}/{total}")
+            finally:
+                self.embed_pool.release(slot, rate_limited=rate_limited)
+        
+        raise last_error
+
+    async def embed_batch_async(
+        self,
+        texts: List[str],
+        batch_size: int = None,
+        max_concurrency: int = None,
+        task_type: str = "retrieval_document"
+    ) -> List[Optional[List[float]]]:
+        """
+        Generate embeddings for many texts using batched API requests.
+        
+        - Packs up to `batch_size` texts into each batchEmbedContents call
+        - Keeps up to `max_concurrency` batches in flight; the key pool spreads them across keys
+        - A failed batch is retried item-by-item so one bad text cannot sink its neighbours
+        
+        Returns a list aligned with `texts`. Items that could not be embedded are
+        None (and are reported individually) - callers must drop them, never index
+        a zero vector.
+        """
+        batch_size = min(batch_size or settings.EMBED_BATCH_SIZE, 100)
+        max_concurrency = max_concurrency or settings.EMBED_MAX_CONCURRENCY
+        
+        total = len(texts)
+        embeddings: List[Optional[List[float]]] = [None] * total
+        failures = {}
+        
+        # Empty texts are rejected by the API - report them up-front
+        cleaned = []
+        for idx, text in enumerate(texts):
+            text = (text or "").replace("\n", " ").strip()
+            if text:
+                cleaned.append((idx, text))
+            else:
+                failures[idx] = "empty text"
+        
+        # Serve repeats (unchanged chunks on re-index) from the cache
+        cached = await embedding_cache.aget_many([t for _, t in cleaned], self.embedding_model, task_type)
+        misses = []
+        for (idx, text), vec in zip(cleaned, cached):
+            if vec:
+                embeddings[idx] = vec
+            else:
+                misses.append((idx, text))
+        
+        if len(misses) < len(cleaned):
+            print(f"   ♻️  {len(cleaned) - len(misses)}/{len(cleaned)} embeddings served from cache")
+        cleaned = misses
+        
+        if not cleaned:
+            return embeddings
+        
+        batches = [cleaned[i:i+batch_size] for i in range(0, len(cleaned), batch_size)]
+        semaphore = asyncio.Semaphore(max_concurrency)
+        done = 0
+        
+        print(f"   Generating embeddings for {total} texts "
+              f"({len(batches)} batches, {max_concurrency} in flight, {len(self.api_keys)} keys)...")
+        
+        async def run_batch(batch_no: int, batch: list):
+            nonlocal done
+            
+            async with semaphore:
+                try:
+                    vectors = await self._embed_request([t for _, t in batch], task_type)
+                    for (idx, _), vec in zip(batch, vectors):
+                        embeddings[idx] = vec
+                except Exception as batch_error:
+                    # Isolate the offending item(s)
+                    print(f"   ⚠️ Embedding batch {batch_no + 1} failed ({batch_error}). Retrying items individually...")
+                    for idx, text in batch:
+                        try:
+                            vectors = await self._embed_request([text], task_type, max_retries=2)
+                            embeddings[idx] = vectors[0]
+                        except Exception as item_error:
+                            failures[idx] = str(item_error)
             
-        return embeddings
\ No newline at end of file
+            done += len(batch)
+            print(f"   Processed {done}/{len(cleaned)}")
+        
+        await asyncio.gather(*(run_batch(n, b) for n, b in enumerate(batches)))
+        
+        await embedding_cache.aset_many(
+            [t for _, t in cleaned],
+            [embeddings[idx] for idx, _ in cleaned],
+            self.embedding_model,
+            task_type
+        )
+        
+        if failures:
+            print(f"   ❌ {len(failures)}/{total} texts could not be embedded:")
+            for idx in sorted(failures):
+                print(f"      - item {idx}: {failures[idx][:120]}")
+        
+        return embeddings
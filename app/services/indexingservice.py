@@ -11,7 +11,7 @@ class IndexingService:
         self.vision_service = VisionService()
         self.gemini_service = GeminiService()
 
-    def process_pdf(self, pdf_path: str, metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
+    async def process_pdf(self, pdf_path: str, metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
         print(f"📖 Processing: {pdf_path}")
         
         pages = self.pdf_extractor.extract_pdf(pdf_path)
@@ -56,9 +56,15 @@ class IndexingService:
         if all_chunks:
             print(f"🧠 Generating embeddings for {len(all_chunks)} chunks...")
             texts = [c['text'] for c in all_chunks]
-            embeddings = self.gemini_service.embed_batch(texts)
+            embeddings = await self.gemini_service.embed_batch_async(texts)
             for i, chunk in enumerate(all_chunks):
                 chunk['embedding'] = embeddings[i]
+            
+            # Drop chunks whose embedding failed (never index placeholder vectors)
+            embedded = [c for c in all_chunks if c['embedding']]
+            if len(embedded) < len(all_chunks):
+                print(f"   ⚠️ Skipping {len(all_chunks) - len(embedded)} chunks without embeddings")
+            all_chunks = embedded
 
         return all_chunks
 
@@ -0,0 +1,214 @@
+import asyncio
+import contextvars
+import json
+import logging
+import time
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from app.config.settings import settings
+from app.utils.async_clients import AsyncRedis
+from app.utils.memory_cache import LRUCache
+from app.utils.metrics import metrics
+from app.utils.progress import Progress, track_progress
+from app.utils.resilience import request_budget
+from app.utils.usage import track_usage
+
+logger = logging.getLogger("examready")
+
+TERMINAL_STATES = ("succeeded", "failed", "cancelled")
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobManager:
+    """
+    Background jobs for long generations (board exams, custom exams, PDFs).
+
+    - submit() returns a job record at once; the work runs as a task in a
+      fresh context with its own deadline (JOB_TIMEOUT_SECONDS), retry budget
+      and token tracker, independent of the request that created it
+    - At most JOB_MAX_CONCURRENT jobs run per worker; the rest wait queued,
+      and submissions beyond JOB_MAX_QUEUED are refused
+    - Records (status, progress, stage timings, result) live in Redis for
+      JOB_RESULT_TTL_SECONDS, so any worker can answer GET/SSE for any job;
+      an in-process LRU is the fallback without Redis. Writes go to Redis in
+      the background, one job's writes in order, so progress updates never
+      block the event loop
+    """
+
+    KEY_PREFIX = "job:v1:"
+    DEADLINE_GRACE_SECONDS = 10
+
+    def __init__(self):
+        self.ttl = settings.JOB_RESULT_TTL_SECONDS
+        self.timeout = settings.JOB_TIMEOUT_SECONDS
+        self.memory = LRUCache(maxsize=500, ttl=self.ttl)
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._pending: Dict[str, Dict] = {}             # job id -> latest record not yet in Redis
+        self._writers: Dict[str, asyncio.Task] = {}     # job id -> task draining _pending
+        self.redis: Optional[AsyncRedis] = AsyncRedis("jobs")
+
+    # ---------- Storage ----------
+
+    def _save(self, record: Dict):
+        """Store `record` in memory now and queue its Redis write"""
+        self.memory.set(record["id"], record)
+        if not self.redis:
+            return
+        self._pending[record["id"]] = record
+        if record["id"] not in self._writers:
+            self._writers[record["id"]] = asyncio.create_task(self._write(record["id"]))
+
+    async def _write(self, job_id: str):
+        # Only the latest record matters: intermediate progress is skipped
+        try:
+            while job_id in self._pending:
+                record = self._pending.pop(job_id)
+                if not self.redis.available:
+                    continue
+                try:
+                    await self.redis.client().set(
+                        self.KEY_PREFIX + job_id, json.dumps(record, default=str), ex=self.ttl
+                    )
+                except Exception as e:
+                    self.redis.failed(e)
+        finally:
+            self._writers.pop(job_id, None)
+
+    async def _flush(self, job_id: str):
+        """Wait until the job's queued writes reached Redis"""
+        writer = self._writers.get(job_id)
+        if writer:
+            await asyncio.shield(writer)
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        # This worker's record is newer while its Redis write is still queued
+        if self.redis and self.redis.available and job_id not in self._writers:
+            try:
+                raw = await self.redis.client().get(self.KEY_PREFIX + job_id)
+                if raw:
+                    return json.loads(raw)
+            except Exception as e:
+                self.redis.failed(e)
+        record = self.memory.get(job_id)
+        return dict(record) if record else None
+
+    # ---------- Running ----------
+
+    def submit(self, kind: str, run: Callable[[], Awaitable[Any]]) -> Dict:
+        """Queue `run()` as a job and return its record (status "queued")"""
+        queued = sum(1 for task in self._tasks.values() if not task.done())
+        if queued >= settings.JOB_MAX_QUEUED:
+            metrics.incr("jobs.rejected", kind=kind)
+            raise JobQueueFull(f"{queued} jobs already queued or running")
+
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(settings.JOB_MAX_CONCURRENT)
+
+        record = {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "status": "queued",
+            "createdAt": time.time(),
+            "startedAt": None,
+            "finishedAt": None,
+            "progress": {},
+            "usage": None,
+            "result": None,
+            "error": None
+        }
+        self._save(record)
+        metrics.incr("jobs.submitted", kind=kind)
+
+        # Fresh context: the job must not inherit the submitting request's
+        # deadline, retry budget or usage tracker
+        task = asyncio.create_task(self._run(record, run), context=contextvars.Context())
+        self._tasks[record["id"]] = task
+        task.add_done_callback(lambda _t, job_id=record["id"]: self._tasks.pop(job_id, None))
+        return record
+
+    async def _run(self, record: Dict, run: Callable[[], Awaitable[Any]]):
+        progress = Progress(on_change=lambda: self._save({**record, "progress": progress.to_dict()}))
+        usage = None
+        try:
+            await self._slots.acquire()
+        except asyncio.CancelledError:
+            record.update(status="cancelled", error="Job cancelled before it started", finishedAt=time.time())
+            self._save(record)
+            await self._flush(record["id"])
+            raise
+        try:
+            record.update(status="running", startedAt=time.time())
+            self._save(record)
+            print(f"🛠️ Job {record['id']} ({record['kind']}) started")
+            try:
+                with request_budget(timeout=self.timeout, retries=settings.JOB_RETRY_BUDGET), \
+                        track_usage() as usage, track_progress(progress):
+                    result = await asyncio.wait_for(run(), timeout=self.timeout + self.DEADLINE_GRACE_SECONDS)
+                record.update(status="succeeded", result=result)
+            except asyncio.CancelledError:
+                record.update(status="cancelled", error="Job cancelled (worker shutting down)")
+                raise
+            except asyncio.TimeoutError:
+                record.update(status="failed", error=f"Job exceeded the {self.timeout}s deadline")
+            except Exception as e:
+                logger.exception(f"Job {record['id']} failed")
+                record.update(status="failed", error=str(e))
+            finally:
+                record.update(
+                    finishedAt=time.time(),
+                    progress=progress.to_dict(),
+                    usage=usage.to_dict() if usage is not None else None
+                )
+                self._save(record)
+                await self._flush(record["id"])
+                metrics.incr(f"jobs.{record['status']}", kind=record["kind"])
+                print(f"🛠️ Job {record['id']} {record['status']} in {record['finishedAt'] - record['startedAt']:.1f}s")
+        finally:
+            self._slots.release()
+
+    async def events(self, job_id: str, poll_seconds: float = 1.0, heartbeat_seconds: float = 15.0) -> AsyncIterator[str]:
+        """Server-Sent Events: the record on every change, until it finishes"""
+        last = None
+        last_sent = time.monotonic()
+        while True:
+            record = await self.get(job_id)
+            if record is None:
+                yield "event: error\ndata: {\"detail\": \"Job not found or expired\"}\n\n"
+                return
+
+            done = record["status"] in TERMINAL_STATES
+            snapshot = json.dumps({k: v for k, v in record.items() if k != "result"}, default=str)
+            if snapshot != last:
+                last = snapshot
+                last_sent = time.monotonic()
+                if done:
+                    yield f"event: done\ndata: {json.dumps(record, default=str)}\n\n"
+                    return
+                yield f"event: progress\ndata: {snapshot}\n\n"
+            elif time.monotonic() - last_sent > heartbeat_seconds:
+                last_sent = time.monotonic()
+                yield ": keep-alive\n\n"
+
+            await asyncio.sleep(poll_seconds)
+
+    async def shutdown(self):
+        """Cancel jobs still running in this worker (they are marked cancelled)"""
+        tasks = [task for task in self._tasks.values() if not task.done()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict:
+        return {
+            "active": sum(1 for task in self._tasks.values() if not task.done()),
+            "max_concurrent": settings.JOB_MAX_CONCURRENT
+        }
+
+
+job_manager = JobManager()
@@ -0,0 +1,60 @@
+import hashlib
+from typing import Optional
+
+from app.config.settings import settings
+from app.utils.async_clients import AsyncRedis
+from app.utils.memory_cache import LRUCache
+from app.utils.metrics import metrics
+
+
+class LLMResponseCache:
+    """
+    Opt-in prompt -> response cache for GeminiService.generate.
+
+    Key = sha256(model | temperature | max_tokens | prompt). Enabled per endpoint
+    via LLM_CACHE_ENDPOINTS, so low-temperature, repeat-heavy endpoints (tutor,
+    flashcards) can return in milliseconds while exam generation stays fresh.
+
+    Tier 1 is a size-bounded in-process LRU; tier 2 is Redis (shared by workers).
+    """
+
+    KEY_PREFIX = "llm:v1:"
+
+    def __init__(self):
+        self.ttl = settings.LLM_CACHE_TTL_SECONDS
+        self.endpoints = set(settings.LLM_CACHE_ENDPOINTS)
+        self.memory = LRUCache(maxsize=settings.LLM_CACHE_MAX_ENTRIES, ttl=self.ttl)
+        self.redis: Optional[AsyncRedis] = AsyncRedis("llm_cache")
+
+    def is_enabled_for(self, endpoint: Optional[str]) -> bool:
+        return bool(settings.LLM_CACHE_ENABLED and endpoint and endpoint in self.endpoints)
+
+    def make_key(self, model: str, prompt: str, temperature: float, max_tokens: int) -> str:
+        raw = f"{model}|{temperature:.3f}|{max_tokens}|{prompt}"
+        return self.KEY_PREFIX + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str, endpoint: str) -> Optional[str]:
+        text = self.memory.get(key)
+        if text is None and self.redis and self.redis.available:
+            try:
+                text = await self.redis.client().get(key)
+                if text is not None:
+                    self.memory.set(key, text)
+            except Exception as e:
+                self.redis.failed(e)
+
+        metrics.incr("llm_cache.hit" if text is not None else "llm_cache.miss", endpoint=endpoint)
+        return text
+
+    async def set(self, key: str, text: str):
+        if not text:
+            return
+        self.memory.set(key, text)
+        if self.redis and self.redis.available:
+            try:
+                await self.redis.client().set(key, text, ex=self.ttl)
+            except Exception as e:
+                self.redis.failed(e)
+
+
+llm_cache = LLMResponseCache()
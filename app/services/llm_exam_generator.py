@@ -1,11 +1,37 @@
 import asyncio
-import json
 import time
+import uuid
 import numpy as np
-from typing import List, Dict, Optional
+from contextlib import aclosing
+from typing import List, Dict, Optional, Tuple
 from app.services.qdrant_service import qdrant_service
 from app.services.geminiservice import GeminiService
-from json_repair import repair_json
+from app.utils.json_stream import aiter_grouped_json_objects, aiter_json_objects
+from app.config.settings import settings
+from app.services.token_budget import token_budget
+from app.services.checkpoint_store import BoardCheckpoint, checkpoint_store
+from app.services.model_router import model_router
+from app.utils.metrics import metrics
+from app.utils.resilience import (
+    CircuitOpenError, DeadlineExceeded, allow_retry, backoff, remaining_time
+)
+from app.utils.progress import progress_incr, progress_stage, report_progress
+from app.utils.usage import track_usage
+
+MARKS_BY_TYPE = {"MCQ": 1, "AR": 1, "VSA": 2, "SA": 3, "LA": 5, "CASE": 4}
+
+QUESTION_TYPE_REQUIREMENTS = {
+    "MCQ": "Format: 4 options (A-D), 1 correct. Plausible distractors.",
+    "AR": "Format: Assertion-Reason. Use standard options (Both true, etc.)",
+    "VSA": "Solvable in 2-3 mins. 1-2 steps. Direct application.",
+    "SA": "Solvable in 4-5 mins. 3-4 steps. Show method.",
+    "LA": "Solvable in 7-8 mins. 5-7 detailed steps. Multi-part allowed. COMPLETE all explanations.",
+    "CASE": "Scenario-based. 3-4 subquestions. Total 4 marks. COMPLETE all sub-parts."
+}
+
+# Static max_output_tokens per single-type call (LA/CASE need detailed
+# explanations), used until the adaptive token budget has enough samples
+DEFAULT_TOKEN_LIMITS = {"MCQ": 3000, "AR": 3000, "VSA": 3000, "SA": 5000, "LA": 8000, "CASE": 8000}
 
 class LLMExamGenerator:
     """
@@ -71,11 +97,15 @@ Return questions in this EXACT JSON structure:
         subject: str = "Mathematics",
         chapters: List[str] = None,
         difficulty_mode: str = "standard", # standard, easy, hard
-        avoid_topics: List[str] = None
+        avoid_topics: List[str] = None,
+        generation_id: Optional[str] = None
     ) -> Dict:
         """
         Generate full CBSE board exam with proper chapter distribution.
         Supports difficulty modes and topic avoidance for uniqueness.
+        
+        Completed (chapter, type) units are checkpointed under `generation_id`;
+        calling again with the same id and inputs resumes instead of starting over.
         """
         
         # Lazy Init Qdrant
@@ -96,104 +126,65 @@ Return questions in this EXACT JSON structure:
         # STEP 1: Calculate chapter-wise distribution
         chapter_distribution = self._calculate_chapter_distribution(chapters)
         
-        # STEP 2: Generate questions chapter by chapter
-        all_questions = []
+        # Resume from earlier attempts of this generation, if any
+        generation_id = generation_id or uuid.uuid4().hex
+        checkpoint = await checkpoint_store.open(generation_id, checkpoint_store.fingerprint(
+            board=board, class_num=class_num, subject=subject, chapters=chapters,
+            difficulty_mode=difficulty_mode, avoid_topics=avoid_topics
+        ))
+        if checkpoint.resumed_units:
+            print(f"♻️ Resuming generation {generation_id}: {checkpoint.resumed_units} units already done")
+        report_progress(
+            generationId=generation_id,
+            chaptersTotal=len(chapter_distribution),
+            chaptersDone=0,
+            questionsPlanned=sum(t['count'] for c in chapter_distribution for t in c['question_types']),
+            questionsGenerated=0
+        )
         
+        # STEP 2: Generate chapters concurrently. Every LLM call takes a slot
+        # from a pool sized from the key quota; results are assembled in
+        # chapter (then type) order, so the distribution plan is unchanged.
         start_time = time.time()
+        self._debug_log("Starting Board Exam Gen...", mode="w")
         
-        with open("board_gen_debug.log", "w", encoding="utf-8") as f:
-            f.write("Starting Board Exam Gen...\n")
+        parallel = self._generation_concurrency()
+        llm_slots = asyncio.Semaphore(parallel)
+        print(f"📚 Generating {len(chapter_distribution)} chapters ({parallel} LLM calls in parallel)")
         
-        for chapter_config in chapter_distribution:
-            chapter = chapter_config['chapter']
-            question_types = chapter_config['question_types']
-            
-            msg = f"Generating questions for: {chapter}"
-            print(msg)
-            with open("board_gen_debug.log", "a", encoding="utf-8") as f:
-                f.write(msg + "\n")
-            
-            # Get RAG context for this chapter (with fallback)
-            rag_context = None
-            try:
-                rag_context = await self._get_chapter_context(
+        with progress_stage("generate"):
+            results = await asyncio.gather(*[
+                self._generate_chapter(
+                    chapter_config,
                     subject=subject,
                     class_num=class_num,
-                    chapter=chapter
+                    difficulty_mode=difficulty_mode,
+                    avoid_topics=avoid_topics,
+                    llm_slots=llm_slots,
+                    checkpoint=checkpoint
                 )
-                
-                # If RAG returns nothing or too little, use LLM fallback
-                if not rag_context or len(rag_context) < 100:
-                    with open("board_gen_debug.log", "a", encoding="utf-8") as f:
-                        f.write(f"  ⚠️ Sparse RAG data for {chapter}, using LLM fallback\n")
-                    rag_context = f"""
-                    Generate questions for the chapter "{chapter}" from the CBSE Class {class_num} 
-                    NCERT Mathematics textbook. Use standard CBSE curriculum knowledge for this chapter.
-                    Ensure questions are appropriate for 15-16 year old students and follow CBSE 
-                    marking scheme standards.
-                    """
-                else:
-                    with open("board_gen_debug.log", "a", encoding="utf-8") as f:
-                        f.write(f"  ✅ Got RAG context (len: {len(rag_context)})\n")
-                    
-            except Exception as e:
-                with open("board_gen_debug.log", "a", encoding="utf-8") as f:
-                    f.write(f"  ⚠️ RAG Error: {e}, using LLM-only fallback\n")
-                # FALLBACK: Use LLM general knowledge (DON'T SKIP!)
-                rag_context = f"""
-                Generate questions for "{chapter}" based on standard CBSE Class {class_num} 
-                Mathematics curriculum. This is a fallback generation due to RAG unavailability.
-                """
-
-            # Generate each question type for this chapter
-            for qtype_config in question_types:
-                success = False
-                retry_count = 0
-                max_gen_retries = 5  # High retry count for resilience
-                
-                while not success and retry_count < max_gen_retries:
-                    try:
-                        with open("board_gen_debug.log", "a", encoding="utf-8") as f:
-                             f.write(f"  Generating {qtype_config['count']} {qtype_config['type']} (Attempt {retry_count+1})...\n")
-                             
-                        questions = await self._generate_questions_for_type(
-                            chapter=chapter,
-                            question_type=qtype_config['type'],
-                            count=qtype_config['count'],
-                            blooms_level=qtype_config['blooms'],
-                            rag_context=rag_context,
-                            difficulty_mode=difficulty_mode,
-                            avoid_topics=avoid_topics
-                        )
-                        
-                        if questions:
-                            with open("board_gen_debug.log", "a", encoding="utf-8") as f:
-                                 f.write(f"  ✅ Generated {len(questions)} questions.\n")
-                            all_questions.extend(questions)
-                            success = True
-                        else:
-                            raise Exception("Empty response from generator")
-                            
-                    except Exception as e:
-                        retry_count += 1
-                        wait_time = 30 * retry_count  # Progressive backoff: 30s, 60s, 90s...
-                        with open("board_gen_debug.log", "a", encoding="utf-8") as f:
-                            f.write(f"  ❌ Gen Error: {e}. Retrying in {wait_time}s...\n")
-                        await asyncio.sleep(wait_time)
-                
-                if not success:
-                    with open("board_gen_debug.log", "a", encoding="utf-8") as f:
-                        f.write(f"  💀 FAILED to generate {qtype_config['type']} for {chapter} after {max_gen_retries} attempts.\n")
-                    # Should we error out or continue? 
-                    # User wants COMPLETE exam. Erroring out might be safer to flag issues.
-                    # But partial is better than nothing? No, partial is "Failed".
-                    pass
+                for chapter_config in chapter_distribution
+            ], return_exceptions=True)
         
-        # STEP 3: Organize into sections
-        exam = self._organize_into_sections(all_questions)
+        all_questions = []
+        missing_parts = []  # "chapter/type" left incomplete (deadline, outage)
+        for chapter_config, result in zip(chapter_distribution, results):
+            if isinstance(result, BaseException):
+                print(f"❌ Chapter {chapter_config['chapter']} failed: {result}")
+                missing_parts.extend(
+                    f"{chapter_config['chapter']}/{t['type']}" for t in chapter_config['question_types']
+                )
+                continue
+            chapter_questions, chapter_missing = result
+            all_questions.extend(chapter_questions)
+            missing_parts.extend(chapter_missing)
         
-        # STEP 3.5: Post-generation validation - fix missing fields
-        exam = self._validate_and_fix_missing_fields(exam)
+        # STEP 3: Organize into sections
+        with progress_stage("assemble"):
+            exam = self._organize_into_sections(all_questions)
+            
+            # STEP 3.5: Post-generation validation - fix missing fields
+            exam = self._validate_and_fix_missing_fields(exam)
         
         # STEP 4: Add metadata
         exam['metadata'] = {
@@ -206,11 +197,191 @@ Return questions in this EXACT JSON structure:
             'generationMethod': 'RAG+LLM',
             'llmModel': 'gemini-2.5-flash',
             'chaptersUsed': chapters,
-            'generationTimeMs': int((time.time() - start_time) * 1000)
+            'generationTimeMs': int((time.time() - start_time) * 1000),
+            # Partial when the request deadline / retry budget / an open circuit
+            # stopped generation before every chapter-type was filled
+            'partial': bool(missing_parts),
+            'missingParts': missing_parts,
+            'generationId': generation_id,
+            'resumedUnits': checkpoint.resumed_units
         }
         
         return exam
     
+    def _debug_log(self, msg: str, mode: str = "a"):
+        with open("board_gen_debug.log", mode, encoding="utf-8") as f:
+            f.write(msg + "\n")
+
+    def _generation_concurrency(self) -> int:
+        """Parallel LLM calls for one board exam: a few per API key, capped"""
+        keys = len(self.gemini.key_pool)
+        return max(1, min(settings.BOARD_EXAM_MAX_CONCURRENCY, keys * settings.BOARD_EXAM_CALLS_PER_KEY))
+
+    async def _generate_chapter(
+        self,
+        chapter_config: Dict,
+        subject: str,
+        class_num: int,
+        difficulty_mode: str,
+        avoid_topics: Optional[List[str]],
+        llm_slots: asyncio.Semaphore,
+        checkpoint: Optional[BoardCheckpoint] = None
+    ) -> Tuple[List[Dict], List[str]]:
+        """
+        One chapter: RAG context, then the batched call, then concurrent
+        per-type follow-ups for whatever the batch left short. Units already
+        in `checkpoint` are reused and not generated again.
+        Returns (questions in type order, "chapter/type" parts left missing).
+        """
+        chapter = chapter_config['chapter']
+        question_types = chapter_config['question_types']
+        
+        saved = checkpoint.units(chapter) if checkpoint else {}
+        if all(len(saved.get(c['type'], [])) >= c['count'] for c in question_types):
+            self._debug_log(f"Checkpointed: {chapter}")
+            questions = [q for c in question_types for q in saved[c['type']][:c['count']]]
+            progress_incr("chaptersDone")
+            progress_incr("questionsGenerated", len(questions))
+            return questions, []
+        
+        msg = f"Generating questions for: {chapter}"
+        print(msg)
+        self._debug_log(msg)
+        
+        # Get RAG context for this chapter (with fallback)
+        rag_context = None
+        try:
+            rag_context = await self._get_chapter_context(
+                subject=subject,
+                class_num=class_num,
+                chapter=chapter
+            )
+            
+            # If RAG returns nothing or too little, use LLM fallback
+            if not rag_context or len(rag_context) < 100:
+                self._debug_log(f"  ⚠️ Sparse RAG data for {chapter}, using LLM fallback")
+                rag_context = f"""
+                Generate questions for the chapter "{chapter}" from the CBSE Class {class_num} 
+                NCERT Mathematics textbook. Use standard CBSE curriculum knowledge for this chapter.
+                Ensure questions are appropriate for 15-16 year old students and follow CBSE 
+                marking scheme standards.
+                """
+            else:
+                self._debug_log(f"  ✅ Got RAG context (len: {len(rag_context)})")
+                
+        except Exception as e:
+            self._debug_log(f"  ⚠️ RAG Error: {e}, using LLM-only fallback")
+            # FALLBACK: Use LLM general knowledge (DON'T SKIP!)
+            rag_context = f"""
+            Generate questions for "{chapter}" based on standard CBSE Class {class_num} 
+            Mathematics curriculum. This is a fallback generation due to RAG unavailability.
+            """
+
+        # Batched mode: one call for every question type of the chapter not yet started
+        fresh_types = [c for c in question_types if c['type'] not in saved]
+        batched = {}
+        if settings.BOARD_EXAM_BATCH_TYPES and len(fresh_types) > 1 and remaining_time() != 0:
+            async with llm_slots:
+                batched = await self._generate_chapter_batch(
+                    chapter=chapter,
+                    question_types=fresh_types,
+                    rag_context=rag_context,
+                    difficulty_mode=difficulty_mode,
+                    avoid_topics=avoid_topics
+                )
+            if checkpoint:
+                for qtype, questions in batched.items():
+                    await checkpoint.save(chapter, qtype, questions)
+        
+        # Follow-ups (only what is still short), all types at once
+        followups = await asyncio.gather(*[
+            self._fill_question_type(
+                chapter, qtype_config,
+                saved.get(qtype_config['type']) or batched.get(qtype_config['type'], []),
+                bool(batched), rag_context, difficulty_mode, avoid_topics, llm_slots, checkpoint
+            )
+            for qtype_config in question_types
+        ])
+        
+        questions = []
+        missing_parts = []
+        for qtype_config, (type_questions, complete) in zip(question_types, followups):
+            questions.extend(type_questions)
+            if not complete:
+                missing_parts.append(f"{chapter}/{qtype_config['type']}")
+        progress_incr("chaptersDone")
+        progress_incr("questionsGenerated", len(questions))
+        return questions, missing_parts
+
+    async def _fill_question_type(
+        self,
+        chapter: str,
+        qtype_config: Dict,
+        produced: List[Dict],
+        batch_ran: bool,
+        rag_context: str,
+        difficulty_mode: str,
+        avoid_topics: Optional[List[str]],
+        llm_slots: asyncio.Semaphore,
+        checkpoint: Optional[BoardCheckpoint] = None
+    ) -> Tuple[List[Dict], bool]:
+        """
+        Top up one (chapter, type) unit to its planned count and checkpoint it.
+        Returns (questions, complete); the slot is only held during LLM calls.
+        """
+        missing = qtype_config['count'] - len(produced)
+        if missing <= 0:
+            return produced[:qtype_config['count']], True
+        if batch_ran:
+            metrics.incr("board_exam.batch_followups", type=qtype_config['type'])
+        
+        success = False
+        retry_count = 0
+        max_gen_retries = 5  # Upper bound; the request's retry budget/deadline usually stops first
+        
+        while not success and retry_count < max_gen_retries:
+            if remaining_time() == 0:
+                break
+            try:
+                self._debug_log(f"  Generating {missing} {qtype_config['type']} for {chapter} (Attempt {retry_count+1})...")
+                
+                async with llm_slots:
+                    questions = await self._generate_questions_for_type(
+                        chapter=chapter,
+                        question_type=qtype_config['type'],
+                        count=missing,
+                        blooms_level=qtype_config['blooms'],
+                        rag_context=rag_context,
+                        difficulty_mode=difficulty_mode,
+                        # Don't repeat what the batch already produced
+                        avoid_topics=(avoid_topics or []) + [q['text'][:80] for q in produced]
+                    )
+                
+                if questions:
+                    self._debug_log(f"  ✅ Generated {len(questions)} {qtype_config['type']} for {chapter}.")
+                    produced = produced + questions
+                    success = True
+                    if checkpoint:
+                        await checkpoint.save(chapter, qtype_config['type'], produced)
+                else:
+                    raise Exception("Empty response from generator")
+                    
+            except Exception as e:
+                retry_count += 1
+                wait_time = 30 * retry_count  # Progressive backoff: 30s, 60s, 90s...
+                self._debug_log(f"  ❌ Gen Error ({chapter}/{qtype_config['type']}): {e}. Retrying in {wait_time}s...")
+                # Fail fast on an open circuit / spent budget instead of stacking waits
+                if isinstance(e, (CircuitOpenError, DeadlineExceeded)) or not allow_retry("board_exam"):
+                    break
+                try:
+                    await backoff(wait_time, f"retry {qtype_config['type']} for {chapter}")
+                except DeadlineExceeded:
+                    break
+        
+        if not success:
+            self._debug_log(f"  💀 FAILED to generate {qtype_config['type']} for {chapter} after {retry_count} attempts.")
+        return produced, success
+
     def _calculate_chapter_distribution(self, chapters: List[str]) -> List[Dict]:
         """
         Calculate how many questions of each type per chapter
@@ -460,7 +631,8 @@ Return questions in this EXACT JSON structure:
         results = await self.qdrant.hybrid_search(
             query=query,
             filters=filters,
-            top_k=top_k
+            top_k=top_k,
+            endpoint="board_exam"
         )
         
         # Format context for LLM
@@ -534,6 +706,107 @@ Content:
         except Exception:
             return "Medium"
 
+    def _chapter_prefix(self, chapter: str, rag_context: str) -> str:
+        """
+        Stable head shared by every request for a chapter (system prompt + RAG
+        context); sent first so Gemini's implicit prefix caching applies.
+        """
+        return f"""{self.system_prompt}
+### RAG CONTEXT (NCERT Source Material) for "{chapter}"
+```
+{rag_context}
+```
+"""
+
+    async def _generate_chapter_batch(
+        self,
+        chapter: str,
+        question_types: List[Dict],
+        rag_context: str,
+        difficulty_mode: str = "standard",
+        avoid_topics: List[str] = None
+    ) -> Dict[str, List[Dict]]:
+        """
+        Generate every question type of a chapter in ONE call.
+        The model returns {"MCQ": [...], "SA": [...], ...}; questions are
+        validated as they stream in, capped at the requested count per type.
+        Returns {type: questions}; short types are left for follow-up calls.
+        """
+        wanted = {c['type']: c['count'] for c in question_types}
+        total = sum(wanted.values())
+        
+        type_lines = "\n".join(
+            f"- **{c['type']}**: {c['count']} questions | Bloom's: {c['blooms']} | "
+            f"Difficulty: {self._map_blooms_to_difficulty(c['blooms'], c['type'], difficulty_mode)} | "
+            f"{QUESTION_TYPE_REQUIREMENTS.get(c['type'], 'Standard format')}"
+            for c in question_types
+        )
+        example = ", ".join(f'"{t}": [{{ "text": "...", ... }}]' for t in wanted)
+        prompt = f"""
+### BATCHED GENERATION REQUEST
+
+**Chapter**: {chapter}
+Generate ALL of the following question types in this single response:
+{type_lines}
+
+### SPECIFIC REQUIREMENTS FOR THIS REQUEST
+1. **Chapter Scope**: Generate questions ONLY about "{chapter}"
+2. **Diversity**: Every question across ALL types must have a COMPLETELY DIFFERENT context.
+   EXCLUSIONS: Do NOT use these topics/values (already covered): {', '.join(avoid_topics) if avoid_topics else 'None'}
+3. **NCERT Alignment**: Use the provided RAG context as your primary source.
+4. **COMPLETENESS**: Every question MUST have a COMPLETE explanation; for LA/CASE include ALL steps and sub-parts.
+
+### OUTPUT REQUIREMENTS
+Return ONE JSON object keyed by question type, each holding EXACTLY the requested
+number of questions in the JSON schema above:
+{{ {example} }}
+"""
+        
+        # A whole chapter needs most of the ceiling until real usage is known
+        token_limit = token_budget.max_tokens("board_exam", "BATCH", total, settings.LLM_MAX_TOKENS)
+        
+        produced: Dict[str, List[Dict]] = {t: [] for t in wanted}
+        call_usage = None
+        try:
+            stream = self.gemini.generate_stream(
+                prompt=prompt,
+                prompt_prefix=self._chapter_prefix(chapter, rag_context),
+                max_tokens=token_limit,
+                temperature=0.7,
+                endpoint="board_exam"  # mixed types: standard tier
+            )
+            with track_usage() as call_usage:
+                async with aclosing(aiter_grouped_json_objects(stream)) as generated:
+                    async for group, q in generated:
+                        if not isinstance(q, dict) or not q.get('text'):
+                            continue
+                        qtype = str(group or q.get('type', '')).strip().upper()
+                        if qtype not in wanted or len(produced[qtype]) >= wanted[qtype]:
+                            continue
+                        q['type'] = qtype
+                        if qtype in MARKS_BY_TYPE:
+                            q['marks'] = MARKS_BY_TYPE[qtype]
+                        produced[qtype].append(q)
+        except Exception as e:
+            # Whatever streamed in is kept; the caller generates the rest per type
+            print(f"⚠️ Batch generation for {chapter} stopped: {e}")
+        
+        accepted = [q for qs in produced.values() for q in qs]
+        if call_usage is not None:
+            for q in accepted:
+                q['tokensInput'] = call_usage.prompt_tokens // len(accepted)
+                q['tokensOutput'] = call_usage.output_tokens // len(accepted)
+            token_budget.observe(
+                "board_exam", "BATCH", total,
+                output_tokens=call_usage.output_tokens,
+                produced=len(accepted),
+                limit=token_limit,
+                truncated=call_usage.truncated > 0
+            )
+        model_router.record_quality("board_exam", "BATCH", total, len(accepted))
+        print(f"   📦 Batch for {chapter}: {len(accepted)}/{total} questions in one call")
+        return produced
+
     async def _generate_questions_for_type(
         self,
         chapter: str,
@@ -552,15 +825,7 @@ Content:
 
         # Helper for type requirements
         def _get_question_type_requirements(qtype: str) -> str:
-            requirements = {
-                "MCQ": "Format: 4 options (A-D), 1 correct. Plausible distractors.",
-                "AR": "Format: Assertion-Reason. Use standard options (Both true, etc.)",
-                "VSA": "Solvable in 2-3 mins. 1-2 steps. Direct application.",
-                "SA": "Solvable in 4-5 mins. 3-4 steps. Show method.",
-                "LA": "Solvable in 7-8 mins. 5-7 detailed steps. Multi-part allowed. COMPLETE all explanations.",
-                "CASE": "Scenario-based. 3-4 subquestions. Total 4 marks. COMPLETE all sub-parts."
-            }
-            return requirements.get(qtype, "Standard format")
+            return QUESTION_TYPE_REQUIREMENTS.get(qtype, "Standard format")
             
         def _get_blooms_requirements(blooms: str) -> str:
             return f"Focus on {blooms} level cognitive skills."
@@ -574,11 +839,6 @@ Content:
 **Bloom's Level**: {blooms_level}
 **Target Difficulty**: {self._map_blooms_to_difficulty(blooms_level, question_type, difficulty_mode)}
 
-### RAG CONTEXT (NCERT Source Material)
-```
-{rag_context}
-```
-
 ### SPECIFIC REQUIREMENTS FOR THIS REQUEST
 
 1. **Chapter Scope**: Generate questions ONLY about "{chapter}"
@@ -610,75 +870,107 @@ Return as a JSON array: [{{ "text": "...", ... }}]
         questions = []
         attempts = 0
         
-        # FIXED: Dynamic token limit based on question type
-        if question_type in ['LA', 'CASE']:
-            token_limit = 8000  # LA/CASE need detailed explanations
-        elif question_type == 'SA':
-            token_limit = 5000
-        else:
-            token_limit = 3000  # MCQ, AR, VSA
+        # Static per-type limit, used until the adaptive budget has enough samples
+        default_limit = DEFAULT_TOKEN_LIMITS.get(question_type, 3000)
+        truncation_bump = 1.0  # grows when an attempt hits max_output_tokens
         
         while len(questions) < count and attempts < max_retries:
+            token_limit = min(
+                settings.LLM_MAX_TOKENS,
+                int(token_budget.max_tokens("board_exam", question_type, count, default_limit) * truncation_bump)
+            )
             try:
-                # Call Gemini
-                response_text = await self.gemini.generate(
-                    prompt=self.system_prompt + "\n" + prompt,
+                # Stream from Gemini: each question is validated as soon as its
+                # JSON object closes, and a truncated response keeps its complete
+                # leading questions. Stop reading once we have enough.
+                stream = self.gemini.generate_stream(
+                    prompt=prompt,
+                    prompt_prefix=self._chapter_prefix(chapter, rag_context),
                     max_tokens=token_limit,
-                    temperature=0.7
+                    temperature=0.7,
+                    endpoint="board_exam",
+                    question_type=question_type  # MCQ/AR/VSA go to the fast tier
                 )
+                needed = count - len(questions)
+                accepted = []
+                call_usage = None
+                try:
+                    with track_usage() as call_usage:
+                        async with aclosing(aiter_json_objects(stream)) as generated:
+                            async for q in generated:
+                                # Basic validation
+                                if not isinstance(q, dict) or not q.get('text'): continue
+                                
+                                # Ensure section/marks match type
+                                q['type'] = question_type
+                                if question_type in MARKS_BY_TYPE:
+                                    q['marks'] = MARKS_BY_TYPE[question_type]
+                                
+                                accepted.append(q)
+                                if len(questions) + len(accepted) >= count:
+                                    break
+                finally:
+                    # Keep complete questions even if the stream broke mid-way, and
+                    # attribute this call's tokens evenly to the questions it produced
+                    for q in accepted:
+                        q['tokensInput'] = call_usage.prompt_tokens // len(accepted)
+                        q['tokensOutput'] = call_usage.output_tokens // len(accepted)
+                    questions.extend(accepted)
+                    model_router.record_quality("board_exam", question_type, needed, len(accepted))
                 
-                # Parse JSON
-                clean_json = repair_json(response_text.replace("```json", "").replace("```", ""))
-                generated_data = json.loads(clean_json)
-                
-                if isinstance(generated_data, dict): generated = [generated_data]
-                else: generated = generated_data
-                
-                # Check for duplicates & Validation
-                for q in generated:
-                    # Basic validation
-                    if not q.get('text'): continue
-                    
-                    # Ensure section/marks match type
-                    q['type'] = question_type
-                    
-                    if question_type == "MCQ": q['marks'] = 1
-                    elif question_type == "AR": q['marks'] = 1
-                    elif question_type == "VSA": q['marks'] = 2
-                    elif question_type == "SA": q['marks'] = 3
-                    elif question_type == "LA": q['marks'] = 5
-                    elif question_type == "CASE": q['marks'] = 4
-                    
-                    questions.append(q)
+                truncated = call_usage.truncated > 0
+                token_budget.observe(
+                    "board_exam", question_type, count,
+                    output_tokens=call_usage.output_tokens,
+                    produced=len(accepted),
+                    limit=token_limit,
+                    truncated=truncated
+                )
                 
                 # Break if satisfied
                 if len(questions) >= count:
                     break
+                
+                if truncated:
+                    # Ran out of output tokens: retry with a bigger budget
+                    truncation_bump *= token_budget.TRUNCATION_FACTOR
+                    metrics.incr("token_budget.truncation_retries", endpoint="board_exam", type=question_type)
                     
                 attempts += 1
+                if attempts < max_retries and not allow_retry("board_exam"):
+                    break
                 
             except Exception as e:
                 error_msg = str(e).lower()
                 print(f"Error generating questions ({chapter}/{question_type}): {e}")
                 
+                attempts += 1
+                
                 # ✅ FIXED: No more mock questions - fail gracefully with partial results
+                # Open circuit / request deadline: stop now, don't stack more waits
+                if isinstance(e, (CircuitOpenError, DeadlineExceeded)):
+                    print(f"⚠️ {e}. Returning {len(questions)}/{count} questions for {chapter}/{question_type}.")
+                    break
+                
+                # If max retries (or the request's retry budget) exhausted, return what we have
+                if attempts >= max_retries or not allow_retry("board_exam"):
+                    print(f"⚠️ Max retries reached for {chapter}/{question_type}. Returning {len(questions)}/{count} questions.")
+                    break
+                
                 if "rate limit" in error_msg or "429" in error_msg or "quota" in error_msg:
                     print(f"⚠️ Rate limit hit for {chapter}/{question_type}. Waiting 30s...")
-                    await asyncio.sleep(30)
+                    wait_time = 32
                 elif "500" in error_msg or "internal" in error_msg:
                     print(f"⚠️ Server error for {chapter}/{question_type}. Waiting 10s...")
-                    await asyncio.sleep(10)
+                    wait_time = 12
                 else:
-                    print(f"❌ Critical error for {chapter}/{question_type}. Skipping after {attempts+1} attempts.")
+                    print(f"❌ Critical error for {chapter}/{question_type}. Retrying (attempt {attempts+1}).")
+                    wait_time = 2
                 
-                attempts += 1
-                
-                # If max retries exhausted, return what we have (NOT mock questions)
-                if attempts >= max_retries:
-                    print(f"⚠️ Max retries reached for {chapter}/{question_type}. Returning {len(questions)}/{count} questions.")
+                try:
+                    await backoff(wait_time, f"retry {chapter}/{question_type}")
+                except DeadlineExceeded:
                     break
-                
-                await asyncio.sleep(2)
         
         return questions[:count]
     
@@ -0,0 +1,151 @@
+import threading
+from typing import Dict, Optional, Tuple
+
+from app.config.settings import settings
+from app.utils.metrics import metrics
+
+
+class ModelTier:
+    """A Gemini model plus the per-key limits and prices that go with it"""
+
+    def __init__(
+        self,
+        name: str,
+        model: str,
+        rpm: int,
+        tpm: int,
+        price_input: float,
+        price_output: float,
+        price_cached: float
+    ):
+        self.name = name
+        self.model = model
+        self.rpm = rpm
+        self.tpm = tpm
+        self.prices: Tuple[float, float, float] = (price_input, price_output, price_cached)
+
+
+class ModelRouter:
+    """
+    Maps a route (endpoint, optionally endpoint:QUESTION_TYPE) to a model tier.
+
+    - "fast" serves cheap, short work (quiz, flashcards, MCQ/AR/VSA) on a
+      lighter model; long-form SA/LA/CASE and tutoring stay on "standard"
+    - Lookup order: "endpoint:TYPE", then "endpoint", then "standard"
+    - Each route keeps latency/truncation and accepted-question counts, so
+      GET /metrics shows whether a cheaper tier is holding up on quality
+    """
+
+    STANDARD = "standard"
+    FAST = "fast"
+    EMBEDDING = "embedding"  # never routed to; owns the embedding model's key pool
+
+    def __init__(self):
+        self.enabled = settings.MODEL_TIERING_ENABLED
+        self.routes: Dict[str, str] = dict(settings.MODEL_ROUTES)
+        # The fast tier's cached-token rate keeps the standard cached/input ratio
+        cached_ratio = settings.GEMINI_PRICE_CACHED_PER_M / max(settings.GEMINI_PRICE_INPUT_PER_M, 1e-9)
+        self.tiers: Dict[str, ModelTier] = {
+            self.STANDARD: ModelTier(
+                self.STANDARD,
+                settings.GEMINI_MODEL,
+                settings.GEMINI_KEY_RPM,
+                settings.GEMINI_KEY_TPM,
+                settings.GEMINI_PRICE_INPUT_PER_M,
+                settings.GEMINI_PRICE_OUTPUT_PER_M,
+                settings.GEMINI_PRICE_CACHED_PER_M,
+            ),
+            self.FAST: ModelTier(
+                self.FAST,
+                settings.GEMINI_FAST_MODEL,
+                settings.GEMINI_FAST_KEY_RPM,
+                settings.GEMINI_FAST_KEY_TPM,
+                settings.GEMINI_FAST_PRICE_INPUT_PER_M,
+                settings.GEMINI_FAST_PRICE_OUTPUT_PER_M,
+                settings.GEMINI_FAST_PRICE_INPUT_PER_M * cached_ratio,
+            ),
+            self.EMBEDDING: ModelTier(
+                self.EMBEDDING,
+                settings.GEMINI_EMBEDDING_MODEL,
+                settings.GEMINI_EMBED_KEY_RPM,
+                settings.GEMINI_EMBED_KEY_TPM,
+                settings.GEMINI_PRICE_EMBED_PER_M,
+                0.0,
+                0.0,
+            ),
+        }
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def route_name(endpoint: Optional[str], question_type: Optional[str] = None) -> str:
+        endpoint = endpoint or "other"
+        return f"{endpoint}:{question_type}" if question_type else endpoint
+
+    def tier(self, name: str) -> ModelTier:
+        return self.tiers.get(name) or self.tiers[self.STANDARD]
+
+    def route(self, endpoint: Optional[str], question_type: Optional[str] = None) -> ModelTier:
+        """Tier to use for a generation on this endpoint/question type"""
+        if not self.enabled:
+            return self.tiers[self.STANDARD]
+        name = None
+        if question_type:
+            name = self.routes.get(self.route_name(endpoint, question_type))
+        if name is None:
+            name = self.routes.get(endpoint or "other", self.STANDARD)
+        return self.tier(name)
+
+    def _row(self, route: str, tier: str) -> Dict[str, float]:
+        row = self._stats.get(route)
+        if row is None:
+            row = self._stats[route] = {
+                "tier": tier, "calls": 0, "latency_ms": 0.0, "truncated": 0,
+                "requested": 0, "accepted": 0,
+            }
+        row["tier"] = tier
+        return row
+
+    def observe_call(self, route: str, tier: str, latency_ms: float, truncated: bool = False):
+        with self._lock:
+            row = self._row(route, tier)
+            row["calls"] += 1
+            row["latency_ms"] += latency_ms
+            row["truncated"] += int(truncated)
+        metrics.incr("model_route.calls", route=route, tier=tier)
+
+    def record_quality(
+        self,
+        endpoint: str,
+        question_type: Optional[str],
+        requested: int,
+        accepted: int
+    ):
+        """`accepted` of `requested` questions survived validation/dedup"""
+        route = self.route_name(endpoint, question_type)
+        tier = self.route(endpoint, question_type).name
+        with self._lock:
+            row = self._row(route, tier)
+            row["requested"] += requested
+            row["accepted"] += accepted
+
+    def report(self) -> Dict[str, Dict]:
+        """Per-route latency/quality, for GET /metrics"""
+        with self._lock:
+            rows = {route: dict(row) for route, row in self._stats.items()}
+        for row in rows.values():
+            calls = row.pop("calls")
+            latency = row.pop("latency_ms")
+            row["calls"] = calls
+            row["avg_latency_ms"] = round(latency / calls, 1) if calls else None
+            row["truncation_rate"] = round(row["truncated"] / calls, 3) if calls else None
+            row["acceptance_rate"] = (
+                round(row["accepted"] / row["requested"], 3) if row["requested"] else None
+            )
+        return {
+            "tiers": {name: tier.model for name, tier in self.tiers.items()},
+            "routes": rows,
+        }
+
+
+model_router = ModelRouter()
@@ -171,7 +171,19 @@ class PYQProcessor:
         # Generate embeddings
         print(f"   🔢 Generating embeddings...")
         texts = [c['text'] for c in all_chunks]
-        embeddings = self.gemini_service.embed_batch(texts)
+        embeddings = await self.gemini_service.embed_batch_async(texts)
+        
+        # Drop chunks whose embedding failed (reported individually by embed_batch_async)
+        failed = sum(1 for e in embeddings if not e)
+        if failed:
+            print(f"   ⚠️ Skipping {failed} chunks without embeddings")
+            all_chunks = [c for c, e in zip(all_chunks, embeddings) if e]
+            embeddings = [e for e in embeddings if e]
+        
+        if not all_chunks:
+            print("   ❌ No chunks could be embedded!")
+            return {"pages": len(pages_data), "chunks": 0, "filename": filename,
+                    "question_pages": question_pages, "solution_pages": solution_pages}
         
         # Upload to Qdrant
         print(f"   ☁️ Uploading to Qdrant...")
@@ -1,14 +1,22 @@
 from qdrant_client import AsyncQdrantClient, models
 from fastembed import SparseTextEmbedding
 from app.services.geminiservice import GeminiService
+from app.services.retrieval_cache import retrieval_cache
 from app.config.settings import settings
+from app.utils.resilience import CircuitOpenError, DeadlineExceeded, qdrant_breaker, remaining_time
+from app.utils.metrics import metrics
+from app.utils.singleflight import SingleFlight
 import logging
 import asyncio
-from typing import List, Dict, Any
+import json
+from typing import List, Dict, Any, Optional, Tuple
 import uuid
 
 logger = logging.getLogger("examready")
 
+# Identical concurrent searches share one embed + query round trip
+_search_flight = SingleFlight("qdrant")
+
 class QdrantService:
     """Async Hybrid Search Service for Qdrant Cloud"""
     
@@ -61,6 +69,12 @@ class QdrantService:
                         )
                     }
                 )
+            # select_by_filter(order="least_used") needs a range index to order by
+            await self.client.create_payload_index(
+                collection_name=self.questions_collection,
+                field_name="usageCount",
+                field_schema=models.PayloadSchemaType.INTEGER
+            )
         except Exception as e:
             logger.error(f"Failed to ensure collection exists: {e}")
     
@@ -90,22 +104,47 @@ class QdrantService:
         except Exception as e:
              logger.error(f"Error checking textbook collection: {e}")
 
-    async def search_questions(self, query: str, filters: Dict, limit: int = 10) -> Dict:
+    async def _guarded(self, make_call, what: str = "query"):
+        """
+        Run one Qdrant call behind the circuit breaker, bounded by the request
+        deadline. Raises CircuitOpenError / DeadlineExceeded instead of hanging.
+        """
+        qdrant_breaker.before_call()
+        try:
+            result = await asyncio.wait_for(
+                make_call(), timeout=remaining_time(settings.QDRANT_TIMEOUT_SECONDS)
+            )
+        except asyncio.TimeoutError:
+            qdrant_breaker.record_failure()
+            raise DeadlineExceeded(f"Qdrant {what} timed out")
+        except Exception:
+            qdrant_breaker.record_failure()
+            raise
+        qdrant_breaker.record_success()
+        return result
+    
+    async def search_questions(self, query: str, filters: Dict, limit: int = 10, endpoint: str = None) -> Dict:
         """Search exam questions"""
         return await self.hybrid_search(
             query=query,
             filters=filters,
             top_k=limit,
-            collection_name=self.questions_collection
+            collection_name=self.questions_collection,
+            endpoint=endpoint
         )
     
-    async def search_ncert_context(self, query: str, limit: int = 5) -> List[Dict]:
+    async def search_questions_batch(self, specs: List[Tuple[str, Dict, int]], endpoint: str = None) -> List[Dict]:
+        """Search exam questions for many (query, filters, limit) specs at once"""
+        return await self.hybrid_search_batch(specs, collection_name=self.questions_collection, endpoint=endpoint)
+    
+    async def search_ncert_context(self, query: str, limit: int = 5, endpoint: str = None) -> List[Dict]:
         """Search textbook context for LLM fallback"""
         res = await self.hybrid_search(
             query=query,
             filters={},
             top_k=limit,
-            collection_name=self.textbook_collection
+            collection_name=self.textbook_collection,
+            endpoint=endpoint
         )
         return res.get('chunks', [])
     
@@ -135,36 +174,440 @@ class QdrantService:
         query: str, 
         filters: Dict[str, Any], 
         top_k: int = 8, 
-        collection_name: str = None
+        collection_name: str = None,
+        endpoint: str = None
     ) -> Dict:
         """
         Async Hybrid Search (Dense + Sparse)
-        ✅ Runs blocking operations in thread pool
+        ✅ Dense embedding is native async; CPU-bound sparse encoding runs in thread pool
+        ✅ Both encodings run concurrently; if one fails the other still searches
+          (result["search_mode"]: "hybrid" | "dense" | "sparse" | "none")
+        ✅ Identical concurrent searches are coalesced into one
+        ✅ Results are cached until TTL or the next upsert into the collection
+          (`endpoint` labels the hit-rate metrics)
         """
         target_collection = collection_name or self.textbook_collection
         
-        # ✅ A. Dense Embedding (I/O bound - run in thread)
-        # Note: GeminiService.embed is synchronous, so we run it in a thread
-        dense_vec = await asyncio.to_thread(
-            self.gemini_service.embed, 
-            query
+        cache_key = None
+        if retrieval_cache.enabled:
+            cache_key = await retrieval_cache.make_key(target_collection, query, filters, top_k)
+            cached = await retrieval_cache.get(cache_key, endpoint)
+            if cached is not None:
+                return cached
+        
+        async def search():
+            result = await self._hybrid_search(query, filters, top_k, target_collection)
+            if cache_key:
+                await retrieval_cache.set(cache_key, result)
+            return result
+        
+        if not settings.SINGLE_FLIGHT_ENABLED:
+            return await search()
+        
+        flight_key = (
+            target_collection,
+            query,
+            json.dumps(filters or {}, sort_keys=True, default=str),
+            top_k
+        )
+        # Callers post-process chunks in place, so each gets its own copy
+        return await _search_flight.do(
+            flight_key,
+            search,
+            copy_result=True
         )
-        if not dense_vec:
-            return {"context": "", "chunks": [], "total_results": 0}
+    
+    async def _hybrid_search(
+        self,
+        query: str,
+        filters: Dict[str, Any],
+        top_k: int,
+        target_collection: str
+    ) -> Dict:
+        """Uncoalesced hybrid search against `target_collection`"""
+        if not self.client: await self.initialize()
+        
+        # ✅ A+B. Dense (Gemini) and sparse (BM25) encodings run concurrently;
+        # either one alone is enough to search
+        dense_vec, sparse_vec = await self._encode_query(query)
+        search_mode = self._search_mode(dense_vec, sparse_vec)
+        metrics.incr("rag.search_mode", mode=search_mode)
+        if search_mode == "none":
+            return self._empty_result(search_mode)
+        
+        # C. Build Filters
+        q_filter = self._build_filter(filters)
+        
+        # ✅ D. Build Prefetch (whichever encodings succeeded)
+        prefetch = self._prefetch(dense_vec, sparse_vec, q_filter)
         
-        # ✅ B. Sparse Embedding (CPU bound - run in thread)
-        # FastEmbed is CPU intensive, good to offload
-        # FIXED: Added error handling for sparse embedding failure
-        sparse_vec = None
+        # ✅ E. Execute Async Query (fails fast while Qdrant's circuit is open)
         try:
-            sparse_vec = await asyncio.to_thread(
-                lambda: list(self.sparse_model.embed([query]))[0]
+            results = await self._guarded(lambda: self.client.query_points(
+                collection_name=target_collection,
+                prefetch=prefetch,
+                query=models.FusionQuery(fusion=models.Fusion.RRF),
+                limit=top_k,
+                with_payload=True
+            ), "search")
+        except (CircuitOpenError, DeadlineExceeded) as e:
+            logger.warning(f"Hybrid search skipped: {e}")
+            return self._empty_result(search_mode)
+        
+        # F. Format Results
+        return self._format_result(results.points, search_mode)
+    
+    async def hybrid_search_groups(
+        self,
+        query: str,
+        filters: Dict[str, Any],
+        group_by: str = "chapter",
+        group_values: Optional[List[str]] = None,
+        group_size: int = 3,
+        collection_name: str = None,
+        endpoint: str = None
+    ) -> Dict:
+        """
+        Hybrid search grouped server-side on a payload field: up to
+        `group_size` hits per distinct `group_by` value, in one query, so a
+        multi-chapter request gets balanced context instead of one chapter
+        taking over the top-k. Cached and coalesced like hybrid_search.
+        
+        `group_values` restricts (and sizes) the groups, e.g. the requested
+        chapters. Returns hybrid_search's shape with chunks interleaved
+        round-robin across groups, plus result["groups"]: {value: result}
+        with each group's own chunks and context.
+        """
+        target_collection = collection_name or self.textbook_collection
+        if group_values:
+            filters = {**(filters or {}), group_by: list(group_values)}
+        group_limit = len(group_values) if group_values else settings.GROUP_SEARCH_MAX_GROUPS
+        
+        cache_key = None
+        if retrieval_cache.enabled:
+            cache_key = await retrieval_cache.make_key(
+                target_collection, query, filters, group_size, variant=f"groups:{group_by}:{group_limit}"
             )
-        except Exception as e:
-            logger.error(f"Sparse embedding failed: {e}")
-            # Continue with dense-only search
+            cached = await retrieval_cache.get(cache_key, endpoint)
+            if cached is not None:
+                return cached
         
-        # C. Build Filters
+        async def search():
+            result = await self._hybrid_search_groups(
+                query, filters, group_by, group_limit, group_size, target_collection
+            )
+            if cache_key:
+                await retrieval_cache.set(cache_key, result)
+            return result
+        
+        if not settings.SINGLE_FLIGHT_ENABLED:
+            return await search()
+        
+        flight_key = (
+            target_collection,
+            query,
+            json.dumps(filters or {}, sort_keys=True, default=str),
+            group_size,
+            f"groups:{group_by}:{group_limit}"
+        )
+        # Callers post-process chunks in place, so each gets its own copy
+        return await _search_flight.do(flight_key, search, copy_result=True)
+    
+    async def _hybrid_search_groups(
+        self,
+        query: str,
+        filters: Dict[str, Any],
+        group_by: str,
+        group_limit: int,
+        group_size: int,
+        target_collection: str
+    ) -> Dict:
+        """Uncoalesced grouped hybrid search against `target_collection`"""
+        if not self.client: await self.initialize()
+        
+        dense_vec, sparse_vec = await self._encode_query(query)
+        search_mode = self._search_mode(dense_vec, sparse_vec)
+        metrics.incr("rag.search_mode", mode=search_mode)
+        if search_mode == "none":
+            return {**self._empty_result(search_mode), "groups": {}}
+        
+        try:
+            results = await self._guarded(lambda: self.client.query_points_groups(
+                collection_name=target_collection,
+                group_by=group_by,
+                prefetch=self._prefetch(dense_vec, sparse_vec, self._build_filter(filters)),
+                query=models.FusionQuery(fusion=models.Fusion.RRF),
+                limit=group_limit,
+                group_size=group_size,
+                with_payload=True
+            ), "group search")
+        except (CircuitOpenError, DeadlineExceeded) as e:
+            logger.warning(f"Grouped search skipped: {e}")
+            return {**self._empty_result(search_mode), "groups": {}}
+        
+        groups = {
+            str(group.id): self._format_result(group.hits, search_mode)
+            for group in results.groups
+        }
+        # Round-robin so every group is represented near the top
+        interleaved = [
+            group["chunks"][rank]
+            for rank in range(group_size)
+            for group in groups.values() if rank < len(group["chunks"])
+        ]
+        
+        result = self._format_result_chunks(interleaved, search_mode, context_size=max(5, len(groups)))
+        result["groups"] = groups
+        return result
+    
+    async def hybrid_search_batch(
+        self,
+        specs: List[Tuple[str, Dict[str, Any], int]],
+        collection_name: str = None,
+        endpoint: str = None
+    ) -> List[Dict]:
+        """
+        Many hybrid searches, one Qdrant round trip: `specs` is a list of
+        (query, filters, top_k); results come back in the same order, each
+        shaped like hybrid_search's. Cached specs are answered from the
+        retrieval cache; the rest are encoded concurrently and sent together
+        through the batch query endpoint.
+        """
+        target_collection = collection_name or self.textbook_collection
+        results: List[Optional[Dict]] = [None] * len(specs)
+        
+        cache_keys: List[Optional[str]] = [None] * len(specs)
+        pending = []
+        for i, (query, filters, top_k) in enumerate(specs):
+            if retrieval_cache.enabled:
+                cache_keys[i] = await retrieval_cache.make_key(target_collection, query, filters, top_k)
+                results[i] = await retrieval_cache.get(cache_keys[i], endpoint)
+            if results[i] is None:
+                pending.append(i)
+        if not pending:
+            return results
+        
+        # A+B. Encode every pending query concurrently (dense + sparse each)
+        encoded = await asyncio.gather(*[self._encode_query(specs[i][0]) for i in pending])
+        
+        # C+D. One QueryRequest per searchable spec
+        requests, batch = [], []
+        for i, (dense_vec, sparse_vec) in zip(pending, encoded):
+            search_mode = self._search_mode(dense_vec, sparse_vec)
+            metrics.incr("rag.search_mode", mode=search_mode)
+            if search_mode == "none":
+                results[i] = self._empty_result(search_mode)
+                continue
+            _query, filters, top_k = specs[i]
+            requests.append(models.QueryRequest(
+                prefetch=self._prefetch(dense_vec, sparse_vec, self._build_filter(filters)),
+                query=models.FusionQuery(fusion=models.Fusion.RRF),
+                limit=top_k,
+                with_payload=True
+            ))
+            batch.append((i, search_mode))
+        
+        # E. Execute as one batch
+        if requests:
+            if not self.client: await self.initialize()
+            metrics.incr("qdrant.batch_queries", value=len(requests))
+            try:
+                responses = await self._guarded(lambda: self.client.query_batch_points(
+                    collection_name=target_collection,
+                    requests=requests
+                ), "batch search")
+            except (CircuitOpenError, DeadlineExceeded) as e:
+                logger.warning(f"Batch hybrid search skipped: {e}")
+                responses = None
+            
+            for n, (i, search_mode) in enumerate(batch):
+                if responses is None:
+                    results[i] = self._empty_result(search_mode)
+                    continue
+                results[i] = self._format_result(responses[n].points, search_mode)
+                if cache_keys[i]:
+                    await retrieval_cache.set(cache_keys[i], results[i])
+        
+        return results
+    
+    async def _encode_query(self, query: str) -> Tuple[Optional[List[float]], Any]:
+        """
+        Dense and sparse query vectors, computed concurrently, each under its
+        own timeout (never past the request deadline). A failed or slow side
+        comes back as None instead of failing the search.
+        """
+        async def dense():
+            timeout = remaining_time(settings.QUERY_DENSE_TIMEOUT_SECONDS)
+            try:
+                # Native async - no executor thread, cancellable
+                vec = await asyncio.wait_for(self.gemini_service.embed_async(query, timeout=timeout), timeout=timeout)
+                return vec or None
+            except asyncio.TimeoutError:
+                logger.warning(f"Dense query encoding timed out after {timeout:.1f}s")
+            except Exception as e:
+                logger.error(f"Dense embedding failed: {e}")
+            return None
+
+        async def sparse():
+            timeout = remaining_time(settings.QUERY_SPARSE_TIMEOUT_SECONDS)
+            try:
+                # FastEmbed is CPU bound: run in a thread (a timed-out encode
+                # finishes in the background; its result is dropped)
+                return await asyncio.wait_for(
+                    asyncio.to_thread(lambda: list(self.sparse_model.embed([query]))[0]),
+                    timeout=timeout
+                )
+            except asyncio.TimeoutError:
+                logger.warning(f"Sparse query encoding timed out after {timeout:.1f}s")
+            except Exception as e:
+                logger.error(f"Sparse embedding failed: {e}")
+            return None
+
+        return await asyncio.gather(dense(), sparse())
+
+    async def select_by_filter(
+        self,
+        filters: Dict[str, Any],
+        limit: int,
+        collection_name: str = None,
+        order: str = "random"
+    ) -> Dict:
+        """
+        Structured selection: payload filters only, no query text and no
+        embedding calls. See select_by_filter_batch.
+        """
+        return (await self.select_by_filter_batch([(filters, limit)], collection_name, order))[0]
+    
+    async def select_by_filter_batch(
+        self,
+        specs: List[Tuple[Dict[str, Any], int]],
+        collection_name: str = None,
+        order: str = "random"
+    ) -> List[Dict]:
+        """
+        Filter-only selections for many (filters, limit) specs in one or two
+        batch round trips; results in spec order.
+        
+        order="random": uniform sample of the matching points
+        order="least_used": lowest usageCount first (order_by), topped up with
+          a random sample when too few points carry usageCount
+        
+        Each result has hybrid_search's shape (search_mode "filter").
+        Not cached: selections are meant to rotate. While Qdrant's circuit is
+        open or the deadline is spent, results come back short or empty.
+        """
+        if not self.client: await self.initialize()
+        target_collection = collection_name or self.questions_collection
+        q_filters = [self._build_filter(filters) for filters, _limit in specs]
+        points: List[List] = [[] for _ in specs]
+        metrics.incr("qdrant.filter_select", value=len(specs), order=order)
+        
+        # Fails soft like hybrid_search: an open circuit or spent deadline
+        # returns whatever was selected so far (callers fall back per section)
+        try:
+            if order == "least_used":
+                responses = await self._guarded(lambda: self.client.query_batch_points(
+                    collection_name=target_collection,
+                    requests=[
+                        models.QueryRequest(
+                            query=models.OrderByQuery(
+                                order_by=models.OrderBy(key="usageCount", direction=models.Direction.ASC)
+                            ),
+                            filter=q_filter,
+                            limit=limit,
+                            with_payload=True
+                        )
+                        for q_filter, (_filters, limit) in zip(q_filters, specs)
+                    ]
+                ), "ordered select")
+                points = [list(response.points) for response in responses]
+        
+            # Random sample (or top-up: points without usageCount never appear
+            # when ordering by it)
+            short = [i for i, (_filters, limit) in enumerate(specs) if len(points[i]) < limit]
+            if short:
+                requests = []
+                for i in short:
+                    sample_filter = q_filters[i]
+                    if points[i]:
+                        sample_filter = models.Filter(
+                            must=list(sample_filter.must or []) if sample_filter else [],
+                            must_not=[models.HasIdCondition(has_id=[p.id for p in points[i]])]
+                        )
+                    requests.append(models.QueryRequest(
+                        query=models.SampleQuery(sample=models.Sample.RANDOM),
+                        filter=sample_filter,
+                        limit=specs[i][1] - len(points[i]),
+                        with_payload=True
+                    ))
+                responses = await self._guarded(lambda: self.client.query_batch_points(
+                    collection_name=target_collection,
+                    requests=requests
+                ), "sample")
+                for i, response in zip(short, responses):
+                    points[i].extend(response.points)
+        
+        except (CircuitOpenError, DeadlineExceeded) as e:
+            logger.warning(f"Filter selection skipped: {e}")
+        
+        results = []
+        for selected in points:
+            chunks = [self._to_chunk(point) for point in selected]
+            results.append({"context": "", "chunks": chunks, "total_results": len(chunks), "search_mode": "filter"})
+        return results
+    
+    @staticmethod
+    def _prefetch(dense_vec, sparse_vec, q_filter) -> List[models.Prefetch]:
+        """
+        Dense/sparse candidate lists for RRF, for whichever encodings
+        succeeded (RRF either way, so scores stay on one scale across modes)
+        """
+        prefetch = []
+        if dense_vec:
+            prefetch.append(
+                models.Prefetch(
+                    query=dense_vec,
+                    using="text-dense",
+                    filter=q_filter,
+                    limit=settings.SEMANTIC_TOP_K
+                )
+            )
+        
+        if sparse_vec is not None:
+            prefetch.append(
+                models.Prefetch(
+                    query=models.SparseVector(
+                        indices=sparse_vec.indices.tolist(),
+                        values=sparse_vec.values.tolist()
+                    ),
+                    using="text-sparse",
+                    filter=q_filter,
+                    limit=settings.BM25_TOP_K
+                )
+            )
+        return prefetch
+    
+    def _format_result(self, points, search_mode: str) -> Dict:
+        return self._format_result_chunks([self._to_chunk(point) for point in points], search_mode)
+    
+    @staticmethod
+    def _format_result_chunks(chunks: List[Dict], search_mode: str, context_size: int = 5) -> Dict:
+        # Build context string
+        context_parts = []
+        for c in chunks[:context_size]:  # Top 5 for context (more for grouped results)
+            source = f"Source: {c['metadata'].get('textbook', 'Book')} (Page {c['metadata'].get('page', 0)})"
+            context_parts.append(f"{source}\n{c['text']}")
+        
+        return {
+            "context": "\n---\n".join(context_parts),
+            "chunks": chunks,
+            "total_results": len(chunks),
+            "search_mode": search_mode
+        }
+
+    @staticmethod
+    def _build_filter(filters: Dict[str, Any]) -> Optional[models.Filter]:
+        """Mongo-style dict (exact, list = IN, $gte/$lte/$gt/$lt) -> Qdrant filter"""
         must_conditions = []
         if filters:
             for k, v in filters.items():
@@ -189,63 +632,34 @@ class QdrantService:
                         models.FieldCondition(key=k, match=models.MatchValue(value=v))
                     )
         
-        q_filter = models.Filter(must=must_conditions) if must_conditions else None
-        
-        # ✅ D. Build Prefetch (conditional sparse)
-        prefetch = [
-            models.Prefetch(
-                query=dense_vec,
-                using="text-dense",
-                filter=q_filter,
-                limit=settings.SEMANTIC_TOP_K
-            )
-        ]
-        
-        # Only add sparse prefetch if sparse embedding succeeded
-        if sparse_vec is not None:
-            prefetch.append(
-                models.Prefetch(
-                    query=models.SparseVector(
-                        indices=sparse_vec.indices.tolist(),
-                        values=sparse_vec.values.tolist()
-                    ),
-                    using="text-sparse",
-                    filter=q_filter,
-                    limit=settings.BM25_TOP_K
-                )
-            )
-        
-        # ✅ E. Execute Async Query
-        results = await self.client.query_points(
-            collection_name=target_collection,
-            prefetch=prefetch,
-            query=models.FusionQuery(fusion=models.Fusion.RRF),
-            limit=top_k,
-            with_payload=True
-        )
-        
-        # E. Format Results
-        chunks = []
-        for point in results.points:
-            chunks.append({
-                "id": str(point.id),
-                "text": point.payload.get("text", ""),
-                "metadata": {k: v for k, v in point.payload.items() if k != "text"},
-                "score": point.score,
-                "rerank_score": point.score
-            })
-        
-        # Build context string
-        context_parts = []
-        for c in chunks[:5]:  # Top 5 for context
-            source = f"Source: {c['metadata'].get('textbook', 'Book')} (Page {c['metadata'].get('page', 0)})"
-            context_parts.append(f"{source}\n{c['text']}")
-        
+        return models.Filter(must=must_conditions) if must_conditions else None
+
+    @staticmethod
+    def _to_chunk(point) -> Dict:
+        # Scroll records have no score
+        score = getattr(point, "score", None) or 0.0
         return {
-            "context": "\n---\n".join(context_parts),
-            "chunks": chunks,
-            "total_results": len(chunks)
+            "id": str(point.id),
+            "text": point.payload.get("text", ""),
+            "metadata": {k: v for k, v in point.payload.items() if k != "text"},
+            "score": score,
+            "rerank_score": score
         }
+
+    @staticmethod
+    def _search_mode(dense_vec, sparse_vec) -> str:
+        """hybrid, dense or sparse (the other encoder failed), or none"""
+        if dense_vec and sparse_vec is not None:
+            return "hybrid"
+        if dense_vec:
+            return "dense"
+        if sparse_vec is not None:
+            return "sparse"
+        return "none"
+
+    @staticmethod
+    def _empty_result(search_mode: str) -> Dict:
+        return {"context": "", "chunks": [], "total_results": 0, "search_mode": search_mode}
     
     async def upsert_chunks(
         self, 
@@ -292,6 +706,9 @@ class QdrantService:
             points=points
         )
         logger.info(f"✅ Upserted {len(points)} points to {target_collection}")
+        
+        # New content must show up in searches right away
+        await retrieval_cache.bump_version(target_collection)
 
 # Singleton (initialized in startup event)
 qdrant_service = QdrantService()
\ No newline at end of file
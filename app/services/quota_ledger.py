@@ -0,0 +1,139 @@
+import asyncio
+import hashlib
+import time
+import uuid
+from typing import Set, Tuple
+
+from app.config.settings import settings
+from app.utils.async_clients import AsyncRedis
+from app.utils.metrics import metrics
+
+# Atomic sliding-window reservation for one API key.
+# KEYS[1] = window zset (member "<id>:<tokens>", score = ms timestamp)
+# KEYS[2] = cooldown flag (set with PX after a 429)
+# ARGV    = now_ms, window_ms, rpm_limit, tpm_limit, tokens, request_id
+# Returns {1, 0} when reserved, {0, wait_ms} otherwise.
+_RESERVE_LUA = """
+local cooldown = redis.call('PTTL', KEYS[2])
+if cooldown > 0 then
+  return {0, cooldown}
+end
+
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local rpm = tonumber(ARGV[3])
+local tpm = tonumber(ARGV[4])
+local tokens = math.min(tonumber(ARGV[5]), tpm)
+
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+local entries = redis.call('ZRANGE', KEYS[1], 0, -1, 'WITHSCORES')
+local count = #entries / 2
+local used = 0
+for i = 1, #entries, 2 do
+  used = used + tonumber(string.match(entries[i], ':(%d+)$') or 0)
+end
+
+if count >= rpm or (count > 0 and used + tokens > tpm) then
+  local oldest = tonumber(entries[2])
+  return {0, math.max(1, oldest + window - now)}
+end
+
+redis.call('ZADD', KEYS[1], now, ARGV[6] .. ':' .. tokens)
+redis.call('PEXPIRE', KEYS[1], window)
+return {1, 0}
+"""
+
+
+class QuotaLedger:
+    """
+    Gemini rate-limit ledger shared by ALL workers/pods through Redis.
+
+    - Sliding 60s window per key for requests and tokens (atomic Lua reservation)
+    - Shared cooldown flag per key, so a 429 seen by one worker steers every
+      worker away from that key
+    - Keys are identified by a hash, never the secret itself
+
+    Fails open: after a Redis error the pool uses only its local buckets for
+    REDIS_RETRY_AFTER_SECONDS, then tries the ledger again.
+    """
+
+    WINDOW_MS = 60_000
+    PREFIX = "gquota:v1:"
+
+    def __init__(self):
+        self.enabled = settings.GEMINI_SHARED_QUOTA
+        self.redis = AsyncRedis("quota_ledger", socket_timeout=1, decode_responses=False)
+        self._script = None  # (client, Script) - re-registered when the client is rebuilt
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _active(self) -> bool:
+        return self.enabled and self.redis.available
+
+    def _failed(self, error: Exception):
+        self.redis.failed(error)
+        metrics.incr("gemini.quota_ledger.errors")
+
+    def _reserve_script(self):
+        client = self.redis.client()
+        if self._script is None or self._script[0] is not client:
+            self._script = (client, client.register_script(_RESERVE_LUA))
+        return self._script[1]
+
+    @staticmethod
+    def key_id(api_key: str) -> str:
+        return hashlib.sha256(api_key.encode()).hexdigest()[:12]
+
+    def _keys(self, key_id: str):
+        return [f"{self.PREFIX}{key_id}:window", f"{self.PREFIX}{key_id}:cooldown"]
+
+    def _args(self, tokens: int, rpm: int = None, tpm: int = None):
+        return [
+            int(time.time() * 1000),
+            self.WINDOW_MS,
+            rpm or settings.GEMINI_KEY_RPM,
+            tpm or settings.GEMINI_KEY_TPM,
+            int(tokens),
+            uuid.uuid4().hex[:12]
+        ]
+
+    # ---------- Reservations ----------
+
+    async def reserve(self, key_id: str, tokens: int, rpm: int = None, tpm: int = None) -> Tuple[bool, float]:
+        """
+        Try to reserve one request + `tokens` on a key. Returns (ok, wait_seconds).
+        rpm/tpm default to the standard tier's GEMINI_KEY_RPM/TPM.
+        """
+        if not self._active():
+            return True, 0.0
+        try:
+            ok, wait_ms = await self._reserve_script()(keys=self._keys(key_id), args=self._args(tokens, rpm, tpm))
+            return bool(ok), wait_ms / 1000.0
+        except Exception as e:
+            self._failed(e)
+            return True, 0.0
+
+    # ---------- Cooldowns ----------
+
+    async def set_cooldown(self, key_id: str, seconds: float):
+        """Publish a 429 back-off for this key to every worker"""
+        if not self._active():
+            return
+        try:
+            # Never shorten a cooldown another worker already set
+            await self.redis.client().set(self._keys(key_id)[1], 1, px=int(seconds * 1000), nx=True)
+        except Exception as e:
+            self._failed(e)
+
+    def publish_cooldown(self, key_id: str, seconds: float):
+        """set_cooldown() in the background, for sync callers running on the event loop"""
+        if not self._active():
+            return
+        try:
+            task = asyncio.get_running_loop().create_task(self.set_cooldown(key_id, seconds))
+        except RuntimeError:
+            return  # no event loop: the local cooldown still applies
+        self._tasks.add(task)  # keep a reference until it finishes
+        task.add_done_callback(self._tasks.discard)
+
+
+quota_ledger = QuotaLedger()
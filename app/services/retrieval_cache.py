@@ -0,0 +1,134 @@
+import copy
+import hashlib
+import json
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+
+from app.config.settings import settings
+from app.utils.async_clients import AsyncRedis
+from app.utils.memory_cache import LRUCache
+from app.utils.metrics import metrics
+
+
+class RetrievalCache:
+    """
+    hybrid_search result cache.
+
+    Key = sha256(collection | collection version | top_k | shape | filters | query).
+    The version is a per-collection counter in Redis that upsert_chunks bumps,
+    so an ingestion (from any worker or script) makes every older entry
+    unreachable at once; entries otherwise expire after RETRIEVAL_CACHE_TTL_SECONDS.
+
+    Tier 1 is a size-bounded in-process LRU; tier 2 is Redis (shared by workers).
+    Each worker re-reads a collection's version at most every
+    RETRIEVAL_CACHE_VERSION_TTL_SECONDS, so another worker's ingestion is seen
+    within that window (this worker's own bumps apply at once).
+    Without Redis the version counter is per process.
+    """
+
+    KEY_PREFIX = "rag:v1:"
+    VERSION_PREFIX = "rag:version:"
+
+    def __init__(self):
+        self.enabled = settings.RETRIEVAL_CACHE_ENABLED
+        self.ttl = settings.RETRIEVAL_CACHE_TTL_SECONDS
+        self.memory = LRUCache(maxsize=settings.RETRIEVAL_CACHE_MAX_ENTRIES, ttl=self.ttl)
+        self._local_versions: Dict[str, int] = defaultdict(int)
+        self._versions: Dict[str, Tuple[int, float]] = {}  # collection -> (Redis version, read at)
+        self._lock = threading.Lock()
+        self._endpoints = set()
+        self.redis: Optional[AsyncRedis] = AsyncRedis("retrieval_cache")
+
+    # ---------- Versions ----------
+
+    async def version(self, collection: str) -> int:
+        cached = self._versions.get(collection)
+        if cached and time.monotonic() - cached[1] < settings.RETRIEVAL_CACHE_VERSION_TTL_SECONDS:
+            return cached[0]
+        if self.redis and self.redis.available:
+            try:
+                version = int(await self.redis.client().get(self.VERSION_PREFIX + collection) or 0)
+                self._versions[collection] = (version, time.monotonic())
+                return version
+            except Exception as e:
+                self.redis.failed(e)
+        with self._lock:
+            return self._local_versions[collection]
+
+    async def bump_version(self, collection: str):
+        """Invalidate every cached search of `collection` (call after writes)"""
+        with self._lock:
+            self._local_versions[collection] += 1
+        self._versions.pop(collection, None)
+        if self.redis and self.redis.available:
+            try:
+                version = await self.redis.client().incr(self.VERSION_PREFIX + collection)
+                self._versions[collection] = (int(version), time.monotonic())
+            except Exception as e:
+                self.redis.failed(e)
+        metrics.incr("retrieval_cache.invalidations", collection=collection)
+
+    # ---------- Entries ----------
+
+    async def make_key(self, collection: str, query: str, filters: Optional[Dict], top_k: int, variant: str = "") -> str:
+        # Read the version before searching: a write that lands mid-search
+        # leaves the result under the old version, where nothing reads it
+        raw = "|".join([
+            collection,
+            str(await self.version(collection)),
+            str(top_k),
+            variant,  # search shape, e.g. grouped
+            json.dumps(filters or {}, sort_keys=True, default=str),
+            query.strip()
+        ])
+        return self.KEY_PREFIX + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str, endpoint: Optional[str]) -> Optional[Dict]:
+        endpoint = endpoint or "unknown"
+        self._endpoints.add(endpoint)
+
+        result = self.memory.get(key)
+        if result is None and self.redis and self.redis.available:
+            try:
+                raw = await self.redis.client().get(key)
+                if raw is not None:
+                    result = json.loads(raw)
+                    self.memory.set(key, result)
+            except Exception as e:
+                self.redis.failed(e)
+
+        metrics.incr("retrieval_cache.hit" if result is not None else "retrieval_cache.miss", endpoint=endpoint)
+        # Callers post-process chunks in place, so each gets its own copy
+        return copy.deepcopy(result) if result is not None else None
+
+    async def set(self, key: str, result: Dict):
+        # Degraded (one encoder failed) or empty searches are not worth keeping
+        if not result.get("chunks") or result.get("search_mode") != "hybrid":
+            return
+        self.memory.set(key, copy.deepcopy(result))
+        if self.redis and self.redis.available:
+            try:
+                await self.redis.client().set(key, json.dumps(result, default=str), ex=self.ttl)
+            except Exception as e:
+                self.redis.failed(e)
+
+    def stats(self) -> Dict:
+        return {
+            "memory_entries": len(self.memory),
+            "hit_rate": self._overall_hit_rate(),
+            "endpoints": {
+                endpoint: metrics.hit_rate("retrieval_cache", endpoint=endpoint)
+                for endpoint in sorted(self._endpoints)
+            }
+        }
+
+    def _overall_hit_rate(self) -> float:
+        hits = sum(metrics.get("retrieval_cache.hit", endpoint=e) for e in self._endpoints)
+        misses = sum(metrics.get("retrieval_cache.miss", endpoint=e) for e in self._endpoints)
+        total = hits + misses
+        return round(hits / total, 4) if total else 0.0
+
+
+retrieval_cache = RetrievalCache()
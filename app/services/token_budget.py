@@ -0,0 +1,112 @@
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Tuple
+
+from app.config.settings import settings
+from app.utils.metrics import metrics
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class TokenBudgetService:
+    """
+    Learns how many output tokens a generation really needs and sizes
+    max_output_tokens from it, instead of fixed per-type limits.
+
+    - Observations are kept per (endpoint, question type, count) and, normalised
+      per question, per (endpoint, question type) so a new count can borrow
+      from the others
+    - Limit = TOKEN_BUDGET_PERCENTILE of observed usage * (1 + headroom),
+      clamped to [TOKEN_BUDGET_MIN_TOKENS, LLM_MAX_TOKENS]
+    - A truncated response (finish_reason MAX_TOKENS) is recorded as needing
+      more than its limit, so the estimate corrects itself upward
+    - Until enough samples exist the caller's static default is used
+    """
+
+    # A truncated call needed more than its limit; assume this much more
+    TRUNCATION_FACTOR = 1.5
+
+    def __init__(self):
+        self.enabled = settings.TOKEN_BUDGET_ENABLED
+        self.percentile = settings.TOKEN_BUDGET_PERCENTILE
+        self.headroom = settings.TOKEN_BUDGET_HEADROOM
+        self.min_samples = settings.TOKEN_BUDGET_MIN_SAMPLES
+        self.window = 200
+        self._totals: Dict[Tuple[str, str, int], Deque[float]] = {}
+        self._per_question: Dict[Tuple[str, str], Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def _clamp(self, tokens: float) -> int:
+        return int(min(settings.LLM_MAX_TOKENS, max(settings.TOKEN_BUDGET_MIN_TOKENS, tokens)))
+
+    def max_tokens(self, endpoint: str, question_type: str, count: int, default: int) -> int:
+        """max_output_tokens for generating `count` questions of `question_type`"""
+        if not self.enabled:
+            return default
+
+        with self._lock:
+            totals = list(self._totals.get((endpoint, question_type, count), ()))
+            per_question = list(self._per_question.get((endpoint, question_type), ()))
+
+        if len(totals) >= self.min_samples:
+            estimate = _percentile(totals, self.percentile)
+            source = "exact"
+        elif len(per_question) >= self.min_samples:
+            estimate = _percentile(per_question, self.percentile) * count
+            source = "per_question"
+        else:
+            metrics.incr("token_budget.default", endpoint=endpoint)
+            return default
+
+        metrics.incr("token_budget.adaptive", endpoint=endpoint, source=source)
+        return self._clamp(estimate * (1 + self.headroom))
+
+    def observe(
+        self,
+        endpoint: str,
+        question_type: str,
+        count: int,
+        output_tokens: int,
+        produced: int,
+        limit: int,
+        truncated: bool = False
+    ):
+        """
+        Record one generation: `produced` questions came out of `output_tokens`.
+        Only complete runs (produced >= count) update the per-count total.
+        """
+        if not self.enabled or output_tokens <= 0:
+            return
+
+        if truncated:
+            metrics.incr("token_budget.truncated", endpoint=endpoint, type=question_type)
+            # The real need is unknown but above the limit
+            output_tokens = max(output_tokens, limit) * self.TRUNCATION_FACTOR
+
+        with self._lock:
+            if produced > 0:
+                series = self._per_question.setdefault((endpoint, question_type), deque(maxlen=self.window))
+                # A truncated run also spent tokens on the unfinished question
+                series.append(output_tokens / (produced + int(truncated)))
+            if produced >= count or truncated:
+                series = self._totals.setdefault((endpoint, question_type, count), deque(maxlen=self.window))
+                series.append(output_tokens)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            per_question = {f"{e}/{t}": list(v) for (e, t), v in self._per_question.items()}
+        return {
+            key: {
+                "samples": len(values),
+                "p50_per_question": round(_percentile(values, 0.5), 1),
+                "p95_per_question": round(_percentile(values, 0.95), 1)
+            }
+            for key, values in per_question.items() if values
+        }
+
+
+# Shared by every generator in the process
+token_budget = TokenBudgetService()
@@ -0,0 +1,73 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Generic, Optional, TypeVar
+
+import redis.asyncio as aioredis
+
+from app.config.settings import settings
+from app.utils.metrics import metrics
+
+logger = logging.getLogger("examready")
+
+T = TypeVar("T")
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class LoopBound(Generic[T]):
+    """
+    An async client created lazily and rebuilt whenever the running event
+    loop changes. gRPC aio channels and redis.asyncio pools stay bound to the
+    loop that created them, so a script calling asyncio.run() twice would
+    otherwise reuse a client whose loop is closed.
+    """
+
+    def __init__(self, factory: Callable[[], T]):
+        self._factory = factory
+        self._client: Optional[T] = None
+        self._loop = None  # strong ref: a closed loop's id can't be reused
+
+    def get(self) -> T:
+        loop = _running_loop()
+        if self._client is None or self._loop is not loop:
+            self._client = self._factory()
+            self._loop = loop
+        return self._client
+
+
+class AsyncRedis:
+    """
+    Non-blocking Redis for the request path: a loop-bound redis.asyncio
+    client plus a retry-after window. After an error Redis is skipped for
+    REDIS_RETRY_AFTER_SECONDS, so a dead Redis costs one timeout per window
+    instead of one per call. Callers check `available`, use `client()`, and
+    report errors with `failed()`.
+    """
+
+    def __init__(self, name: str, socket_timeout: float = 2, decode_responses: bool = True):
+        self.name = name
+        self._clients = LoopBound(lambda: aioredis.from_url(
+            settings.REDIS_URL, socket_timeout=socket_timeout, decode_responses=decode_responses
+        ))
+        self._down_until = 0.0
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self._down_until
+
+    def client(self) -> aioredis.Redis:
+        return self._clients.get()
+
+    def failed(self, error: Exception):
+        if self.available:
+            logger.warning(
+                f"{self.name}: Redis error ({error}); skipping Redis for {settings.REDIS_RETRY_AFTER_SECONDS}s"
+            )
+        self._down_until = time.monotonic() + settings.REDIS_RETRY_AFTER_SECONDS
+        metrics.incr("redis.errors", client=self.name)
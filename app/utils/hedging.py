@@ -0,0 +1,80 @@
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+
+class HedgePolicy:
+    """
+    Decides when a slow call deserves a duplicate ("hedged") request.
+
+    - Latency is tracked per call class (e.g. endpoint + token budget) over a
+      rolling window; the hedge delay is that class's `percentile` latency
+    - No hedging until a class has `min_samples` observations
+    - Budget: at most `budget_fraction` of recent calls may be hedged, so the
+      extra cost stays bounded even when the upstream is uniformly slow
+    """
+
+    def __init__(
+        self,
+        percentile: float = 0.95,
+        min_samples: int = 20,
+        window: int = 200,
+        budget_fraction: float = 0.1,
+        min_delay: float = 0.0
+    ):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.window = window
+        self.budget_fraction = budget_fraction
+        self.min_delay = min_delay
+        self._latencies: Dict[str, deque] = {}
+        self._hedged = deque(maxlen=max(window, 1))  # True per call that was hedged
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float):
+        """Record how long a completed call of class `name` took"""
+        with self._lock:
+            samples = self._latencies.get(name)
+            if samples is None:
+                samples = self._latencies[name] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def delay(self, name: str) -> Optional[float]:
+        """Seconds to wait before hedging a call of class `name` (None = don't hedge)"""
+        with self._lock:
+            samples = self._latencies.get(name)
+            if not samples or len(samples) < self.min_samples:
+                return None
+            ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(self.percentile * len(ordered)))
+        return max(self.min_delay, ordered[index])
+
+    def try_hedge(self) -> bool:
+        """
+        Claim budget for one hedge; False when the hedged share is exhausted.
+        A successful claim counts the call - don't also call record_call().
+        """
+        with self._lock:
+            hedged = sum(self._hedged)
+            if hedged + 1 > self.budget_fraction * (len(self._hedged) + 1):
+                return False
+            self._hedged.append(True)
+            return True
+
+    def record_call(self):
+        """Count a call that was NOT hedged (the budget's denominator)"""
+        with self._lock:
+            self._hedged.append(False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            calls = len(self._hedged)
+            hedged = sum(self._hedged)
+        return {
+            "recent_calls": calls,
+            "recent_hedged": hedged,
+            "hedged_fraction": round(hedged / calls, 4) if calls else 0.0,
+            "delays_s": {
+                name: round(self.delay(name) or 0.0, 3) for name in list(self._latencies)
+            }
+        }
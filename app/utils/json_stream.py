@@ -0,0 +1,212 @@
+import json
+from contextlib import aclosing
+from typing import Any, AsyncIterator, List, Optional, Tuple
+
+from json_repair import repair_json
+
+
+class JSONArrayStream:
+    """
+    Incremental parser for LLM output shaped like `[{...}, {...}, ...]`.
+
+    feed() returns each top-level object as soon as its closing brace arrives,
+    so callers can validate questions while the model is still writing.
+    Markdown fences and prose around the array are ignored, and a truncated
+    response still yields every complete leading object.
+    """
+
+    def __init__(self):
+        self._text: List[str] = []   # full response, for the finish() fallback
+        self._current: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self.emitted = 0
+
+    def feed(self, chunk: str) -> List[Any]:
+        """Consume a text chunk; return the objects it completed"""
+        if not chunk:
+            return []
+        self._text.append(chunk)
+
+        completed = []
+        for ch in chunk:
+            if self._depth == 0:
+                # Outside any object: only an opening brace matters
+                if ch == "{":
+                    self._depth = 1
+                    self._current = [ch]
+                continue
+
+            self._current.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    obj = self._parse("".join(self._current))
+                    self._current = []
+                    if obj is not None:
+                        completed.append(obj)
+
+        self.emitted += len(completed)
+        return completed
+
+    def finish(self) -> List[Any]:
+        """
+        Call once the stream ends. If nothing could be parsed incrementally
+        (unexpected shape), fall back to repairing the whole response.
+        An unfinished trailing object is dropped.
+        """
+        if self.emitted:
+            return []
+        text = "".join(self._text).replace("```json", "").replace("```", "")
+        try:
+            data = json.loads(repair_json(text))
+        except Exception:
+            return []
+        if isinstance(data, dict):
+            return [data]
+        if isinstance(data, list):
+            return [d for d in data if isinstance(d, dict)]
+        return []
+
+    @property
+    def pending(self) -> str:
+        """Text of the object currently being received (empty between objects)"""
+        return "".join(self._current)
+
+    @staticmethod
+    def _parse(raw: str) -> Any:
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError:
+            try:
+                obj = json.loads(repair_json(raw))
+            except Exception:
+                return None
+            return obj if isinstance(obj, dict) else None
+
+
+class JSONGroupedStream:
+    """
+    Incremental parser for LLM output shaped like `{"GROUP": [{...}, ...], ...}`.
+
+    feed() returns (group, object) pairs as soon as each inner object closes,
+    so one response can carry several kinds of item (e.g. questions keyed by
+    type) and a truncated response still yields its complete leading objects.
+    """
+
+    def __init__(self):
+        self._text: List[str] = []
+        self._stack: List[str] = []  # open containers of the outer object
+        self._current: List[str] = []
+        self._key: List[str] = []
+        self._group: Optional[str] = None
+        self._in_string = False
+        self._escape = False
+        self.emitted = 0
+
+    def feed(self, chunk: str) -> List[Tuple[Optional[str], Any]]:
+        """Consume a text chunk; return the (group, object) pairs it completed"""
+        if not chunk:
+            return []
+        self._text.append(chunk)
+
+        completed = []
+        for ch in chunk:
+            depth = len(self._stack)
+            if depth >= 3:
+                self._current.append(ch)  # inside an item object
+            if depth == 0:
+                # Before the outer object: only an opening brace matters
+                if ch == "{":
+                    self._stack.append(ch)
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if depth == 1:
+                        self._group = "".join(self._key)
+                    continue
+                if depth == 1:
+                    self._key.append(ch)
+            elif ch == '"':
+                self._in_string = True
+                if depth == 1:
+                    self._key = []
+            elif ch in "{[":
+                if depth == 2 and ch == "{":
+                    self._current = [ch]
+                self._stack.append(ch)
+            elif ch in "}]":
+                self._stack.pop()
+                if depth == 3:
+                    obj = JSONArrayStream._parse("".join(self._current))
+                    self._current = []
+                    if obj is not None:
+                        completed.append((self._group, obj))
+
+        self.emitted += len(completed)
+        return completed
+
+    def finish(self) -> List[Tuple[Optional[str], Any]]:
+        """
+        Call once the stream ends. If nothing could be parsed incrementally,
+        repair the whole response; a flat array is grouped by each item's "type".
+        """
+        if self.emitted:
+            return []
+        text = "".join(self._text).replace("```json", "").replace("```", "")
+        try:
+            data = json.loads(repair_json(text))
+        except Exception:
+            return []
+        if isinstance(data, dict):
+            return [
+                (group, item)
+                for group, items in data.items() if isinstance(items, list)
+                for item in items if isinstance(item, dict)
+            ]
+        if isinstance(data, list):
+            return [(d.get("type"), d) for d in data if isinstance(d, dict)]
+        return []
+
+
+async def aiter_json_objects(chunks: AsyncIterator[str]) -> AsyncIterator[Any]:
+    """
+    Yield JSON objects from a stream of text chunks as they complete.
+    Closing this iterator early also closes `chunks` (releasing its API key).
+    """
+    parser = JSONArrayStream()
+    async with aclosing(chunks):
+        async for chunk in chunks:
+            for obj in parser.feed(chunk):
+                yield obj
+    for obj in parser.finish():
+        yield obj
+
+
+async def aiter_grouped_json_objects(chunks: AsyncIterator[str]) -> AsyncIterator[Tuple[Optional[str], Any]]:
+    """aiter_json_objects for `{"GROUP": [...]}` output: yields (group, object)"""
+    parser = JSONGroupedStream()
+    async with aclosing(chunks):
+        async for chunk in chunks:
+            for pair in parser.feed(chunk):
+                yield pair
+    for pair in parser.finish():
+        yield pair
@@ -0,0 +1,57 @@
+import threading
+from collections import defaultdict
+from typing import Dict
+
+
+class MetricsRegistry:
+    """
+    In-process counters and gauges exported via GET /metrics.
+    Labels are folded into the series name: `name{label=value,...}`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._gauges = {}
+
+    @staticmethod
+    def _series(name: str, labels: Dict) -> str:
+        if not labels:
+            return name
+        label_str = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+        return f"{name}{{{label_str}}}"
+
+    def incr(self, name: str, value: float = 1, **labels):
+        """Increment a counter"""
+        series = self._series(name, labels)
+        with self._lock:
+            self._counters[series] += value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        """Set a point-in-time value"""
+        series = self._series(name, labels)
+        with self._lock:
+            self._gauges[series] = value
+
+    def get(self, name: str, **labels) -> float:
+        series = self._series(name, labels)
+        with self._lock:
+            return self._counters.get(series, self._gauges.get(series, 0))
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                "counters": dict(sorted(self._counters.items())),
+                "gauges": dict(sorted(self._gauges.items()))
+            }
+
+    def hit_rate(self, prefix: str, **labels) -> float:
+        """Ratio of `{prefix}.hit` to `{prefix}.hit + {prefix}.miss`"""
+        hits = self.get(f"{prefix}.hit", **labels)
+        misses = self.get(f"{prefix}.miss", **labels)
+        total = hits + misses
+        return round(hits / total, 4) if total else 0.0
+
+
+# Process-wide registry
+metrics = MetricsRegistry()
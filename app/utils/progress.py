@@ -0,0 +1,90 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional
+
+
+class Progress:
+    """
+    Live progress of one background job: counters set by the code doing the
+    work (chapters done, questions generated, ...) plus per-stage timings.
+    `on_change` is called after every update (the job manager persists it).
+    """
+
+    def __init__(self, on_change: Optional[Callable[[], None]] = None):
+        self.on_change = on_change
+        self.fields: Dict[str, Any] = {}
+        self.stages: Dict[str, int] = {}  # stage -> ms
+        self.stage: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change()
+
+    def update(self, **fields):
+        with self._lock:
+            self.fields.update(fields)
+        self._changed()
+
+    def incr(self, field: str, n: int = 1):
+        with self._lock:
+            self.fields[field] = self.fields.get(field, 0) + n
+        self._changed()
+
+    @contextmanager
+    def track_stage(self, name: str) -> Iterator[None]:
+        self.stage = name
+        self._changed()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.stages[name] = self.stages.get(name, 0) + int((time.monotonic() - started) * 1000)
+            self._changed()
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {"stage": self.stage, **self.fields, "stageTimingsMs": dict(self.stages)}
+
+
+# Progress of the job running in this task (None for plain HTTP requests,
+# where every helper below is a no-op)
+_current: ContextVar[Optional[Progress]] = ContextVar("job_progress", default=None)
+
+
+def current_progress() -> Optional[Progress]:
+    return _current.get()
+
+
+@contextmanager
+def track_progress(progress: Progress) -> Iterator[Progress]:
+    token = _current.set(progress)
+    try:
+        yield progress
+    finally:
+        _current.reset(token)
+
+
+def report_progress(**fields):
+    progress = _current.get()
+    if progress is not None:
+        progress.update(**fields)
+
+
+def progress_incr(field: str, n: int = 1):
+    progress = _current.get()
+    if progress is not None:
+        progress.incr(field, n)
+
+
+@contextmanager
+def progress_stage(name: str) -> Iterator[None]:
+    progress = _current.get()
+    if progress is None:
+        yield
+        return
+    with progress.track_stage(name):
+        yield
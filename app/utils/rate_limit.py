@@ -0,0 +1,54 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Classic token bucket: holds up to `capacity` tokens and refills at
+    `capacity / period` tokens per second. Used for per-key RPM and TPM limits.
+    """
+
+    def __init__(self, capacity: float, period: float = 60.0):
+        self.capacity = float(capacity)
+        self.refill_rate = self.capacity / period
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_rate)
+        self.updated_at = now
+
+    def available(self) -> float:
+        with self._lock:
+            self._refill()
+            return self.tokens
+
+    def can_consume(self, amount: float = 1) -> bool:
+        # A request larger than the whole bucket is allowed once the bucket is full
+        amount = min(amount, self.capacity)
+        return self.available() >= amount
+
+    def try_consume(self, amount: float = 1) -> bool:
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return True
+            return False
+
+    def refund(self, amount: float):
+        """Return over-reserved tokens (e.g. estimate was higher than actual usage)"""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+    def time_until(self, amount: float = 1) -> float:
+        """Seconds until `amount` tokens will be available"""
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill()
+            deficit = amount - self.tokens
+            return max(0.0, deficit / self.refill_rate) if self.refill_rate else float("inf")
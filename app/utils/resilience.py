@@ -0,0 +1,196 @@
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from app.config.settings import settings
+from app.utils.metrics import metrics
+
+
+class DeadlineExceeded(Exception):
+    """The request's deadline passed (or leaves no room for the next step)"""
+
+
+class CircuitOpenError(Exception):
+    """An upstream's circuit breaker is open: fail fast instead of calling it"""
+
+
+# ---------- Request deadline & retry budget ----------
+
+class RequestBudget:
+    """
+    One deadline and one retry allowance for a whole request, shared by every
+    layer (router -> generator -> GeminiService/QdrantService), so nested retry
+    loops can't multiply into minutes of waiting.
+    """
+
+    def __init__(self, timeout: Optional[float] = None, retries: Optional[int] = None, parent: "RequestBudget" = None):
+        now = time.monotonic()
+        deadline = now + timeout if timeout else None
+        if parent is not None and parent.deadline is not None:
+            deadline = parent.deadline if deadline is None else min(deadline, parent.deadline)
+        self.deadline = deadline
+        self.parent = parent
+        self.retries_left = retries
+        self._lock = threading.Lock()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds until the deadline (None = no deadline)"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def take_retry(self) -> bool:
+        """Consume one retry from this budget and every enclosing one"""
+        budget = self
+        while budget is not None:
+            with budget._lock:
+                if budget.retries_left is not None:
+                    if budget.retries_left <= 0:
+                        return False
+                    budget.retries_left -= 1
+            budget = budget.parent
+        return True
+
+
+_current_budget: ContextVar[Optional[RequestBudget]] = ContextVar("request_budget", default=None)
+
+
+@contextmanager
+def request_budget(timeout: Optional[float] = None, retries: Optional[int] = None) -> Iterator[RequestBudget]:
+    """
+    Open a budget scope. Nested scopes can only tighten the deadline, and
+    their retries also count against the enclosing budget.
+    """
+    budget = RequestBudget(timeout, retries, parent=_current_budget.get())
+    token = _current_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _current_budget.reset(token)
+
+
+def remaining_time(default: Optional[float] = None) -> Optional[float]:
+    """Seconds left for the current request, capped at `default` (a per-call timeout)"""
+    budget = _current_budget.get()
+    left = budget.remaining() if budget else None
+    if left is None:
+        return default
+    return left if default is None else min(left, default)
+
+
+def check_deadline(step: str = "request"):
+    left = remaining_time()
+    if left is not None and left <= 0:
+        metrics.incr("resilience.deadline_exceeded")
+        raise DeadlineExceeded(f"Deadline exceeded before {step}")
+
+
+def allow_retry(upstream: str) -> bool:
+    """True if the request may retry once more (budget and deadline permitting)"""
+    left = remaining_time()
+    if left is not None and left <= 0:
+        return False
+    budget = _current_budget.get()
+    if budget is not None and not budget.take_retry():
+        metrics.incr("resilience.retry_budget_exhausted", upstream=upstream)
+        return False
+    metrics.incr("resilience.retries", upstream=upstream)
+    return True
+
+
+async def backoff(seconds: float, step: str = "retry"):
+    """
+    Sleep before a retry, but never past the deadline: if the wait would not
+    leave any time for the retry itself, raise DeadlineExceeded right away.
+    """
+    left = remaining_time()
+    if left is not None and left <= seconds:
+        metrics.incr("resilience.deadline_exceeded")
+        raise DeadlineExceeded(f"No time left to {step} (needs {seconds:.0f}s, {left:.0f}s left)")
+    await asyncio.sleep(seconds)
+
+
+# ---------- Circuit breaker ----------
+
+class CircuitBreaker:
+    """
+    Per-upstream breaker: after `failure_threshold` consecutive failures the
+    circuit opens and calls fail fast for `reset_timeout` seconds; then a
+    single trial call is let through (half-open) to probe recovery.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._trial_started = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError if the upstream should not be called now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            now = time.monotonic()
+            if self.state == self.OPEN and now - self.opened_at >= self.reset_timeout:
+                self._set_state(self.HALF_OPEN)
+            # One trial at a time (a trial that never reported back - e.g. it was
+            # cancelled - is replaced after reset_timeout)
+            if self.state == self.HALF_OPEN and (
+                not self._trial_in_flight or now - self._trial_started >= self.reset_timeout
+            ):
+                self._trial_in_flight = True
+                self._trial_started = now
+                return
+        metrics.incr("circuit.rejected", upstream=self.name)
+        raise CircuitOpenError(f"{self.name} circuit open - failing fast")
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._trial_in_flight = False
+            if self.state != self.CLOSED:
+                self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                if self.state != self.OPEN:
+                    self._set_state(self.OPEN)
+
+    def _set_state(self, state: str):
+        # Caller holds the lock
+        self.state = state
+        metrics.set_gauge("circuit.open", 1 if state == self.OPEN else 0, upstream=self.name)
+        if state == self.OPEN:
+            print(f"   🔌 {self.name} circuit OPEN after {self.failures} failures (retry in {self.reset_timeout:.0f}s)")
+        elif state == self.CLOSED:
+            print(f"   ✅ {self.name} circuit closed")
+
+    def status(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self.failures}
+
+
+# One breaker per upstream, shared by the whole process
+gemini_breaker = CircuitBreaker(
+    "gemini",
+    failure_threshold=settings.CIRCUIT_FAILURE_THRESHOLD,
+    reset_timeout=settings.CIRCUIT_RESET_SECONDS
+)
+qdrant_breaker = CircuitBreaker(
+    "qdrant",
+    failure_threshold=settings.CIRCUIT_FAILURE_THRESHOLD,
+    reset_timeout=settings.CIRCUIT_RESET_SECONDS
+)
@@ -0,0 +1,55 @@
+import asyncio
+import copy
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from app.utils.metrics import metrics
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical calls: while a call for `key` is in flight,
+    later callers await the same result instead of starting their own.
+
+    The upstream call runs as its own task, so a cancelled caller (e.g. a client
+    disconnect) does not fail the others; it is only cancelled once nobody is
+    waiting for it any more.
+
+    Counters: singleflight.leader{group=..} / singleflight.coalesced{group=..}
+    """
+
+    def __init__(self, group: str):
+        self.group = group
+        self._calls: Dict[Hashable, list] = {}  # key -> [task, waiters]
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]], copy_result: bool = False) -> Any:
+        """
+        Run `fn()` once per key across concurrent callers.
+        Use copy_result=True for mutable results (each caller gets its own copy).
+        """
+        entry = self._calls.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(fn())
+            entry = [task, 0]
+            self._calls[key] = entry
+            task.add_done_callback(lambda _t, k=key, e=entry: self._forget(k, e))
+            metrics.incr("singleflight.leader", group=self.group)
+        else:
+            metrics.incr("singleflight.coalesced", group=self.group)
+
+        task = entry[0]
+        entry[1] += 1
+        try:
+            result = await asyncio.shield(task)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not task.done():
+                task.cancel()
+
+        return copy.deepcopy(result) if copy_result else result
+
+    def _forget(self, key: Hashable, entry: list):
+        if self._calls.get(key) is entry:
+            del self._calls[key]
+
+    def in_flight(self) -> int:
+        return len(self._calls)
@@ -0,0 +1,167 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional, Tuple
+
+from app.config.settings import settings
+from app.utils.metrics import metrics
+
+
+class TokenUsage:
+    """
+    Token and cost totals for one unit of work (an HTTP request, a chapter batch).
+
+    Trackers nest: usage recorded in an inner scope is also added to every
+    enclosing one, so a route can read request totals while a generator
+    attributes a single call's tokens to the questions it produced.
+    """
+
+    def __init__(self, parent: Optional["TokenUsage"] = None):
+        self.parent = parent
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.cached_tokens = 0
+        self.embedding_tokens = 0
+        self.truncated = 0  # generations cut off by max_output_tokens
+        self.calls = 0
+        self.cost_usd = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.output_tokens
+
+    def add(
+        self,
+        prompt: int = 0,
+        output: int = 0,
+        cached: int = 0,
+        embedding: int = 0,
+        cost: float = 0.0,
+        truncated: bool = False
+    ):
+        tracker = self
+        while tracker is not None:
+            with tracker._lock:
+                tracker.prompt_tokens += prompt
+                tracker.output_tokens += output
+                tracker.cached_tokens += cached
+                tracker.embedding_tokens += embedding
+                tracker.truncated += int(truncated)
+                tracker.calls += 1
+                tracker.cost_usd += cost
+            tracker = tracker.parent
+
+    def to_dict(self) -> Dict:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "output_tokens": self.output_tokens,
+            "cached_tokens": self.cached_tokens,
+            "embedding_tokens": self.embedding_tokens,
+            "total_tokens": self.total_tokens,
+            "truncated": self.truncated,
+            "calls": self.calls,
+            "cost_usd": round(self.cost_usd, 6)
+        }
+
+
+# Current tracker for this request/task. asyncio tasks copy the context, so
+# work fanned out with gather() still adds to the same (shared) tracker.
+_current: ContextVar[Optional[TokenUsage]] = ContextVar("token_usage", default=None)
+
+
+def current_usage() -> Optional[TokenUsage]:
+    return _current.get()
+
+
+@contextmanager
+def track_usage() -> Iterator[TokenUsage]:
+    """Open a (nested) usage scope; totals also roll up into the enclosing scope"""
+    tracker = TokenUsage(parent=_current.get())
+    token = _current.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _current.reset(token)
+
+
+def generation_cost(
+    prompt: int,
+    output: int,
+    cached: int = 0,
+    prices: Optional[Tuple[float, float, float]] = None
+) -> float:
+    """
+    USD for one generation; cached prompt tokens are billed at the cached rate.
+    `prices` is (input, output, cached) per 1M tokens, default: the standard model.
+    """
+    price_input, price_output, price_cached = prices or (
+        settings.GEMINI_PRICE_INPUT_PER_M,
+        settings.GEMINI_PRICE_OUTPUT_PER_M,
+        settings.GEMINI_PRICE_CACHED_PER_M,
+    )
+    return (
+        max(0, prompt - cached) * price_input
+        + cached * price_cached
+        + output * price_output
+    ) / 1_000_000
+
+
+def record_generation(
+    prompt: int,
+    output: int,
+    cached: int = 0,
+    endpoint: Optional[str] = None,
+    key: Optional[str] = None,
+    latency_ms: float = 0.0,
+    truncated: bool = False,
+    prices: Optional[Tuple[float, float, float]] = None
+) -> float:
+    """Add one Gemini generation to the current request and to the running totals"""
+    cost = generation_cost(prompt, output, cached, prices)
+    tracker = _current.get()
+    if tracker is not None:
+        tracker.add(prompt=prompt, output=output, cached=cached, cost=cost, truncated=truncated)
+
+    endpoint = endpoint or "other"
+    metrics.incr("llm.calls", endpoint=endpoint)
+    metrics.incr("llm.tokens.prompt", prompt, endpoint=endpoint)
+    metrics.incr("llm.tokens.output", output, endpoint=endpoint)
+    metrics.incr("llm.tokens.cached", cached, endpoint=endpoint)
+    metrics.incr("llm.cost_usd", cost, endpoint=endpoint)
+    metrics.incr("llm.latency_ms", latency_ms, endpoint=endpoint)
+    if truncated:
+        metrics.incr("llm.truncated", endpoint=endpoint)
+    if key:
+        metrics.incr("gemini.tokens", prompt + output, key=key)
+    return cost
+
+
+def record_embedding(tokens: int, key: Optional[str] = None):
+    """Add embedding input tokens (quota sizing; billed at GEMINI_PRICE_EMBED_PER_M)"""
+    cost = tokens * settings.GEMINI_PRICE_EMBED_PER_M / 1_000_000
+    tracker = _current.get()
+    if tracker is not None:
+        tracker.add(embedding=tokens, cost=cost)
+
+    metrics.incr("embedding.tokens", tokens)
+    metrics.incr("embedding.cost_usd", cost)
+    if key:
+        metrics.incr("gemini.tokens", tokens, key=key)
+
+
+def usage_report() -> Dict[str, Dict]:
+    """Running totals per endpoint, for GET /metrics"""
+    snapshot = metrics.snapshot()["counters"]
+    report: Dict[str, Dict] = {}
+    for series, value in snapshot.items():
+        if not series.startswith("llm.") or "{endpoint=" not in series:
+            continue
+        name, label = series.split("{endpoint=", 1)
+        endpoint = label.rstrip("}")
+        report.setdefault(endpoint, {})[name[len("llm."):].replace(".", "_")] = round(value, 6)
+
+    for row in report.values():
+        calls = row.get("calls", 0)
+        row["avg_latency_ms"] = round(row.get("latency_ms", 0) / calls, 1) if calls else 0.0
+    return report
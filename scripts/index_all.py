@@ -1,5 +1,6 @@
 import sys
 import os
+import asyncio
 
 # Add project root to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -28,7 +29,7 @@ BOOKS_TO_INDEX = [
     }
 ]
 
-def main():
+async def main():
     print("🚀 Starting Full Indexing Pipeline...")
     
     indexer = IndexingService()
@@ -47,7 +48,7 @@ def main():
             continue
             
         # Run Pipeline: PDF -> Text/Vision -> Chunks -> Embeddings
-        chunks = indexer.process_pdf(book['path'], book['metadata'])
+        chunks = await indexer.process_pdf(book['path'], book['metadata'])
         
         # Save to Chroma
         chroma.add_documents(collection, chunks)
@@ -66,4 +67,5 @@ def main():
         print("❌ No chunks were generated.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # One event loop for every book: pooled async clients stay bound to it
+    asyncio.run(main())
\ No newline at end of file
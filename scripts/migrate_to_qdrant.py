@@ -1,5 +1,6 @@
 import sys
 import os
+import asyncio
 import uuid
 import time
 
@@ -70,7 +71,7 @@ BOOKS_TO_INDEX = [
     }
 ]
 
-def main():
+async def main():
     print(f"🚀 Starting Migration to Qdrant Cloud")
     print(f"🎯 Target Collection: {settings.QDRANT_COLLECTION_NAME}")
     
@@ -79,7 +80,7 @@ def main():
     
     # 2. Ensure Collection Exists
     try:
-        qdrant_service.create_collection_if_not_exists()
+        await qdrant_service.create_collection_if_not_exists()
     except Exception as e:
         print(f"⚠️ Error checking collection (might already exist): {e}")
 
@@ -99,7 +100,7 @@ def main():
         # A. Process PDF (Extract Text -> Vision -> Chunk -> Dense Embeddings)
         # The IndexingService handles Gemini embeddings internally
         try:
-            chunks = indexer.process_pdf(pdf_path, metadata)
+            chunks = await indexer.process_pdf(pdf_path, metadata)
             
             if not chunks:
                 print("   ⚠️ No chunks extracted. Skipping upsert.")
@@ -113,7 +114,7 @@ def main():
             
             # C. Upsert to Qdrant
             # qdrant_service will generate Sparse Vectors (BM25) internally before uploading
-            qdrant_service.upsert_chunks(chunks, embeddings)
+            await qdrant_service.upsert_chunks(chunks, embeddings)
             
             print(f"   ✅ Successfully indexed: {metadata['chapter']}")
             
@@ -124,7 +125,7 @@ def main():
 
     # Final Stats
     try:
-        info = qdrant_service.client.get_collection(settings.QDRANT_COLLECTION_NAME)
+        info = await qdrant_service.client.get_collection(settings.QDRANT_COLLECTION_NAME)
         print(f"\n✨ Migration Complete!")
         print(f"📊 Total Vectors in Qdrant: {info.points_count}")
         print(f"🟢 Status: {info.status}")
@@ -132,4 +133,5 @@ def main():
         print(f"⚠️ Could not fetch final stats: {e}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # One event loop for every book: pooled async clients stay bound to it
+    asyncio.run(main())
\ No newline at end of file
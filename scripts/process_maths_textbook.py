@@ -147,7 +147,14 @@ async def process_chapter(pdf_filename: str):
     
     # Generate embeddings
     print(f"   🔢 Generating embeddings...")
-    embeddings = gemini.embed_batch(texts)
+    embeddings = await gemini.embed_batch_async(texts)
+    
+    # Drop chunks whose embedding failed
+    failed = sum(1 for e in embeddings if not e)
+    if failed:
+        print(f"   ⚠️ Skipping {failed} chunks without embeddings")
+        points = [p for p, e in zip(points, embeddings) if e]
+        embeddings = [e for e in embeddings if e]
     
     # Upload to Qdrant
     print(f"   ☁️ Uploading to Qdrant...")
@@ -80,7 +80,7 @@ async def process_all():
             }
             
             # Process PDF with OCR pipeline
-            chunks = indexing_service.process_pdf(pdf_path, metadata)
+            chunks = await indexing_service.process_pdf(pdf_path, metadata)
             
             if not chunks:
                 print(f"   ⚠️ No chunks generated")
@@ -298,7 +298,14 @@ async def seed_chapter(board_subject: str, chapter: str, textbook_subject: str):
     if questions_to_upsert:
         print(f"   💾 Upserting {len(questions_to_upsert)} questions...")
         texts = [q['text'] for q in questions_to_upsert]
-        embeddings = gemini.embed_batch(texts)
+        embeddings = await gemini.embed_batch_async(texts)
+        
+        # Drop questions whose embedding failed
+        failed = sum(1 for e in embeddings if not e)
+        if failed:
+            print(f"   ⚠️ Skipping {failed} questions without embeddings")
+            questions_to_upsert = [q for q, e in zip(questions_to_upsert, embeddings) if e]
+            embeddings = [e for e in embeddings if e]
         
         await qdrant_service.upsert_chunks(
             chunks=questions_to_upsert,
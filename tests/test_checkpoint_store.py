@@ -0,0 +1,37 @@
+import asyncio
+
+from app.services.checkpoint_store import CheckpointStore
+
+def _store():
+    store = CheckpointStore()
+    store.enabled = True
+    store.redis = None  # memory tier only
+    return store
+
+def test_resume_returns_saved_units():
+    async def main():
+        store = _store()
+        fingerprint = store.fingerprint(chapters=["Polynomials"], subject="Mathematics")
+
+        first = await store.open("gen-1", fingerprint)
+        assert first.resumed_units == 0
+        await first.save("Polynomials", "MCQ", [{"text": "Q1"}, {"text": "Q2"}])
+
+        retry = await store.open("gen-1", fingerprint)
+        assert retry.resumed_units == 1
+        assert retry.units("Polynomials") == {"MCQ": [{"text": "Q1"}, {"text": "Q2"}]}
+        assert retry.units("Circles") == {}
+
+    asyncio.run(main())
+
+def test_same_id_with_different_inputs_starts_over():
+    async def main():
+        store = _store()
+        checkpoint = await store.open("gen-2", store.fingerprint(subject="Mathematics"))
+        await checkpoint.save("Circles", "LA", [{"text": "Q"}])
+
+        other = await store.open("gen-2", store.fingerprint(subject="Science"))
+        assert other.resumed_units == 0
+        assert other.units("Circles") == {}
+
+    asyncio.run(main())
@@ -1,4 +1,12 @@
-from app.routers.exam import _calculate_distribution
+import time
+
+import pytest
+
+# app.routers.exam imports the Qdrant service, which needs fastembed
+pytest.importorskip("fastembed")
+
+from app.models.exammodels import ExamRequest, QuestionModel
+from app.routers.exam import _calculate_distribution, _chapter_targets, _drop_duplicates, _exam_summary
 
 def test_distribution_math_exact():
     # 50 questions, 10% / 40% / 50%
@@ -20,4 +28,35 @@ def test_distribution_math_rounding():
     result = _calculate_distribution(total, dist)
     
     # 33% of 3 is 0.99 (0). Remainder logic should fill the gap.
-    assert sum(result.values()) == 3
\ No newline at end of file
+    assert sum(result.values()) == 3
+
+def test_chapter_targets_spread_remainder():
+    request = ExamRequest(**{
+        "board": "CBSE", "class": 10, "subject": "Physics",
+        "chapters": ["Light", "Electricity", "Magnetism"],
+        "totalQuestions": 7, "bloomsDistribution": {"Remember": 100}, "difficulty": "Medium"
+    })
+    assert _chapter_targets(request) == [("Light", 3), ("Electricity", 2), ("Magnetism", 2)]
+
+def test_exam_summary_counts_marks_and_levels():
+    questions = [
+        QuestionModel(text=f"Question {i}", options=["a", "b", "c", "d"], correctAnswer="a",
+                      bloomsLevel=level, marks=1, difficulty="Easy")
+        for i, level in enumerate(["Remember", "Remember", "Apply"])
+    ]
+    summary = _exam_summary(questions, time.time())
+    assert summary["bloomsBreakdown"] == {"Remember": 2, "Apply": 1}
+    assert summary["totalQuestions"] == 3
+    assert summary["totalMarks"] == 3
+    assert summary["generationTime"] >= 0
+
+def test_drop_duplicates_keeps_first_occurrence_in_order():
+    def q(text):
+        return QuestionModel(text=text, options=["a", "b", "c", "d"], correctAnswer="a",
+                             bloomsLevel="Remember", marks=1, difficulty="Easy")
+
+    seen = set()
+    first = _drop_duplicates([q("What is refraction of light?"), q("Define electric current.")], seen)
+    second = _drop_duplicates([q("Define electric current"), q("State Ohm's law clearly.")], seen)
+    assert [x.text for x in first] == ["What is refraction of light?", "Define electric current."]
+    assert [x.text for x in second] == ["State Ohm's law clearly."]
@@ -0,0 +1,91 @@
+import asyncio
+import time
+
+from app.services import gemini_key_pool
+from app.services.gemini_key_pool import GeminiKeyPool
+
+KEYS = ["test-key-aaaaaaaa", "test-key-bbbbbbbb", "test-key-cccccccc"]
+
+def _pool(monkeypatch, reserve=None):
+    async def allow(key_id, tokens, rpm=None, tpm=None):
+        return True, 0.0
+    # Shared ledger stubbed out: only the local scheduler is under test
+    monkeypatch.setattr(gemini_key_pool.quota_ledger, "reserve", reserve or allow)
+    monkeypatch.setattr(gemini_key_pool.quota_ledger, "publish_cooldown", lambda key_id, seconds: None)
+    return GeminiKeyPool(KEYS, rpm=10, tpm=1000)
+
+def test_acquire_spreads_over_least_loaded_keys(monkeypatch):
+    pool = _pool(monkeypatch)
+
+    async def main():
+        return [await pool.acquire(10) for _ in range(3)]
+
+    slots = asyncio.run(main())
+    assert sorted(s.index for s in slots) == [0, 1, 2]
+
+    pool.release(slots[1])
+    assert slots[1].in_flight == 0
+    assert asyncio.run(pool.acquire(10)).index == slots[1].index
+
+def test_exclude_prefers_other_keys_but_falls_back(monkeypatch):
+    pool = _pool(monkeypatch)
+    assert asyncio.run(pool.acquire(exclude=[0, 1])).index == 2
+    # Every key excluded: any key beats waiting, and the least loaded wins
+    assert asyncio.run(pool.acquire(exclude=[0, 1, 2])).index in (0, 1)
+
+def test_rate_limited_release_cools_key_down_exponentially(monkeypatch):
+    published = []
+    pool = _pool(monkeypatch)
+    monkeypatch.setattr(gemini_key_pool.quota_ledger, "publish_cooldown", lambda key_id, seconds: published.append(seconds))
+    monkeypatch.setattr(gemini_key_pool.settings, "GEMINI_KEY_COOLDOWN_SECONDS", 10.0)
+    slot = pool.slots[0]
+
+    pool.release(slot, rate_limited=True)
+    first = slot.cooldown_until - time.monotonic()
+    pool.release(slot, rate_limited=True)
+    second = slot.cooldown_until - time.monotonic()
+
+    assert 9 < first <= 10
+    assert 19 < second <= 20
+    assert published == [10.0, 20.0]
+    assert asyncio.run(pool.acquire()).index != 0  # skipped while cooling
+
+    pool.release(slot)
+    assert slot.consecutive_429 == 0
+
+def test_ledger_rejection_refunds_and_moves_to_next_key(monkeypatch):
+    calls = []
+
+    async def reserve(key_id, tokens, rpm=None, tpm=None):
+        calls.append(key_id)
+        return len(calls) > 1, 5.0  # first key's shared window is full
+
+    pool = _pool(monkeypatch, reserve)
+    slot = asyncio.run(pool.acquire(100))
+    rejected = pool.slots[0]
+
+    assert slot.index == 1
+    assert rejected.in_flight == 0
+    assert rejected.rpm.available() > 9.9
+    assert rejected.tpm.available() > 999
+    assert 4 < rejected.cooldown_until - time.monotonic() <= 5
+
+def test_cancelled_acquire_releases_slot(monkeypatch):
+    async def reserve(key_id, tokens, rpm=None, tpm=None):
+        await asyncio.sleep(10)
+        return True, 0.0
+
+    pool = _pool(monkeypatch, reserve)
+
+    async def main():
+        task = asyncio.ensure_future(pool.acquire(100))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(main())
+    assert all(s.in_flight == 0 for s in pool.slots)
+    assert pool.slots[0].tpm.available() > 999
@@ -0,0 +1,20 @@
+from app.utils.hedging import HedgePolicy
+
+def test_delay_needs_samples_and_tracks_percentile():
+    policy = HedgePolicy(percentile=0.9, min_samples=10, min_delay=0.5)
+    assert policy.delay("board_exam") is None
+
+    for i in range(1, 11):
+        policy.observe("board_exam", float(i))
+    assert policy.delay("board_exam") == 10.0
+    assert policy.delay("other") is None
+
+def test_budget_caps_hedged_fraction():
+    policy = HedgePolicy(budget_fraction=0.1, window=100)
+    hedged = 0
+    for _ in range(100):
+        if policy.try_hedge():
+            hedged += 1
+        else:
+            policy.record_call()
+    assert 0 < hedged <= 10
@@ -0,0 +1,37 @@
+from app.utils.json_stream import JSONArrayStream, JSONGroupedStream
+
+RESPONSE = '```json\n[{"text": "What is {x}?", "options": ["A", "B"]},\n {"text": "Say \\"hi\\"", "marks": 2}, {"text": "cut off mid'
+
+def test_objects_are_emitted_as_they_close():
+    parser = JSONArrayStream()
+    emitted = []
+    for i in range(0, len(RESPONSE), 7):
+        emitted.extend(parser.feed(RESPONSE[i:i + 7]))
+
+    assert [q["text"] for q in emitted] == ["What is {x}?", 'Say "hi"']
+    assert parser.pending.startswith('{"text": "cut off')
+    # Truncated tail is dropped, not repaired into a half question
+    assert parser.finish() == []
+
+def test_finish_falls_back_to_whole_response_repair():
+    parser = JSONArrayStream()
+    parser.feed('["plain", "strings"]')
+    assert parser.finish() == []
+
+    parser = JSONArrayStream()
+    parser.feed("no json at all")
+    assert parser.finish() == []
+
+GROUPED = '```json\n{"MCQ": [{"text": "Pick {one}"}, {"text": "Say \\"hi\\""}],\n "LA": [{"text": "Prove [it]", "keySteps": ["a", "b"]}, {"text": "cut'
+
+def test_grouped_objects_keep_their_group():
+    parser = JSONGroupedStream()
+    emitted = []
+    for i in range(0, len(GROUPED), 5):
+        emitted.extend(parser.feed(GROUPED[i:i + 5]))
+
+    assert [(group, q["text"]) for group, q in emitted] == [
+        ("MCQ", "Pick {one}"), ("MCQ", 'Say "hi"'), ("LA", "Prove [it]")
+    ]
+    assert parser.finish() == []
+
@@ -0,0 +1,27 @@
+import time
+from app.utils.memory_cache import LRUCache
+
+def test_lru_eviction_order():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")          # 'a' is now most recently used
+    cache.set("c", 3)       # evicts 'b'
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+def test_lru_ttl_expiry():
+    cache = LRUCache(maxsize=10, ttl=0.05)
+    cache.set("k", "v")
+    assert cache.get("k") == "v"
+
+    time.sleep(0.06)
+    assert cache.get("k") is None
+
+    # Per-entry TTL override
+    cache.set("k2", "v2", ttl=10)
+    time.sleep(0.06)
+    assert cache.get("k2") == "v2"
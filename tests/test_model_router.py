@@ -0,0 +1,29 @@
+from app.services.model_router import ModelRouter
+
+def _router():
+    router = ModelRouter()
+    router.enabled = True
+    router.routes = {"quiz": "fast", "board_exam:MCQ": "fast"}
+    return router
+
+def test_routes_by_endpoint_and_question_type():
+    router = _router()
+    assert router.route("quiz").name == "fast"
+    assert router.route("board_exam", "MCQ").name == "fast"
+    assert router.route("board_exam", "LA").name == "standard"
+    assert router.route("tutor").name == "standard"
+
+    router.enabled = False
+    assert router.route("quiz").name == "standard"
+
+def test_report_combines_latency_and_quality():
+    router = _router()
+    router.observe_call("board_exam:MCQ", "fast", 100.0)
+    router.observe_call("board_exam:MCQ", "fast", 300.0, truncated=True)
+    router.record_quality("board_exam", "MCQ", requested=10, accepted=8)
+
+    row = router.report()["routes"]["board_exam:MCQ"]
+    assert row["tier"] == "fast"
+    assert row["avg_latency_ms"] == 200.0
+    assert row["truncation_rate"] == 0.5
+    assert row["acceptance_rate"] == 0.8
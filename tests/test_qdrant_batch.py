@@ -0,0 +1,117 @@
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+# Importing the service builds the BM25 encoder
+pytest.importorskip("fastembed")
+
+from app.services import qdrant_service as qdrant_module
+from app.services.qdrant_service import QdrantService
+from app.utils.resilience import CircuitBreaker, request_budget
+
+class StubClient:
+    """query_batch_points answers each request with `limit` points tagged by the request's limit"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.batches = []
+
+    async def query_batch_points(self, collection_name, requests):
+        self.batches.append(requests)
+        await asyncio.sleep(self.delay)
+        return [
+            SimpleNamespace(points=[
+                SimpleNamespace(id=f"{request.limit}-{n}", score=1.0, payload={"text": f"limit {request.limit}"})
+                for n in range(request.limit)
+            ])
+            for request in requests
+        ]
+
+def _service(monkeypatch, client):
+    service = QdrantService.__new__(QdrantService)  # no encoders or Gemini pool
+    service.client = client
+    service.questions_collection = "questions"
+    service.textbook_collection = "textbooks"
+    # Fresh breaker per test: failures here must not open the shared one
+    monkeypatch.setattr(qdrant_module, "qdrant_breaker", CircuitBreaker("test", failure_threshold=1))
+    return service
+
+def _texts(result):
+    return [chunk["text"] for chunk in result["chunks"]]
+
+def test_select_by_filter_batch_keeps_spec_order(monkeypatch):
+    client = StubClient()
+    service = _service(monkeypatch, client)
+    specs = [({"section": "A"}, 3), ({"section": "B"}, 1), ({"section": "C"}, 2)]
+
+    results = asyncio.run(service.select_by_filter_batch(specs))
+    assert len(client.batches) == 1  # one round trip for every section
+    assert [_texts(r) for r in results] == [["limit 3"] * 3, ["limit 1"], ["limit 2"] * 2]
+    assert all(r["search_mode"] == "filter" for r in results)
+
+def test_select_by_filter_batch_fails_soft_when_circuit_is_open(monkeypatch):
+    client = StubClient()
+    service = _service(monkeypatch, client)
+    qdrant_module.qdrant_breaker.record_failure()  # threshold 1: open
+
+    results = asyncio.run(service.select_by_filter_batch([({}, 2), ({}, 3)], order="least_used"))
+    assert client.batches == []
+    assert [r["chunks"] for r in results] == [[], []]
+
+def test_select_by_filter_batch_fails_soft_past_the_deadline(monkeypatch):
+    service = _service(monkeypatch, StubClient(delay=1.0))
+
+    async def main():
+        with request_budget(timeout=0.05):
+            return await service.select_by_filter_batch([({}, 2)])
+
+    results = asyncio.run(main())
+    assert results[0]["chunks"] == []
+    assert results[0]["search_mode"] == "filter"
+
+def _encoder(failing=()):
+    async def encode(query):
+        if query in failing:
+            return None, None  # both encoders failed
+        return [0.1, 0.2], SimpleNamespace(indices=np.array([1]), values=np.array([1.0]))
+    return encode
+
+def test_hybrid_search_batch_keeps_spec_order(monkeypatch):
+    client = StubClient()
+    service = _service(monkeypatch, client)
+    service._encode_query = _encoder(failing={"unencodable"})
+    monkeypatch.setattr(qdrant_module.retrieval_cache, "enabled", False)
+    specs = [("light", {}, 2), ("unencodable", {}, 5), ("current", {}, 1), ("magnets", {}, 3)]
+
+    results = asyncio.run(service.hybrid_search_batch(specs))
+    assert len(client.batches) == 1
+    assert len(client.batches[0]) == 3  # nothing sent for the spec that couldn't be encoded
+    assert _texts(results[0]) == ["limit 2"] * 2
+    assert results[1]["chunks"] == [] and results[1]["search_mode"] == "none"
+    assert _texts(results[2]) == ["limit 1"]
+    assert _texts(results[3]) == ["limit 3"] * 3
+    assert results[0]["search_mode"] == "hybrid"
+
+def test_hybrid_search_batch_fails_soft_when_circuit_is_open(monkeypatch):
+    client = StubClient()
+    service = _service(monkeypatch, client)
+    service._encode_query = _encoder()
+    monkeypatch.setattr(qdrant_module.retrieval_cache, "enabled", False)
+    qdrant_module.qdrant_breaker.record_failure()  # threshold 1: open
+
+    results = asyncio.run(service.hybrid_search_batch([("light", {}, 2), ("current", {}, 1)]))
+    assert client.batches == []
+    assert [(r["chunks"], r["search_mode"]) for r in results] == [([], "hybrid"), ([], "hybrid")]
+
+def test_hybrid_search_batch_fails_soft_past_the_deadline(monkeypatch):
+    service = _service(monkeypatch, StubClient(delay=1.0))
+    service._encode_query = _encoder()
+    monkeypatch.setattr(qdrant_module.retrieval_cache, "enabled", False)
+
+    async def main():
+        with request_budget(timeout=0.05):
+            return await service.hybrid_search_batch([("light", {}, 2)])
+
+    assert asyncio.run(main())[0]["chunks"] == []
@@ -0,0 +1,115 @@
+import asyncio
+import time
+
+from app.services.quota_ledger import _RESERVE_LUA, QuotaLedger
+from app.utils.metrics import metrics
+
+class FakeRedis:
+    """In-memory stand-in for the ledger's Redis: the reservation script mirrors _RESERVE_LUA"""
+
+    def __init__(self):
+        self.windows = {}    # window key -> [(ms timestamp, tokens)]
+        self.cooldowns = {}  # cooldown key -> expiry (ms)
+
+    def register_script(self, source):
+        assert source == _RESERVE_LUA
+
+        async def script(keys, args):
+            return self._reserve(keys, args)
+        return script
+
+    def _reserve(self, keys, args):
+        now, window, rpm, tpm, tokens, _request_id = args
+        tokens = min(tokens, tpm)
+        cooldown = self.cooldowns.get(keys[1], 0) - now
+        if cooldown > 0:
+            return [0, cooldown]
+        entries = [(ts, t) for ts, t in self.windows.get(keys[0], []) if ts > now - window]
+        used = sum(t for _ts, t in entries)
+        if len(entries) >= rpm or (entries and used + tokens > tpm):
+            return [0, max(1, entries[0][0] + window - now)]
+        self.windows[keys[0]] = entries + [(now, tokens)]
+        return [1, 0]
+
+    async def set(self, key, value, px=None, nx=False):
+        now = time.time() * 1000
+        if nx and self.cooldowns.get(key, 0) > now:
+            return None
+        self.cooldowns[key] = now + px
+        return True
+
+class BrokenRedis:
+    def __init__(self):
+        self.calls = 0
+
+    def register_script(self, source):
+        async def script(keys, args):
+            self.calls += 1
+            raise ConnectionError("Redis is down")
+        return script
+
+def _ledger(client):
+    ledger = QuotaLedger()
+    ledger.enabled = True
+    ledger.redis.client = lambda: client
+    return ledger
+
+def test_window_accepts_up_to_rpm_then_returns_wait():
+    ledger = _ledger(FakeRedis())
+
+    async def main():
+        return [await ledger.reserve("k1", 10, rpm=2, tpm=1000) for _ in range(3)]
+
+    results = asyncio.run(main())
+    assert results[0] == (True, 0.0)
+    assert results[1] == (True, 0.0)
+    ok, wait = results[2]
+    assert not ok
+    assert 59 < wait <= 60  # until the oldest request leaves the 60s window
+
+def test_window_rejects_when_tokens_exceed_tpm():
+    ledger = _ledger(FakeRedis())
+
+    async def main():
+        first = await ledger.reserve("k1", 800, rpm=10, tpm=1000)
+        second = await ledger.reserve("k1", 300, rpm=10, tpm=1000)
+        other_key = await ledger.reserve("k2", 300, rpm=10, tpm=1000)
+        return first, second, other_key
+
+    first, second, other_key = asyncio.run(main())
+    assert first == (True, 0.0)
+    assert second[0] is False
+    assert other_key == (True, 0.0)  # windows are per key
+
+def test_published_cooldown_blocks_reservations_and_is_never_shortened():
+    fake = FakeRedis()
+    ledger = _ledger(fake)
+
+    async def main():
+        ledger.publish_cooldown("k1", 30)
+        await asyncio.sleep(0.01)  # let the background write run
+        await ledger.set_cooldown("k1", 1)  # nx: the longer cooldown stays
+        return await ledger.reserve("k1", 10)
+
+    ok, wait = asyncio.run(main())
+    assert not ok
+    assert 29 < wait <= 30
+    assert not ledger._tasks
+
+def test_fails_open_and_skips_redis_during_retry_window():
+    broken = BrokenRedis()
+    ledger = _ledger(broken)
+    errors = metrics.get("gemini.quota_ledger.errors")
+
+    async def main():
+        return [await ledger.reserve("k1", 10) for _ in range(3)]
+
+    assert asyncio.run(main()) == [(True, 0.0)] * 3
+    assert broken.calls == 1  # later calls don't wait on a dead Redis
+    assert not ledger.redis.available
+    assert metrics.get("gemini.quota_ledger.errors") == errors + 1
+
+def test_publish_cooldown_without_event_loop_is_a_no_op():
+    ledger = _ledger(FakeRedis())
+    ledger.publish_cooldown("k1", 30)
+    assert not ledger._tasks
@@ -0,0 +1,26 @@
+import time
+from app.utils.rate_limit import TokenBucket
+
+def test_token_bucket_consume_and_refill():
+    bucket = TokenBucket(capacity=2, period=0.2)   # refills 10 tokens/s
+
+    assert bucket.try_consume(1)
+    assert bucket.try_consume(1)
+    assert not bucket.try_consume(1)               # empty
+    assert 0 < bucket.time_until(1) <= 0.1
+
+    time.sleep(0.12)
+    assert bucket.try_consume(1)
+
+def test_token_bucket_oversized_request():
+    # A request bigger than the bucket is allowed once the bucket is full
+    bucket = TokenBucket(capacity=100, period=60)
+    assert bucket.can_consume(500)
+    assert bucket.try_consume(500)
+    assert not bucket.can_consume(1)
+
+def test_token_bucket_refund():
+    bucket = TokenBucket(capacity=10, period=60)
+    bucket.try_consume(10)
+    bucket.refund(4)
+    assert bucket.available() >= 4
@@ -0,0 +1,39 @@
+import asyncio
+import pytest
+from app.utils.resilience import (
+    CircuitBreaker, CircuitOpenError, DeadlineExceeded,
+    allow_retry, backoff, remaining_time, request_budget
+)
+
+def test_breaker_opens_then_half_opens():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=0.05)
+    breaker.before_call()
+    breaker.record_failure()
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    asyncio.run(asyncio.sleep(0.06))
+    breaker.before_call()            # single trial allowed
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_budget_limits_retries_and_nested_deadline():
+    with request_budget(timeout=60, retries=2):
+        assert allow_retry("test") and allow_retry("test")
+        assert not allow_retry("test")
+        with request_budget(timeout=1):
+            assert remaining_time() <= 1
+            assert not allow_retry("test")  # inner retries count against the outer budget
+    assert remaining_time() is None
+
+def test_backoff_refuses_to_sleep_past_deadline():
+    async def main():
+        with request_budget(timeout=0.5):
+            await backoff(0.01)
+            with pytest.raises(DeadlineExceeded):
+                await backoff(5)
+    asyncio.run(main())
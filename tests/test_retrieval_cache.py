@@ -0,0 +1,48 @@
+import asyncio
+
+from app.services.retrieval_cache import RetrievalCache
+
+RESULT = {"context": "ctx", "chunks": [{"id": "1", "text": "Ohm's law"}], "total_results": 1, "search_mode": "hybrid"}
+
+def _cache():
+    cache = RetrievalCache()
+    cache.redis = None  # memory tier only
+    return cache
+
+def test_hit_returns_independent_copy():
+    async def main():
+        cache = _cache()
+        key = await cache.make_key("textbooks", "ohm's law", {"subject": "Physics"}, 5)
+        assert await cache.get(key, "quiz") is None
+        await cache.set(key, RESULT)
+
+        hit = await cache.get(key, "quiz")
+        assert hit == RESULT
+        hit["chunks"][0]["text"] = "mutated by caller"
+        assert (await cache.get(key, "quiz"))["chunks"][0]["text"] == "Ohm's law"
+
+    asyncio.run(main())
+
+def test_upsert_version_bump_invalidates_collection_only():
+    async def main():
+        cache = _cache()
+        textbooks = await cache.make_key("textbooks", "q", {}, 5)
+        questions = await cache.make_key("questions", "q", {}, 5)
+        await cache.set(textbooks, RESULT)
+        await cache.set(questions, RESULT)
+
+        await cache.bump_version("textbooks")
+        assert await cache.get(await cache.make_key("textbooks", "q", {}, 5), "exam") is None
+        assert await cache.get(await cache.make_key("questions", "q", {}, 5), "exam") == RESULT
+
+    asyncio.run(main())
+
+def test_degraded_and_empty_results_are_not_cached():
+    async def main():
+        cache = _cache()
+        key = await cache.make_key("textbooks", "q2", {}, 5)
+        await cache.set(key, {**RESULT, "search_mode": "sparse"})
+        await cache.set(key, {**RESULT, "chunks": []})
+        assert await cache.get(key, "tutor") is None
+
+    asyncio.run(main())
@@ -0,0 +1,57 @@
+import asyncio
+from app.utils.singleflight import SingleFlight
+
+def test_concurrent_calls_are_coalesced():
+    flight = SingleFlight("test")
+    calls = 0
+
+    async def upstream():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"chunks": [1, 2, 3]}
+
+    async def main():
+        return await asyncio.gather(*[
+            flight.do("same-key", upstream, copy_result=True) for _ in range(10)
+        ])
+
+    results = asyncio.run(main())
+    assert calls == 1
+    assert all(r == {"chunks": [1, 2, 3]} for r in results)
+    # copy_result: callers don't share mutable state
+    results[0]["chunks"].append(4)
+    assert results[1]["chunks"] == [1, 2, 3]
+    assert flight.in_flight() == 0
+
+def test_cancelled_caller_does_not_fail_others():
+    flight = SingleFlight("test")
+
+    async def upstream():
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    async def main():
+        first = asyncio.ensure_future(flight.do("k", upstream))
+        second = asyncio.ensure_future(flight.do("k", upstream))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == "ok"
+
+def test_errors_propagate_and_key_is_released():
+    flight = SingleFlight("test")
+
+    async def failing():
+        raise ValueError("boom")
+
+    async def main():
+        results = await asyncio.gather(
+            flight.do("k", failing), flight.do("k", failing), return_exceptions=True
+        )
+        return results
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, ValueError) for r in results)
+    assert flight.in_flight() == 0
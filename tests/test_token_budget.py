@@ -0,0 +1,24 @@
+from app.services.token_budget import TokenBudgetService
+
+def _service(min_samples=3):
+    service = TokenBudgetService()
+    service.enabled = True
+    service.min_samples = min_samples
+    service.headroom = 0.0
+    service.percentile = 0.95
+    return service
+
+def test_default_until_warmed_up_then_learned():
+    budget = _service()
+    assert budget.max_tokens("board_exam", "MCQ", 4, default=3000) == 3000
+
+    for _ in range(3):
+        budget.observe("board_exam", "MCQ", 4, output_tokens=800, produced=4, limit=3000)
+    assert budget.max_tokens("board_exam", "MCQ", 4, default=3000) == 800
+    # Other counts borrow the per-question estimate (200 tokens/question)
+    assert budget.max_tokens("board_exam", "MCQ", 6, default=3000) == 1200
+
+def test_truncation_pushes_estimate_up():
+    budget = _service(min_samples=1)
+    budget.observe("board_exam", "LA", 2, output_tokens=1000, produced=1, limit=1000, truncated=True)
+    assert budget.max_tokens("board_exam", "LA", 2, default=8000) > 1000
@@ -0,0 +1,27 @@
+import asyncio
+from app.utils.usage import current_usage, record_generation, track_usage
+
+def test_nested_scopes_roll_up_and_reset():
+    with track_usage() as request_usage:
+        with track_usage() as call_usage:
+            record_generation(1000, 200, endpoint="test")
+        record_generation(500, 100, cached=400, endpoint="test")
+
+        assert call_usage.total_tokens == 1200
+        assert request_usage.prompt_tokens == 1500
+        assert request_usage.output_tokens == 300
+        assert request_usage.cached_tokens == 400
+        assert request_usage.calls == 2
+        assert request_usage.cost_usd > call_usage.cost_usd > 0
+    assert current_usage() is None
+
+def test_gathered_tasks_share_the_request_tracker():
+    async def call():
+        record_generation(10, 10, endpoint="test")
+
+    async def main():
+        with track_usage() as usage:
+            await asyncio.gather(call(), call(), call())
+        return usage
+
+    assert asyncio.run(main()).total_tokens == 60